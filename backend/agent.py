@@ -1,5 +1,7 @@
 from llm_client import LLMClient
+from context_window import ContextWindow
 import time
+import asyncio
 from typing import List, Dict
 
 class DebtCollectionAgent:
@@ -54,9 +56,16 @@ class DebtCollectionAgent:
   3. **DENIAL:** If the user proposes a payment **less than $50** (e.g., $25/mo), firmly but politely state: "I cannot authorize a payment below $50 per month, as that is the minimum authorized." Then steer them back to choosing from the authorized list.
 </user_instructions>"""
 
-    def __init__(self, llm_client: LLMClient, system_prompt: str = None):
+    # Cut the Agent off before it starts writing the Defaulter's lines
+    STOP_SEQUENCES = ["Defaulter:", "User:", "\n\n", "[Your turn"]
+
+    FALLBACK_RESPONSE = "I am sorry, I am experiencing a technical difficulty. Please hold while I reconnect you."
+
+    def __init__(self, llm_client: LLMClient, system_prompt: str = None, max_context_turns: int = 0):
         self.llm = llm_client
         self.history: List[Dict[str, str]] = []
+        # Full history is kept in self.history; with max_context_turns > 0 only a bounded window of it is sent
+        self.context = ContextWindow(max_turns=max_context_turns, labels={"user": "Customer", "assistant": "You"})
         
         # Store the base template (unformatted)
         self.base_template = system_prompt if system_prompt and len(system_prompt.strip()) > 0 else self.DEFAULT_RACHEL_CORE
@@ -93,20 +102,21 @@ class DebtCollectionAgent:
         
         # Reset history
         self.history = [{"role": "system", "content": final_prompt}]
+        self.context.reset()
 
     def respond(self, user_input: str = None):
         """Generates a response from the Agent with built-in retry mechanism."""
         if user_input:
             self.history.append({"role": "user", "content": user_input})
         
-        stops = ["Defaulter:", "User:", "\n\n", "[Your turn"]
+        stops = self.STOP_SEQUENCES
         
         max_retries = 3
         
         for attempt in range(max_retries):
             try:
                 # Assuming self.llm.complete_chat is the synchronous API call
-                response = self.llm.complete_chat(self.history, stop=stops)
+                response = self.llm.complete_chat(self.context.messages(self.history), stop=stops)
                 
                 if response and response.strip():
                     # SUCCESS: Response received and non-empty
@@ -124,4 +134,55 @@ class DebtCollectionAgent:
         
         # If all retries fail, return a safe fallback message
         print("[Agent] CRITICAL: LLM failed to respond after all retries.")
-        return "I am sorry, I am experiencing a technical difficulty. Please hold while I reconnect you."
\ No newline at end of file
+        return self.FALLBACK_RESPONSE
+
+    async def respond_async(self, user_input: str = None):
+        """Async version of respond(). Same retry policy, but waits don't block the event loop."""
+        if user_input:
+            self.history.append({"role": "user", "content": user_input})
+
+        max_retries = 3
+
+        for attempt in range(max_retries):
+            try:
+                response = await self.llm.complete_chat_async(self.context.messages(self.history), stop=self.STOP_SEQUENCES)
+
+                if response and response.strip():
+                    self.history.append({"role": "assistant", "content": response})
+                    return response
+
+                print(f"[Agent] WARNING: Empty response from LLM (Attempt {attempt + 1}/{max_retries}). Retrying...")
+                await asyncio.sleep(2)
+
+            except Exception as e:
+                print(f"[Agent] ERROR: LLM connection failure on attempt {attempt + 1}: {e}")
+                await asyncio.sleep(3)
+
+        print("[Agent] CRITICAL: LLM failed to respond after all retries.")
+        return self.FALLBACK_RESPONSE
+
+    async def respond_stream_async(self, user_input: str = None, on_delta=None):
+        """
+        Streams the reply token by token through `await on_delta(text)`.
+        Falls back to respond_async() (with its retries) if nothing usable streamed,
+        or if the stream broke off: a half-finished reply is never kept as the turn.
+        """
+        if user_input:
+            self.history.append({"role": "user", "content": user_input})
+
+        chunks = []
+        try:
+            async for delta in self.llm.stream_chat_async(self.context.messages(self.history), stop=self.STOP_SEQUENCES):
+                chunks.append(delta)
+                if on_delta:
+                    await on_delta(delta)
+        except Exception as e:
+            print(f"[Agent] ERROR: LLM stream failed: {e}. Falling back to a regular call.")
+            chunks = []
+
+        response = "".join(chunks)
+        if response.strip():
+            self.history.append({"role": "assistant", "content": response})
+            return response
+
+        return await self.respond_async()
@@ -0,0 +1,108 @@
+"""
+Shared plumbing for the benchmark scripts: timing summaries, a console that
+swallows output, and JSON result files tagged with the commit they ran on, so
+two runs can be compared with `python benchmarks/run_all.py --compare OLD NEW`.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+class QuietConsole:
+    """Stands in for rich's console / the run logger so printing isn't what gets measured."""
+
+    def print(self, *args, **kwargs):
+        pass
+
+    def rule(self, *args, **kwargs):
+        pass
+
+    def clear(self):
+        pass
+
+
+def summarize(samples: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """mean / p50 / p95 / max of timings in seconds, reported in ms by default."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return {
+        "mean": round(statistics.fmean(ordered) * scale, 4),
+        "p50": round(statistics.median(ordered) * scale, 4),
+        "p95": round(p95 * scale, 4),
+        "max": round(ordered[-1] * scale, 4),
+        "n": len(ordered),
+    }
+
+
+def environment() -> Dict[str, Any]:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def save_results(name: str, results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Writes {"benchmark", "environment", "results"} to `path` (default: results/<name>-<time>-<commit>.json)."""
+    env = environment()
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{name}-{stamp}-{env['commit'] or 'nogit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": name, "environment": env, "results": results}, f, indent=2)
+    return path
+
+
+def _numbers(tree: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(tree, dict):
+        out = {}
+        for key, value in tree.items():
+            out.update(_numbers(value, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    if isinstance(tree, (int, float)) and not isinstance(tree, bool):
+        return {prefix: float(tree)}
+    return {}
+
+
+def compare(old_path: str, new_path: str) -> List[Dict[str, Any]]:
+    """Every numeric result present in both files, with the relative change."""
+    with open(old_path, encoding="utf-8") as f:
+        old_file = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new_file = json.load(f)
+    old, new = old_file["results"], new_file["results"]
+    # A single benchmark against a whole suite: compare that benchmark's part of the suite
+    if old_file["benchmark"] == "suite" and new_file["benchmark"] != "suite":
+        old = old.get(new_file["benchmark"], {})
+    elif new_file["benchmark"] == "suite" and old_file["benchmark"] != "suite":
+        new = new.get(old_file["benchmark"], {})
+    old, new = _numbers(old), _numbers(new)
+    rows = []
+    for key in sorted(old.keys() & new.keys()):
+        if key.endswith(".n"):
+            continue
+        change = (new[key] - old[key]) / old[key] if old[key] else None
+        rows.append({"metric": key, "old": old[key], "new": new[key], "change": change})
+    return rows
@@ -0,0 +1,78 @@
+"""
+Per-turn client-side overhead of LLMClient's Gemini path, with and without the
+session cache. The network call is replaced by a canned response so only our own
+work (history conversion, model/session construction) is measured.
+
+Usage (from backend/):  python benchmarks/gemini_sessions.py [--turns 30] [--repeats 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import google.generativeai as genai
+from google.generativeai import protos
+
+from llm_client import LLMClient
+
+REPLY = "I understand this is hard. We can do $50 a month for 10 months, would that work for you?"
+
+
+def _fake_generate_content(self, contents, **kwargs):
+    return genai.types.GenerateContentResponse.from_response(protos.GenerateContentResponse(
+        candidates=[protos.Candidate(
+            content=protos.Content(parts=[protos.Part(text=REPLY)], role="model"),
+            finish_reason=protos.Candidate.FinishReason.STOP,
+        )]
+    ))
+
+
+def run_conversation(client: LLMClient, turns: int):
+    """Returns the seconds spent in complete_chat for each turn of one conversation."""
+    history = [{"role": "system", "content": "You are Rachel, a debt collection agent. " * 20}]
+    timings = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"Turn {turn}: I lost my job and can't pay the full $500 right now."})
+        start = time.perf_counter()
+        reply = client.complete_chat(history)
+        timings.append(time.perf_counter() - start)
+        history.append({"role": "assistant", "content": reply})
+    return timings
+
+
+def bench(turns: int, repeats: int, reuse: bool):
+    client = LLMClient(provider="gemini", api_key="benchmark", model_name="gemini-flash-latest")
+    client.rate_limiter = None
+    if not reuse:
+        client.gemini_sessions = None
+
+    per_turn = [[] for _ in range(turns)]
+    for _ in range(repeats):
+        for i, t in enumerate(run_conversation(client, turns)):
+            per_turn[i].append(t)
+    return [statistics.median(ts) * 1000 for ts in per_turn]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    genai.GenerativeModel.generate_content = _fake_generate_content
+
+    before = bench(args.turns, args.repeats, reuse=False)
+    after = bench(args.turns, args.repeats, reuse=True)
+
+    print(f"{'turn':>4} {'rebuild (ms)':>14} {'session cache (ms)':>20}")
+    for i in range(args.turns):
+        if i < 3 or i == args.turns - 1 or (i + 1) % 10 == 0:
+            print(f"{i + 1:>4} {before[i]:>14.3f} {after[i]:>20.3f}")
+    print(f"{'sum':>4} {sum(before):>14.3f} {sum(after):>20.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+HistoryManager at scale: save_run latency while the store grows to 100, 10k and
+100k runs, and what reading it back costs at each size (load_history paged and
+in full, list_runs' first page, get_run). Each size uses a fresh database in a
+temp directory; the real history.db is never touched.
+
+Usage (from backend/):  python benchmarks/history_store.py [--sizes 100,10000,100000] [--scenarios 3] [--json PATH]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import save_results, summarize
+
+from history_manager import HistoryManager
+
+PROMPT = "You are Rachel, a debt collection agent for The Agency. Offer $50/month for 10 months. " * 8
+
+
+def make_run(i: int, scenarios: int, rng: random.Random) -> dict:
+    results = []
+    for s in range(scenarios):
+        score = round(rng.uniform(3, 9), 1)
+        results.append({
+            "cycle": 1 + s // 5,
+            "scenario": s + 1,
+            "persona": {"name": f"Persona {s}", "personality_traits": "Anxious", "financial_situation": "Lost job",
+                        "communication_style": "Short", "objection_type": "No money"},
+            "score": score,
+            "metrics": {"repetition": rng.randint(1, 10), "negotiation": rng.randint(1, 10), "empathy": rng.randint(1, 10)},
+            "feedback": "Offered a plan but ignored the hardship.",
+            "passed": score >= 7,
+            "transcript": [
+                {"role": "agent" if t % 2 == 0 else "defaulter",
+                 "content": "I understand. We can do $50/month for 10 months." if t % 2 == 0 else "I lost my job, I can't pay."}
+                for t in range(8)
+            ],
+            "prompt_used": PROMPT,
+        })
+    return {
+        "id": f"bench-{i:07d}",
+        "timestamp": f"2026-01-01T00:00:00.{i:07d}",
+        "success_rate": sum(r["passed"] for r in results) / max(1, len(results)),
+        "total_cycles": 1,
+        "config": {"model_name": "llama-3.1-8b-instant", "batch_size": scenarios, "max_cycles": 1},
+        "results": results,
+        "optimization_history": [],
+        "metrics": {"cache": {"hits": 0, "misses": scenarios}},
+    }
+
+
+def _timed(fn, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def bench_size(size: int, scenarios: int, full_load_max: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "history.db")
+        manager = HistoryManager(db_file)
+        saves = []
+        start = time.perf_counter()
+        for i in range(size):
+            run_data = make_run(i, scenarios, rng)
+            t = time.perf_counter()
+            manager.save_run(run_data)
+            saves.append(time.perf_counter() - t)
+        total = time.perf_counter() - start
+
+        run_ids = [f"bench-{i:07d}" for i in rng.sample(range(size), min(size, 20))]
+        result = {
+            "runs": size,
+            "scenarios_per_run": scenarios,
+            "save_run_ms": summarize(saves),
+            "save_run_last_100_ms": summarize(saves[-100:]),
+            "saves_per_sec": round(size / total, 1),
+            "load_history_page_ms": _timed(lambda: manager.load_history(limit=50), 20),
+            "list_runs_page_ms": _timed(lambda: manager.list_runs(limit=50), 20),
+            "get_run_ms": _timed(lambda: manager.get_run(rng.choice(run_ids)), 20),
+            "load_history_full_ms": _timed(manager.load_history, 3) if size <= full_load_max else None,
+        }
+        manager.close()
+        result["db_mb"] = round(sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6, 2)
+        return result
+
+
+def run(sizes=(100, 10_000, 100_000), scenarios: int = 3, full_load_max: int = 10_000) -> dict:
+    return {str(size): bench_size(size, scenarios, full_load_max) for size in sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,100000", help="Comma-separated store sizes (runs)")
+    parser.add_argument("--scenarios", type=int, default=3, help="Scenario results per run")
+    parser.add_argument("--full-load-max", type=int, default=10_000, help="Skip the unpaged load_history above this size")
+    parser.add_argument("--json", default=None, help="Where to write the results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = run(sizes, args.scenarios, args.full_load_max)
+    print(f"{'runs':>8} {'save p50':>9} {'save p95':>9} {'saves/s':>9} {'page p50':>9} {'list p50':>9} {'get p50':>9} {'full p50':>10} {'MB':>7}")
+    for size, r in results.items():
+        full = f"{r['load_history_full_ms']['p50']:>10.1f}" if r["load_history_full_ms"] else f"{'-':>10}"
+        print(f"{size:>8} {r['save_run_ms']['p50']:>9.3f} {r['save_run_ms']['p95']:>9.3f} {r['saves_per_sec']:>9.1f} "
+              f"{r['load_history_page_ms']['p50']:>9.3f} {r['list_runs_page_ms']['p50']:>9.3f} {r['get_run_ms']['p50']:>9.3f} "
+              f"{full} {r['db_mb']:>7.2f}")
+    print("(times in ms)")
+    print(f"Saved {save_results('history_store', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Throughput of the two LLM-reply JSON parsers, Evaluator.clean_and_parse_json and
+DefaulterGenerator._clean_and_parse_json, on the payloads they actually see:
+clean JSON, markdown-fenced JSON, JSON wrapped in chatter, big batched replies,
+and malformed replies (truncated, no JSON at all, prose braces around the JSON).
+
+Usage (from backend/):  python benchmarks/json_parsing.py [--seconds 0.5] [--json PATH]
+"""
+import argparse
+import json
+import time
+
+from common import save_results
+
+from evaluator import Evaluator
+from personalities import DefaulterGenerator
+
+EVALUATION = {
+    "metrics": {"repetition": 8, "negotiation": 9, "empathy": 7},
+    "overall_score": 0,
+    "feedback": "Offered a concrete $50/month plan early and acknowledged the job loss, but repeated the greeting twice.",
+}
+PERSONA = {
+    "name": "Maria Lopez",
+    "personality_traits": "Anxious, evasive, quick to anger when pressured",
+    "financial_situation": "Lost her warehouse job last month and is behind on rent",
+    "communication_style": "Short, clipped answers; hangs up when lectured",
+    "objection_type": "I have no money",
+}
+
+
+def _batch(n: int) -> str:
+    return json.dumps({"evaluations": [{"id": f"t{i}", **EVALUATION} for i in range(n)]})
+
+
+PAYLOADS = {
+    "evaluation": json.dumps(EVALUATION),
+    "evaluation_fenced": f"```json\n{json.dumps(EVALUATION, indent=2)}\n```",
+    "evaluation_chatter": f"Sure! Here is my evaluation of the call:\n{json.dumps(EVALUATION)}\nLet me know if you need more.",
+    "evaluations_batch_8": _batch(8),
+    "evaluations_batch_64": _batch(64),
+    "persona": json.dumps(PERSONA),
+    "personas_bulk_20": json.dumps({"personas": [PERSONA] * 20}),
+    "malformed_truncated": _batch(8)[:-40],
+    "malformed_no_json": "I'm sorry, I can't evaluate this conversation. " * 10,
+    "malformed_prose_braces": f"Scores {{see below}}: {json.dumps(EVALUATION)} (note: {{draft}})",
+}
+
+PARSERS = {
+    "evaluator": Evaluator(llm_client=None).clean_and_parse_json,
+    "persona_generator": DefaulterGenerator(llm_client=None)._clean_and_parse_json,
+}
+
+
+def bench(parse, payload: str, seconds: float) -> dict:
+    """Calls per second over roughly `seconds`, and whether the payload parsed."""
+    try:
+        parse(payload)
+        parsed = True
+    except ValueError:
+        parsed = False
+
+    calls, start = 0, time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(100):
+            try:
+                parse(payload)
+            except ValueError:
+                pass
+        calls += 100
+        if time.perf_counter() >= deadline:
+            break
+    elapsed = time.perf_counter() - start
+    return {"parsed": parsed, "calls_per_sec": round(calls / elapsed, 1), "us_per_call": round(elapsed / calls * 1e6, 3),
+            "bytes": len(payload)}
+
+
+def run(seconds: float = 0.5) -> dict:
+    return {
+        parser_name: {name: bench(parse, payload, seconds) for name, payload in PAYLOADS.items()}
+        for parser_name, parse in PARSERS.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=0.5, help="Time spent on each parser/payload pair")
+    parser.add_argument("--json", default=None, help="Where to write the results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args.seconds)
+    print(f"{'parser':<18} {'payload':<24} {'bytes':>7} {'parsed':>7} {'us/call':>10}")
+    for parser_name, rows in results.items():
+        for name, row in rows.items():
+            print(f"{parser_name:<18} {name:<24} {row['bytes']:>7} {str(row['parsed']):>7} {row['us_per_call']:>10.2f}")
+    print(f"Saved {save_results('json_parsing', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Runs the whole offline benchmark suite and writes one JSON file with every
+result, tagged with the commit, so runs on two commits can be compared.
+
+Usage (from backend/):
+    python benchmarks/run_all.py [--quick] [--json PATH]
+    python benchmarks/run_all.py --compare OLD.json NEW.json [--threshold 0.1]
+
+--quick trims sizes and repeats (the history store stops at 10k runs) for a run
+of about a minute; the full suite includes the 100k-run store.
+"""
+import argparse
+import time
+
+from common import compare, save_results
+
+import history_store
+import json_parsing
+import simulation_turns
+import websocket_e2e
+
+
+def run(quick: bool = False) -> dict:
+    suite = {
+        "simulation_turns": lambda: simulation_turns.run(turns=10, conversations=50 if quick else 200),
+        "json_parsing": lambda: json_parsing.run(seconds=0.1 if quick else 0.5),
+        "history_store": lambda: history_store.run(sizes=(100, 10_000) if quick else (100, 10_000, 100_000)),
+        "websocket_e2e": lambda: websocket_e2e.run(repeats=1 if quick else 3),
+    }
+    results = {}
+    for name, bench in suite.items():
+        start = time.perf_counter()
+        print(f"[Benchmarks] {name}...")
+        results[name] = bench()
+        print(f"[Benchmarks] {name} done in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def print_comparison(old_path: str, new_path: str, threshold: float):
+    """Lists the metrics that moved by more than `threshold` (relative)."""
+    rows = [r for r in compare(old_path, new_path) if r["change"] is not None and abs(r["change"]) >= threshold]
+    if not rows:
+        print(f"No metric changed by {threshold:.0%} or more.")
+        return
+    width = max(len(r["metric"]) for r in rows)
+    print(f"{'metric':<{width}} {'old':>12} {'new':>12} {'change':>8}")
+    for r in rows:
+        print(f"{r['metric']:<{width}} {r['old']:>12.3f} {r['new']:>12.3f} {r['change']:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--json", default=None, help="Where to write the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two saved result files")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Smallest relative change --compare reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(*args.compare, args.threshold)
+        return
+    results = run(args.quick)
+    print(f"Saved {save_results('suite', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
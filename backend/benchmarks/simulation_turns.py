@@ -0,0 +1,117 @@
+"""
+Per-turn overhead of ConversationSimulator: the time a turn takes beyond the LLM
+call itself (context windows, stop-sequence filtering, metrics, event callbacks).
+Runs on the offline "fake" provider with zero latency and scripted replies, so
+every conversation is the same length and nothing but our own code is timed.
+
+Usage (from backend/):  python benchmarks/simulation_turns.py [--turns 10] [--conversations 200] [--json PATH]
+"""
+import argparse
+import asyncio
+import time
+
+from common import QuietConsole, save_results, summarize
+
+from llm_client import LLMClient
+from agent import DebtCollectionAgent
+from personalities import DefaulterAgent, Persona
+from simulation import ConversationSimulator
+
+SCRIPT = {
+    "agent": ["I understand this is hard. We can do $50/month for 10 months, would that work for you?"],
+    "defaulter": ["I lost my job last month and I really can't pay the full amount right now."],
+}
+
+PERSONA = Persona(
+    name="Maria Lopez",
+    personality_traits="Anxious, evasive",
+    financial_situation="Lost her job last month",
+    communication_style="Short answers",
+    objection_type="I have no money",
+)
+
+
+def _client() -> LLMClient:
+    return LLMClient(provider="fake", offline={"script": SCRIPT})
+
+
+def _simulator(client: LLMClient, turns: int, on_event=None) -> ConversationSimulator:
+    agent = DebtCollectionAgent(client)
+    agent.reset(defaulter_name=PERSONA.name)
+    defaulter = DefaulterAgent(PERSONA, client)
+    return ConversationSimulator(agent, defaulter, max_turns=turns, on_event=on_event, logger=QuietConsole())
+
+
+def _llm_calls(turns: int) -> int:
+    return 1 + 2 * turns  # Greeting, then a defaulter and an agent reply per turn
+
+
+def bench_client(conversations: int) -> dict:
+    """Baseline: complete_chat on the fake provider alone, with a conversation-sized history."""
+    client = _client()
+    history = [{"role": "system", "content": DebtCollectionAgent.DEFAULT_RACHEL_CORE}]
+    for i in range(8):
+        history.append({"role": "user" if i % 2 == 0 else "assistant", "content": SCRIPT["defaulter"][0]})
+    timings = []
+    for _ in range(conversations * 4):
+        start = time.perf_counter()
+        client.complete_chat(history)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings, scale=1e6)
+
+
+def bench_sync(turns: int, conversations: int) -> dict:
+    client = _client()
+    timings = []
+    for _ in range(conversations):
+        sim = _simulator(client, turns)
+        start = time.perf_counter()
+        sim.run()
+        timings.append((time.perf_counter() - start) / _llm_calls(turns))
+    return summarize(timings, scale=1e6)
+
+
+def bench_async(turns: int, conversations: int, streamed: bool) -> dict:
+    async def on_event(event):
+        pass
+
+    async def run_all():
+        client = _client()
+        timings = []
+        for _ in range(conversations):
+            sim = _simulator(client, turns, on_event=on_event if streamed else None)
+            start = time.perf_counter()
+            await sim.run_async()
+            timings.append((time.perf_counter() - start) / _llm_calls(turns))
+        return timings
+
+    return summarize(asyncio.run(run_all()), scale=1e6)
+
+
+def run(turns: int = 10, conversations: int = 200) -> dict:
+    return {
+        "turns": turns,
+        "conversations": conversations,
+        "client_call_us": bench_client(conversations),
+        "sync_turn_us": bench_sync(turns, conversations),
+        "async_turn_us": bench_async(turns, conversations, streamed=False),
+        "async_streamed_turn_us": bench_async(turns, conversations, streamed=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--json", default=None, help="Where to write the results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args.turns, args.conversations)
+    print(f"{'mode':<24} {'p50 (us)':>10} {'p95 (us)':>10}")
+    for key in ("client_call_us", "sync_turn_us", "async_turn_us", "async_streamed_turn_us"):
+        print(f"{key[:-3]:<24} {results[key]['p50']:>10.1f} {results[key]['p95']:>10.1f}")
+    print(f"Saved {save_results('simulation_turns', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+End-to-end throughput of a simulation run through the WebSocket endpoint
+(/ws/simulate): scenarios per second and events per second as a client sees
+them, with the whole server stack in-process and the offline "fake" provider
+in place of Groq. Runs in a temp directory, so history and the persona library
+start empty and the real history.db is never touched.
+
+Usage (from backend/):  python benchmarks/websocket_e2e.py [--batch 10] [--cycles 2] [--concurrency 5]
+                        [--latency fixed:0.05] [--repeats 3] [--json PATH]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import save_results, summarize
+
+
+def simulate(client, config: dict) -> dict:
+    start = time.perf_counter()
+    first_result = None
+    counts = {}
+    with client.websocket_connect("/ws/simulate") as ws:
+        ws.send_text(json.dumps(config))
+        while True:
+            event = ws.receive_json()
+            counts[event["type"]] = counts.get(event["type"], 0) + 1
+            if event["type"] == "result" and first_result is None:
+                first_result = time.perf_counter() - start
+            if event["type"] == "status":
+                status = event["status"]
+                break
+    elapsed = time.perf_counter() - start
+    results = counts.get("result", 0)
+    return {
+        "status": status,
+        "seconds": round(elapsed, 3),
+        "scenarios": results,
+        "scenarios_per_sec": round(results / elapsed, 2),
+        "events_per_sec": round(sum(counts.values()) / elapsed, 1),
+        "first_result_sec": round(first_result, 3) if first_result is not None else None,
+        "events": counts,
+    }
+
+
+def run(batch: int = 10, cycles: int = 2, concurrency: int = 5, latency: str = "fixed:0.05", repeats: int = 3,
+        stream_turns: bool = True) -> dict:
+    config = {
+        "api_key": "benchmark",
+        "model_name": "fake",
+        "provider": "fake",
+        "offline": {"seed": 0, "latency": latency},
+        "base_prompt": "You are Rachel, a debt collection agent. Be firm but kind.",
+        "max_cycles": cycles,
+        "batch_size": batch,
+        "concurrency": concurrency,
+        "stream_turns": stream_turns,
+        "thresholds": {"repetition": 8, "negotiation": 8, "empathy": 8, "overall": 8},
+    }
+
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # server.py opens history.db relative to the working directory
+        try:
+            import server
+            from fastapi.testclient import TestClient
+
+            with TestClient(server.app) as client:
+                runs = []
+                for i in range(repeats):
+                    config["offline"]["seed"] = i
+                    runs.append(simulate(client, config))
+            server.history_manager.close()
+        finally:
+            os.chdir(previous)
+
+    return {
+        "config": {"batch": batch, "cycles": cycles, "concurrency": concurrency, "latency": latency,
+                   "stream_turns": stream_turns},
+        "runs": runs,
+        "scenarios_per_sec": summarize([r["scenarios_per_sec"] for r in runs], scale=1),
+        "events_per_sec": summarize([r["events_per_sec"] for r in runs], scale=1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--cycles", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", default="fixed:0.05", help="Fake provider latency (see fake_llm.py)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-stream", action="store_true", help="Run without per-token turn_delta events")
+    parser.add_argument("--json", default=None, help="Where to write the results (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = run(args.batch, args.cycles, args.concurrency, args.latency, args.repeats, not args.no_stream)
+    print(f"{'run':>4} {'status':>10} {'scenarios':>10} {'seconds':>8} {'scen/s':>8} {'events/s':>9} {'first (s)':>10}")
+    for i, r in enumerate(results["runs"], 1):
+        print(f"{i:>4} {r['status']:>10} {r['scenarios']:>10} {r['seconds']:>8.2f} {r['scenarios_per_sec']:>8.2f} "
+              f"{r['events_per_sec']:>9.1f} {r['first_result_sec'] or 0:>10.2f}")
+    print(f"Saved {save_results('websocket_e2e', results, args.json)}")
+
+
+if __name__ == "__main__":
+    main()
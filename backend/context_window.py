@@ -0,0 +1,98 @@
+import re
+from typing import Dict, List, Optional
+
+from token_budget import estimate_tokens, estimate_text_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+class ContextWindow:
+    """
+    Bounds what an agent sends per turn: the system prompt (always first and
+    byte-identical, so provider prefix caches and Gemini sessions keep hitting),
+    a short summary of older turns, and the most recent `max_turns` messages.
+    The summary goes in as a user/assistant exchange after the system prompt,
+    never as a second system message: Gemini folds those into the system
+    instruction, which would then change every time the window slides.
+
+    Older turns are folded into the summary `evict_block` at a time, so the
+    summary (and everything before the recent turns) only changes every few
+    turns instead of on every call. Nothing is dropped until the live turns
+    exceed `min_tokens`; below that a summary would cost about what it saves.
+    """
+
+    def __init__(self, max_turns: int = 8, evict_block: int = 4, summary_max_tokens: int = 250,
+                 min_tokens: int = 600, labels: Optional[Dict[str, str]] = None):
+        self.max_turns = max_turns
+        self.min_tokens = min_tokens
+        self.evict_block = max(1, evict_block)
+        self.summary_max_tokens = summary_max_tokens
+        self.labels = labels or {"user": "User", "assistant": "You"}
+        self.reset()
+
+    def reset(self):
+        """Starts a new conversation (stats are per conversation too)."""
+        self.stats = {"calls": 0, "tokens_full": 0, "tokens_sent": 0}
+        self._summary_lines: List[str] = []
+        self._dropped_lines = 0
+        self._evicted = 0  # Turns (after the system prompt) already folded into the summary
+
+    def _summarize_turn(self, entry: Dict[str, str]) -> str:
+        text = " ".join((entry.get("content") or "").split())
+        first = _SENTENCE_END.split(text, maxsplit=1)[0]
+        if len(first) > 160:
+            first = first[:157] + "..."
+        return f"- {self.labels.get(entry['role'], entry['role'])}: {first}"
+
+    def _fold(self, turns: List[Dict[str, str]]):
+        self._summary_lines.extend(self._summarize_turn(t) for t in turns)
+        # Keep the newest lines under budget; older ones are only counted
+        while len(self._summary_lines) > 1 and estimate_text_tokens("\n".join(self._summary_lines)) > self.summary_max_tokens:
+            self._summary_lines.pop(0)
+            self._dropped_lines += 1
+
+    def _summary_messages(self) -> List[Dict[str, str]]:
+        if not self._summary_lines:
+            return []
+        header = "Summary of the earlier part of this conversation"
+        if self._dropped_lines:
+            header += f" ({self._dropped_lines} earliest turns not shown)"
+        # The live window opens on a user turn, so an acknowledgement keeps the roles alternating
+        return [
+            {"role": "user", "content": header + ":\n" + "\n".join(self._summary_lines)},
+            {"role": "assistant", "content": "Understood. Continuing from there."}
+        ]
+
+    def messages(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """The messages to actually send for `history`, recording the tokens saved."""
+        has_system = bool(history) and history[0]["role"] == "system"
+        prefix, turns = (history[:1], history[1:]) if has_system else ([], history)
+
+        live = turns[self._evicted:]
+        if (self.max_turns and len(live) > self.max_turns + self.evict_block
+                and estimate_tokens(live) > self.min_tokens):
+            start = len(turns) - self.max_turns
+            # Open the window on a user turn so it reads like a normal exchange
+            while start > self._evicted and turns[start]["role"] != "user":
+                start -= 1
+            self._fold(turns[self._evicted:start])
+            self._evicted = start
+
+        sent = prefix + self._summary_messages() + turns[self._evicted:]
+
+        self.stats["calls"] += 1
+        self.stats["tokens_full"] += estimate_tokens(history)
+        self.stats["tokens_sent"] += estimate_tokens(sent)
+        return sent
+
+
+def summarize_context(*agents) -> Dict[str, int]:
+    """Input tokens a conversation would have sent with full history vs. what the windows sent."""
+    total = {"calls": 0, "tokens_full": 0, "tokens_sent": 0}
+    for agent in agents:
+        window = getattr(agent, "context", None)
+        if window:
+            for key in total:
+                total[key] += window.stats[key]
+    total["tokens_saved"] = total["tokens_full"] - total["tokens_sent"]
+    return total
@@ -0,0 +1,93 @@
+import math
+from typing import Dict, Optional
+
+PASS = "pass"
+FAIL = "fail"
+
+
+def _normal_cdf(z: float) -> float:
+    return 0.5 * (1.0 + math.erf(z / math.sqrt(2.0)))
+
+
+def _beta_sf(x: float, a: int, b: int) -> float:
+    """P(p >= x) for p ~ Beta(a, b) with integer a, b (exact, via the binomial identity)."""
+    n = a + b - 1
+    # I_x(a, b) = P(Binomial(n, x) >= a), so P(p >= x) = P(Binomial(n, x) <= a - 1)
+    return sum(math.comb(n, k) * x ** k * (1 - x) ** (n - k) for k in range(a))
+
+
+class PassRateTest:
+    """
+    Bayesian sequential test on a pass rate: Beta(1, 1) prior, Beta(1 + passes, 1 + fails)
+    posterior. Settles once P(rate >= threshold) is above `confidence` (pass) or
+    below 1 - `confidence` (fail).
+    """
+
+    def __init__(self, threshold: float, confidence: float = 0.95, min_samples: int = 3):
+        self.threshold = threshold
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.passes = 0
+        self.fails = 0
+
+    def add(self, passed: bool):
+        if passed:
+            self.passes += 1
+        else:
+            self.fails += 1
+
+    def probability_met(self) -> float:
+        return _beta_sf(min(max(self.threshold, 0.0), 1.0), 1 + self.passes, 1 + self.fails)
+
+    def decision(self) -> Optional[str]:
+        if self.passes + self.fails < self.min_samples:
+            return None
+        p = self.probability_met()
+        if p >= self.confidence:
+            return PASS
+        if p <= 1 - self.confidence:
+            return FAIL
+        return None
+
+
+class MeanTargetsTest:
+    """
+    Sequential test that every metric's mean reaches its target. Each mean gets a
+    normal posterior N(mean, sd^2 / n); `sd_floor` keeps a few identical scores
+    from looking like certainty. Settles as "pass" once P(all targets met) is above
+    `confidence`, and as "fail" once any single metric is below 1 - `confidence`.
+    """
+
+    def __init__(self, targets: Dict[str, float], confidence: float = 0.95, min_samples: int = 3,
+                 sd_floor: float = 1.0):
+        self.targets = targets
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.sd_floor = sd_floor
+        self.values = {name: [] for name in targets}
+
+    def add(self, scores: Dict[str, float]):
+        for name in self.targets:
+            self.values[name].append(float(scores[name]))
+
+    def _probability(self, name: str) -> float:
+        values = self.values[name]
+        n = len(values)
+        mean = sum(values) / n
+        variance = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+        sd = max(math.sqrt(variance), self.sd_floor)
+        return _normal_cdf((mean - self.targets[name]) / (sd / math.sqrt(n)))
+
+    def probabilities(self) -> Dict[str, float]:
+        return {name: self._probability(name) for name in self.targets}
+
+    def decision(self) -> Optional[str]:
+        n = len(next(iter(self.values.values()), []))
+        if n < self.min_samples:
+            return None
+        probabilities = self.probabilities()
+        if min(probabilities.values()) <= 1 - self.confidence:
+            return FAIL
+        if math.prod(probabilities.values()) >= self.confidence:
+            return PASS
+        return None
@@ -1,8 +1,9 @@
 from llm_client import LLMClient
-from typing import List, Dict
-import json
-import re
-import asyncio # <--- Added Import
+from token_budget import estimate_tokens, compact_transcript, record_compaction, new_compaction_stats
+from structured_output import extract_json
+from local_metrics import LocalScorer, score_transcripts
+from typing import List, Dict, Optional
+import asyncio
 from pydantic import BaseModel, Field
 
 class EvaluationMetrics(BaseModel):
@@ -15,30 +16,7 @@ class EvaluationResult(BaseModel):
     overall_rating: float = Field(alias="overall_score")
     feedback: str
 
-class Evaluator:
-    def __init__(self, llm_client: LLMClient):
-        self.llm = llm_client
-
-    def clean_and_parse_json(self, text: str) -> dict:
-        try:
-            cleaned = text.strip()
-            if "```" in cleaned:
-                cleaned = re.sub(r'```json\s*', '', cleaned, flags=re.IGNORECASE)
-                cleaned = re.sub(r'```', '', cleaned)
-            
-            match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-            if match:
-                cleaned = match.group(0)
-            
-            return json.loads(cleaned)
-        except Exception:
-            raise ValueError("Could not extract valid JSON from response")
-
-    async def evaluate(self, logs: List[Dict]) -> EvaluationResult:
-        conversation_text = "\n".join([f"{entry['role'].upper()}: {entry['content']}" for entry in logs])
-        
-        prompt = f"""You are an expert Voice Agent QA Analyst. 
-Evaluate the conversation based on these 3 metrics (1-10):
+RUBRIC = """Evaluate the conversation based on these 3 metrics (1-10):
 
 1. **Repetition:** (10 = Natural/Varied, 1 = Robotic loop).
 2. **Negotiation:** (10 = Secured payment/plan, 1 = Gave up or offered no solution).
@@ -47,7 +25,81 @@ Evaluate the conversation based on these 3 metrics (1-10):
 **STRICT GRADING RUBRIC:**
 - If Agent says "I don't have a plan" or "I cannot help" -> Negotiation = 1.
 - If Agent passes buck to supervisor -> Negotiation = 2.
-- If Agent offers a SPECIFIC dollar plan -> Negotiation = 8+.
+- If Agent offers a SPECIFIC dollar plan -> Negotiation = 8+."""
+
+# Rough size of one evaluation object in the batched reply, budgeted up front
+EVALUATION_OUTPUT_TOKENS = 120
+
+
+class Evaluator:
+    def __init__(self, llm_client: LLMClient, max_batch_tokens: int = 4000, max_batch_size: int = 8,
+                 max_transcript_tokens: int = 1500, prescorer: Optional[LocalScorer] = None):
+        self.llm = llm_client
+        # Long or looping conversations are compacted to about this size before grading
+        self.max_transcript_tokens = max_transcript_tokens
+        self.compaction_stats = new_compaction_stats()
+        # evaluate_many packs transcripts into one request until either limit is hit
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.batch_stats = {"batched_calls": 0, "batched_transcripts": 0, "single_calls": 0, "rescored": 0}
+        # Optional local pre-scoring: clear passes/fails are graded without the LLM (see local_metrics.py)
+        self.prescorer = prescorer
+        self.prescore_stats = {"local_passes": 0, "local_fails": 0, "sent_to_llm": 0, "llm_calls_saved": 0}
+
+    def clean_and_parse_json(self, text: str) -> dict:
+        return extract_json(text)
+
+    def _conversation_text(self, logs: List[Dict]) -> str:
+        return "\n".join([f"{entry['role'].upper()}: {entry['content']}" for entry in logs])
+
+    def _compact(self, logs: List[Dict]) -> List[Dict]:
+        compacted = compact_transcript(logs, max_tokens=self.max_transcript_tokens)
+        record_compaction(self.compaction_stats, estimate_tokens(logs), estimate_tokens(compacted))
+        return compacted
+
+    def _to_result(self, data: dict) -> EvaluationResult:
+        m = data.get("metrics", {})
+        rep = int(m.get("repetition", 0))
+        neg = int(m.get("negotiation", 0))
+        emp = int(m.get("empathy", 0))
+
+        real_overall = round((rep + neg + emp) / 3, 1)
+        return EvaluationResult(
+            metrics=EvaluationMetrics(repetition=rep, negotiation=neg, empathy=emp),
+            overall_score=real_overall,
+            feedback=data["feedback"]
+        )
+
+    def _prescore(self, transcripts: List[List[Dict]]) -> Dict[int, EvaluationResult]:
+        """Results for the transcripts the local heuristics settle on their own, by index."""
+        if not self.prescorer:
+            return {}
+        results = {}
+        for i, signals in enumerate(score_transcripts(transcripts)):
+            decision = self.prescorer.decide(signals)
+            if decision is None:
+                self.prescore_stats["sent_to_llm"] += 1
+                continue
+            self.prescore_stats["local_passes" if decision == "pass" else "local_fails"] += 1
+            results[i] = self._to_result({
+                "metrics": self.prescorer.metrics(signals),
+                "feedback": f"Scored locally ({decision}): {self.prescorer.explain(signals, decision)}"
+            })
+        return results
+
+    async def evaluate(self, logs: List[Dict]) -> EvaluationResult:
+        local = self._prescore([logs])
+        if local:
+            self.prescore_stats["llm_calls_saved"] += 1
+            return local[0]
+        return await self._evaluate_llm(logs)
+
+    async def _evaluate_llm(self, logs: List[Dict], compacted: Optional[List[Dict]] = None) -> EvaluationResult:
+        """`compacted`: the transcript already compacted (and counted) by evaluate_many."""
+        conversation_text = self._conversation_text(compacted if compacted is not None else self._compact(logs))
+        
+        prompt = f"""You are an expert Voice Agent QA Analyst. 
+{RUBRIC}
 
 **Conversation**:
 {conversation_text}
@@ -60,39 +112,180 @@ Return raw JSON only:
   "feedback": "string"
 }}
 """
-        # CRITICAL FIX: Wrapped synchronous LLM call in to_thread
-        response = await asyncio.to_thread(
-            self.llm.complete_chat, 
+        self.batch_stats["single_calls"] += 1
+        # Native async call: no worker thread tied up while waiting on the network.
+        # Validated against the schema, with a repair call if the reply doesn't fit.
+        result = await self.llm.complete_chat_async(
             [
                 {"role": "system", "content": "Return ONLY JSON. Do not write text."},
                 {"role": "user", "content": prompt}
             ], 
-            json_response=True
+            schema=EvaluationResult
+        )
+
+        if result is None:
+            return self._get_failure_result("LLM returned no valid evaluation (empty or unrepairable reply)")
+
+        # Overall is always recomputed from the metrics, whatever the model put there
+        return self._to_result({"metrics": result.metrics.dict(), "feedback": result.feedback})
+
+    def _pack(self, transcripts: List[List[Dict]]) -> List[List[int]]:
+        """Groups (already compacted) transcript indexes into batches that fit the token budget."""
+        overhead = estimate_tokens([{"content": RUBRIC}]) + 100
+        batches, current, used = [], [], overhead
+        for i, logs in enumerate(transcripts):
+            cost = estimate_tokens([{"content": self._conversation_text(logs)}]) + EVALUATION_OUTPUT_TOKENS
+            if current and (used + cost > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, used = [], overhead
+            current.append(i)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _evaluate_batch(self, transcripts: Dict[int, List[Dict]], indexes: List[int]) -> Dict[int, EvaluationResult]:
+        """One LLM call for several transcripts. Anything missing or malformed is left out of the result."""
+        blocks = "\n\n".join(
+            f'<transcript id="t{i}">\n{self._conversation_text(transcripts[i])}\n</transcript>' for i in indexes
         )
+        ids = ", ".join(f'"t{i}"' for i in indexes)
+
+        prompt = f"""You are an expert Voice Agent QA Analyst.
+Score EACH of the {len(indexes)} conversations below independently.
+{RUBRIC}
 
+**Conversations**:
+{blocks}
+
+**OUTPUT FORMAT:**
+Return raw JSON only, with exactly one entry per conversation id ({ids}):
+{{
+  "evaluations": [
+    {{ "id": "t0", "metrics": {{ "repetition": int, "negotiation": int, "empathy": int }}, "feedback": "string" }}
+  ]
+}}
+"""
+        self.batch_stats["batched_calls"] += 1
+        self.batch_stats["batched_transcripts"] += len(indexes)
+        response = await self.llm.complete_chat_async(
+            [
+                {"role": "system", "content": "Return ONLY JSON. Do not write text."},
+                {"role": "user", "content": prompt}
+            ],
+            json_response=True
+        )
         if not response:
-            return self._get_failure_result("LLM returned empty response")
+            return {}
 
         try:
-            data = self.clean_and_parse_json(response)
-            
-            m = data.get("metrics", {})
-            rep = int(m.get("repetition", 0))
-            neg = int(m.get("negotiation", 0))
-            emp = int(m.get("empathy", 0))
-            
-            real_overall = round((rep + neg + emp) / 3, 1)
-            data["overall_score"] = real_overall
-            
-            return EvaluationResult(**data)
-            
+            evaluations = self.clean_and_parse_json(response).get("evaluations", [])
         except Exception as e:
-            print(f"Evaluator Crash Prevented: {e}")
-            return self._get_failure_result(f"JSON Parsing Failed. Raw: {response[:50]}...")
+            print(f"Evaluator batch reply unusable ({e}), re-scoring individually.")
+            return {}
+
+        wanted = set(indexes)
+        results = {}
+        for item in evaluations if isinstance(evaluations, list) else []:
+            try:
+                index = int(str(item.get("id", "")).lstrip("t"))
+                metrics = item["metrics"]
+                if index not in wanted or index in results:
+                    continue
+                if not all(1 <= int(metrics[k]) <= 10 for k in ("repetition", "negotiation", "empathy")):
+                    continue
+                results[index] = self._to_result(item)
+            except Exception:
+                continue # Malformed entry: re-scored on its own below
+        return results
+
+    async def evaluate_many(self, transcripts: List[List[Dict]], max_batch_tokens: Optional[int] = None) -> List[EvaluationResult]:
+        """
+        Scores several conversations with as few LLM calls as the token budget allows.
+        Results come back in the same order as `transcripts`; any conversation the
+        batched reply skipped or mangled is re-scored with a single `evaluate` call.
+        """
+        if max_batch_tokens is not None:
+            self.max_batch_tokens = max_batch_tokens
+
+        # Clear cases are scored locally in one vectorized pass; only the rest are packed for the LLM
+        results: Dict[int, EvaluationResult] = self._prescore(transcripts)
+        pending = [i for i in range(len(transcripts)) if i not in results]
+        # Compacted (and counted in compaction_stats) once per transcript, whichever call ends up grading it
+        compacted = {i: self._compact(transcripts[i]) for i in pending}
+        batches = [[pending[j] for j in indexes] for indexes in self._pack([compacted[i] for i in pending])]
+        if results:
+            everything = [compacted[i] if i in compacted else compact_transcript(logs, max_tokens=self.max_transcript_tokens)
+                          for i, logs in enumerate(transcripts)]
+            self.prescore_stats["llm_calls_saved"] += len(self._pack(everything)) - len(batches)
+
+        async def run_batch(indexes: List[int]):
+            if len(indexes) == 1:
+                results[indexes[0]] = await self._evaluate_llm(transcripts[indexes[0]], compacted[indexes[0]])
+            else:
+                results.update(await self._evaluate_batch(compacted, indexes))
+
+        await asyncio.gather(*(run_batch(indexes) for indexes in batches))
+
+        missing = [i for i in range(len(transcripts)) if i not in results]
+        if missing:
+            self.batch_stats["rescored"] += len(missing)
+            rescored = await asyncio.gather(*(self._evaluate_llm(transcripts[i], compacted[i]) for i in missing))
+            results.update(zip(missing, rescored))
+
+        return [results[i] for i in range(len(transcripts))]
 
     def _get_failure_result(self, reason: str) -> EvaluationResult:
         return EvaluationResult(
             metrics=EvaluationMetrics(repetition=0, negotiation=0, empathy=0),
             overall_score=0.0,
             feedback=reason
-        )
\ No newline at end of file
+        )
+
+
+class EvaluationBatcher:
+    """
+    Lets concurrently running scenarios share evaluator calls. Each `evaluate` call
+    waits until `max_pending` conversations are queued (or `max_wait` seconds pass)
+    and the group is scored with one `evaluate_many`.
+    """
+
+    def __init__(self, evaluator: Evaluator, max_pending: int, max_wait: float = 1.0):
+        self.evaluator = evaluator
+        self.max_pending = max(1, min(max_pending, evaluator.max_batch_size))
+        self.max_wait = max_wait
+        self._pending = []  # (logs, future)
+        self._timer = None
+        self._tasks = set()
+
+    async def evaluate(self, logs: List[Dict]) -> EvaluationResult:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((logs, future))
+        if len(self._pending) >= self.max_pending:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.evaluator.evaluate_many([logs for logs, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
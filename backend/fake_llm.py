@@ -0,0 +1,444 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional
+
+# Offline stand-ins for a real provider, behind LLMClient(provider="fake" | "replay").
+#
+#   fake    Answers every request locally: randomized but well-formed replies (agent
+#           and defaulter turns, persona JSON, evaluator JSON, prompt rewrites), or
+#           scripted ones per call kind. Replies are derived from the seed and the
+#           request itself, so a run is reproducible whatever order calls land in.
+#   replay  Serves the replies recorded in a session file (see SessionRecorder),
+#           matched by request, with the recorded latency if asked for.
+#
+# Options (the `offline` dict, or FAKE_LLM_* env vars as defaults):
+#   seed        int, default 0
+#   latency     "fixed:0.2" | "uniform:0.1,0.6" | "normal:0.4,0.1" | "lognormal:0.3,0.6"
+#               (median seconds, sigma) | "exp:0.3" | "recorded" (replay only). Default none.
+#   error_rate  share of attempts that fail (retried like a Groq error), default 0
+#   script      list of replies for every call, or {call kind: [replies]}; cycled
+#   file        replay: the recorded session (JSONL)
+#   on_miss     replay, for requests that were never recorded: "next" (next unused
+#               reply of the same call kind, default), "fake" or "error"
+
+CALL_KINDS = ("agent", "defaulter", "persona", "personas", "evaluation", "evaluations", "optimizer", "repair", "termination")
+
+# Words per streamed chunk
+STREAM_CHUNK_WORDS = 3
+
+
+class FakeProviderError(Exception):
+    """An injected failure (error_rate), handled like a transient provider error."""
+
+
+class ReplayMiss(LookupError):
+    """A replayed request that isn't in the session file (on_miss="error")."""
+
+
+def request_key(messages: List[Dict], temperature: float, json_response: bool) -> str:
+    """Identifies a request independently of provider and model, so a Groq session replays anywhere."""
+    payload = json.dumps([messages, round(float(temperature), 3), bool(json_response)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def call_kind(messages: List[Dict]) -> str:
+    """Which component a request comes from, recognised by the prompts those components send."""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    last = messages[-1]["content"] if messages else ""
+    if "fix malformed JSON" in system:
+        return "repair"
+    if "call-state classifier" in system:
+        return "termination"
+    if "generating personas" in system:
+        return "personas" if '"personas"' in last else "persona"
+    if "Return ONLY JSON" in system:
+        return "evaluations" if "<transcript id=" in last else "evaluation"
+    if "prompt engineer" in system:
+        return "optimizer"
+    if "roleplaying a specific customer persona" in system:
+        return "defaulter"
+    return "agent"
+
+
+class LatencyModel:
+    """Per-call latency in seconds, sampled from a named distribution."""
+
+    def __init__(self, spec: Optional[str] = None):
+        self.spec = (spec or "").strip()
+        self.recorded = self.spec == "recorded"
+        kind, _, params = self.spec.partition(":")
+        self.kind = kind or "none"
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("none", "recorded", "fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"Unknown latency distribution: {self.spec}")
+
+    def sample(self, rng: random.Random, recorded: Optional[float] = None) -> float:
+        p = self.params
+        if self.kind == "recorded":
+            return recorded or 0.0
+        if self.kind == "fixed":
+            return p[0]
+        if self.kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(p[0], p[1]))
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(p[0]), p[1])
+        if self.kind == "exp":
+            return rng.expovariate(1 / p[0])
+        return 0.0
+
+
+class RandomResponder:
+    """
+    Plausible replies for every call kind. Conversations react to the prompt (an agent
+    whose prompt names a $/month plan offers it, a defaulter offered one may accept and
+    hang up) and the evaluator scores what was actually said, so the optimizer loop
+    behaves roughly like it does against a real model.
+    """
+
+    FIRST_NAMES = ["Maria", "James", "Priya", "Tom", "Aisha", "Carlos", "Mei", "Darnell", "Olga", "Sam"]
+    LAST_NAMES = ["Lopez", "Carter", "Nair", "Becker", "Khan", "Silva", "Wong", "Brooks", "Ivanova", "Reed"]
+    TRAITS = ["Aggressive, distrustful", "Timid, anxious", "Sarcastic, evasive", "Polite but firm",
+              "Emotional, overwhelmed", "Argumentative, legalistic"]
+    SITUATIONS = ["Lost their job last month", "Unexpected medical bills", "Disputes the debt",
+                  "Supporting three kids on one income", "Small business went under", "Forgot about the loan"]
+    STYLES = ["Short, clipped answers", "Rambling and verbose", "Angry and loud", "Quiet, hesitant",
+              "Formal and precise"]
+    OBJECTIONS = ["I already paid", "I have no money", "This isn't my debt", "Call me next month",
+                  "I need to talk to my lawyer", "The fees are a scam"]
+
+    AGENT_LINES = ["I understand this is a difficult time, and I'm here to help.",
+                   "Thank you for taking my call. I'm calling about the $500 balance on your account.",
+                   "I hear you. Let's see what we can work out together.",
+                   "I appreciate you being honest with me about your situation."]
+    DEFAULTER_LINES = ["I don't have the money right now.", "Why are you calling me again?",
+                       "I lost my job, okay? I can't pay this.", "Give me a number or leave me alone.",
+                       "I'm not sure this debt is even mine.", "I've got medical bills piling up."]
+
+    def reply(self, kind: str, messages: List[Dict], rng: random.Random) -> str:
+        return getattr(self, f"_{kind}")(messages, rng)
+
+    def _persona_dict(self, rng: random.Random) -> Dict[str, str]:
+        return {
+            "name": f"{rng.choice(self.FIRST_NAMES)} {rng.choice(self.LAST_NAMES)}",
+            "personality_traits": rng.choice(self.TRAITS),
+            "financial_situation": rng.choice(self.SITUATIONS),
+            "communication_style": rng.choice(self.STYLES),
+            "objection_type": rng.choice(self.OBJECTIONS),
+        }
+
+    def _persona(self, messages, rng):
+        return json.dumps(self._persona_dict(rng))
+
+    def _personas(self, messages, rng):
+        match = re.search(r"Generate (\d+) distinct", messages[-1]["content"])
+        count = int(match.group(1)) if match else 5
+        return json.dumps({"personas": [self._persona_dict(rng) for _ in range(count)]})
+
+    def _agent(self, messages, rng):
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        # The constraints block quotes "$50/month" as an example of what not to invent
+        instructions = re.sub(r"<strict_constraints>.*?</strict_constraints>", "", system, flags=re.DOTALL)
+        plans = re.findall(r"\$\d+/month", instructions)
+        turns = sum(1 for m in messages if m["role"] == "assistant")
+        if turns >= 4 and rng.random() < 0.3:
+            return "Thank you for your time. Goodbye."
+        if plans and rng.random() < 0.7:
+            return f"{rng.choice(self.AGENT_LINES)} We can set you up on {rng.choice(plans)}, interest-free."
+        if not plans and rng.random() < 0.3:
+            return "I do not have a plan for that."
+        return rng.choice(self.AGENT_LINES)
+
+    def _defaulter(self, messages, rng):
+        last = messages[-1]["content"] if messages else ""
+        if "/month" in last and rng.random() < 0.6:
+            return "Okay, I can manage that. Set it up and bye."
+        if "do not have a plan" in last:
+            return "Then stop wasting my time!"
+        return rng.choice(self.DEFAULTER_LINES)
+
+    def _scores(self, transcript: str, rng: random.Random) -> Dict[str, Any]:
+        agent_lines = [line[len("AGENT: "):] for line in transcript.splitlines() if line.startswith("AGENT: ")]
+        said = " ".join(agent_lines).lower()
+        if "do not have a plan" in said or "cannot help" in said:
+            negotiation = 1
+        elif re.search(r"\$\d+/month", said):
+            negotiation = rng.randint(8, 10)
+        else:
+            negotiation = rng.randint(2, 5)
+        empathy = min(10, rng.randint(4, 7) + (2 if "understand" in said or "hear you" in said else 0))
+        repeats = len(agent_lines) - len(set(agent_lines))
+        repetition = max(1, min(10, rng.randint(8, 10) - 2 * repeats))
+        feedback = "Offered a concrete plan." if negotiation >= 8 else "No specific payment plan was offered."
+        return {"metrics": {"repetition": repetition, "negotiation": negotiation, "empathy": empathy},
+                "feedback": feedback}
+
+    def _evaluation(self, messages, rng):
+        prompt = messages[-1]["content"]
+        match = re.search(r"\*\*Conversation\*\*:\n(.*?)\n\n\*\*OUTPUT FORMAT", prompt, re.DOTALL)
+        return json.dumps({**self._scores(match.group(1) if match else "", rng), "overall_score": 0})
+
+    def _evaluations(self, messages, rng):
+        blocks = re.findall(r'<transcript id="(t\d+)">\n(.*?)\n</transcript>', messages[-1]["content"], re.DOTALL)
+        return json.dumps({"evaluations": [{"id": tid, **self._scores(text, rng)} for tid, text in blocks]})
+
+    def _optimizer(self, messages, rng):
+        prompt = messages[-1]["content"]
+        match = re.search(r"--- CURRENT PROMPT ---\n(.*?)\n-{22}\n", prompt, re.DOTALL)
+        current = match.group(1) if match else ""
+        amount = rng.choice([50, 75, 100, 150, 200])
+        return f"{current}\n- If the customer mentions hardship, offer ${amount}/month and validate their situation first."
+
+    def _termination(self, messages, rng):
+        # Mostly lets the call go on; now and then calls a stalled one
+        return json.dumps({"state": "stall" if rng.random() < 0.1 else "continue"})
+
+    # Filler for required fields a repair finds missing, by JSON schema type
+    REPAIR_DEFAULTS = {"string": "n/a", "integer": 5, "number": 5.0, "boolean": False, "array": [], "object": {}}
+
+    def _repair(self, messages, rng):
+        # Keeps whatever JSON the broken reply had and fills in missing required fields
+        prompt = messages[-1]["content"]
+        schema_match = re.search(r"Schema:\n(.*?)\n\n", prompt, re.DOTALL)
+        reply_match = re.search(r"Reply:\n(.*?)\n\nReturn the corrected", prompt, re.DOTALL)
+        try:
+            schema = json.loads(schema_match.group(1)) if schema_match else {}
+        except ValueError:
+            schema = {}
+        found = re.search(r"\{.*\}", reply_match.group(1) if reply_match else "", re.DOTALL)
+        try:
+            data = json.loads(found.group(0)) if found else {}
+        except ValueError:
+            data = {}
+
+        def fill(node, value):
+            if node.get("type") != "object":
+                return value if value is not None else self.REPAIR_DEFAULTS.get(node.get("type"), "n/a")
+            value = value if isinstance(value, dict) else {}
+            for name, child in node.get("properties", {}).items():
+                if name in node.get("required", []) or name in value:
+                    value[name] = fill(child, value.get(name))
+            return value
+
+        return json.dumps(fill(schema, data) if schema else data)
+
+
+class ScriptedResponder:
+    """Cycles through fixed replies, per call kind; kinds without a script get random replies."""
+
+    def __init__(self, script, fallback: RandomResponder):
+        if isinstance(script, list):
+            script = {kind: script for kind in CALL_KINDS}
+        self.script = {kind: list(replies) for kind, replies in (script or {}).items() if replies}
+        self.fallback = fallback
+        self._positions = Counter()
+        self._lock = threading.Lock()
+
+    def reply(self, kind: str, messages: List[Dict], rng: random.Random) -> str:
+        replies = self.script.get(kind)
+        if not replies:
+            return self.fallback.reply(kind, messages, rng)
+        with self._lock:
+            position = self._positions[kind]
+            self._positions[kind] += 1
+        reply = replies[position % len(replies)]
+        return reply if isinstance(reply, str) else json.dumps(reply)
+
+
+class ReplayResponder:
+    """Serves the replies of a recorded session, matched by request (and by occurrence, for repeats)."""
+
+    def __init__(self, path: str, on_miss: str = "next", fallback: Optional[RandomResponder] = None):
+        if on_miss not in ("next", "fake", "error"):
+            raise ValueError(f"Unknown on_miss: {on_miss}")
+        self.path = path
+        self.on_miss = on_miss
+        self.fallback = fallback or RandomResponder()
+        self.stats = {"hits": 0, "misses": 0}
+        self._by_key: Dict[str, List[Dict]] = defaultdict(list)
+        self._by_kind: Dict[str, List[Dict]] = defaultdict(list)
+        self._used = set()
+        self._next = Counter()
+        self._lock = threading.Lock()
+
+        with open(path, "r", encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["index"] = index
+                self._by_key[entry["key"]].append(entry)
+                self._by_kind[entry.get("kind", "agent")].append(entry)
+
+    def lookup(self, key: str, kind: str) -> Optional[Dict]:
+        with self._lock:
+            for entry in self._by_key.get(key, []):
+                if entry["index"] not in self._used:
+                    self._used.add(entry["index"])
+                    self.stats["hits"] += 1
+                    return entry
+            self.stats["misses"] += 1
+            if self.on_miss == "error":
+                raise ReplayMiss(f"No recorded {kind} reply for this request in {self.path}")
+            if self.on_miss == "fake":
+                return None
+            candidates = self._by_kind.get(kind) or []
+            unused = [e for e in candidates if e["index"] not in self._used]
+            if unused:
+                self._used.add(unused[0]["index"])
+                return unused[0]
+            if not candidates:
+                return None
+            # Everything of this kind was served already: go round again
+            entry = candidates[self._next[kind] % len(candidates)]
+            self._next[kind] += 1
+            return entry
+
+
+class OfflineBackend:
+    """What LLMClient talks to for provider="fake"/"replay": a responder plus latency and failures."""
+
+    def __init__(self, provider: str = "fake", seed: int = 0, latency: Optional[str] = None,
+                 error_rate: float = 0.0, script=None, file: Optional[str] = None, on_miss: str = "next"):
+        self.provider = provider
+        self.seed = seed
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.random = RandomResponder()
+        self.replay: Optional[ReplayResponder] = None
+        if provider == "replay":
+            if not file:
+                raise ValueError("provider='replay' needs a session file (offline={'file': ...} or LLM_REPLAY_FILE)")
+            self.replay = ReplayResponder(file, on_miss=on_miss, fallback=self.random)
+        elif self.latency.recorded:
+            raise ValueError("latency='recorded' only applies to provider='replay'")
+        self.responder = ScriptedResponder(script, self.random) if script else self.random
+        self._occurrences = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, provider: str, options: Optional[Dict[str, Any]] = None) -> "OfflineBackend":
+        options = dict(options or {})
+        options.setdefault("seed", int(os.getenv("FAKE_LLM_SEED", "0")))
+        options.setdefault("latency", os.getenv("FAKE_LLM_LATENCY"))
+        options.setdefault("error_rate", float(os.getenv("FAKE_LLM_ERROR_RATE", "0")))
+        options.setdefault("file", os.getenv("LLM_REPLAY_FILE"))
+        script = options.get("script")
+        if isinstance(script, str):
+            with open(script, "r", encoding="utf-8") as f:
+                options["script"] = json.load(f)
+        return cls(provider, **options)
+
+    def _prepare(self, messages, temperature, json_response):
+        """Picks the reply and its latency. Raises FakeProviderError for injected failures."""
+        key = request_key(messages, temperature, json_response)
+        with self._lock:
+            occurrence = self._occurrences[key]
+            self._occurrences[key] += 1
+        rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        latency_rng = random.Random(f"{self.seed}:{key}:{occurrence}:latency")
+        kind = call_kind(messages)
+
+        recorded = None
+        if self.replay is not None:
+            entry = self.replay.lookup(key, kind)
+            if entry is not None:
+                recorded = entry
+        delay = self.latency.sample(latency_rng, recorded.get("latency") if recorded else None)
+        if self.error_rate and latency_rng.random() < self.error_rate:
+            return None, delay
+        text = recorded["response"] if recorded else self.responder.reply(kind, messages, rng)
+        return text, delay
+
+    def complete(self, messages, temperature=0.7, json_response=False) -> str:
+        text, delay = self._prepare(messages, temperature, json_response)
+        if delay:
+            time.sleep(delay)
+        if text is None:
+            raise FakeProviderError("Injected failure (error_rate)")
+        return text
+
+    async def complete_async(self, messages, temperature=0.7, json_response=False) -> str:
+        text, delay = self._prepare(messages, temperature, json_response)
+        if delay:
+            await asyncio.sleep(delay)
+        if text is None:
+            raise FakeProviderError("Injected failure (error_rate)")
+        return text
+
+    def _chunks(self, text: str) -> List[str]:
+        words = re.findall(r"\S+\s*|\s+", text)
+        return ["".join(words[i:i + STREAM_CHUNK_WORDS]) for i in range(0, len(words), STREAM_CHUNK_WORDS)]
+
+    def stream(self, messages, temperature=0.7) -> Iterator[str]:
+        # The sampled latency is spread over the chunks, a third of it up front as time to first token
+        text, delay = self._prepare(messages, temperature, False)
+        if text is None:
+            time.sleep(delay / 3)
+            raise FakeProviderError("Injected failure (error_rate)")
+        chunks = self._chunks(text) or [""]
+        time.sleep(delay / 3)
+        for chunk in chunks:
+            yield chunk
+            time.sleep(delay * 2 / 3 / len(chunks))
+
+    async def stream_async(self, messages, temperature=0.7):
+        text, delay = self._prepare(messages, temperature, False)
+        if text is None:
+            await asyncio.sleep(delay / 3)
+            raise FakeProviderError("Injected failure (error_rate)")
+        chunks = self._chunks(text) or [""]
+        await asyncio.sleep(delay / 3)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(delay * 2 / 3 / len(chunks))
+
+
+class SessionRecorder:
+    """Appends every completed LLM call to a JSONL session file that provider="replay" can serve."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, role: str, messages: List[Dict], temperature: float, json_response: bool,
+               response: str, latency: float):
+        entry = {
+            "key": request_key(messages, temperature, json_response),
+            "kind": call_kind(messages),
+            "role": role,
+            "json_response": bool(json_response),
+            "messages": messages,
+            "response": response,
+            "latency": round(latency, 4),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+_recorders: Dict[str, SessionRecorder] = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder(path: Optional[str]) -> Optional[SessionRecorder]:
+    """The process-wide recorder for `path` (one per file, so concurrent clients don't interleave lines)."""
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    with _recorders_lock:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = SessionRecorder(path)
+            _recorders[path] = recorder
+        return recorder
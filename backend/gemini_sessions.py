@@ -0,0 +1,74 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import google.generativeai as genai
+
+
+def conversation_digest(model_name, system_instruction, turns) -> str:
+    """Identifies a conversation state: model + system instruction + every (role, text) turn so far."""
+    payload = json.dumps([model_name, system_instruction, turns], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GeminiSessionCache:
+    """
+    Keeps live Gemini ChatSessions between turns so a conversation doesn't rebuild the
+    GenerativeModel and re-convert its whole history on every call.
+
+    A session is filed under the digest of the conversation it holds. When the next
+    request's history (everything before the new user turn) has the same digest, the
+    session is checked out and only that new turn is sent. Sessions are checked out
+    exclusively, so two concurrent conversations never share one.
+    """
+
+    def __init__(self, max_sessions=256, max_models=32):
+        self.max_sessions = max_sessions
+        self.max_models = max_models
+        self._sessions = OrderedDict()  # digest -> ChatSession
+        self._models = OrderedDict()    # (model_name, system_instruction) -> GenerativeModel
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def model(self, model_name, system_instruction):
+        key = (model_name, system_instruction)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+
+        model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+        with self._lock:
+            self._models[key] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return model
+
+    def checkout(self, model_name, system_instruction, turns, gemini_history):
+        """Returns a session already holding `turns`, or a fresh one built from `gemini_history`."""
+        digest = conversation_digest(model_name, system_instruction, turns)
+        with self._lock:
+            chat = self._sessions.pop(digest, None)
+            if chat is not None:
+                self.stats["hits"] += 1
+                return chat
+            self.stats["misses"] += 1
+
+        return self.model(model_name, system_instruction).start_chat(history=gemini_history)
+
+    def checkin(self, model_name, system_instruction, turns, chat):
+        """Files a session under the conversation it now holds (history + the turn just completed)."""
+        digest = conversation_digest(model_name, system_instruction, turns)
+        with self._lock:
+            self._sessions[digest] = chat
+            self._sessions.move_to_end(digest)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._models.clear()
@@ -1,91 +1,729 @@
 import sqlite3
 import json
-import os
+import base64
+import hashlib
+import threading
+import zlib
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# PRAGMA user_version of the normalized schema. Files at 0 are either new or use
+# the original one-row-per-run layout (config/results/optimization_history blobs).
+# Version 2 stored transcripts as plain JSON text; 3 compresses them; 4 adds run
+# status and checkpoints so runs are written as they go and can be resumed.
+SCHEMA_VERSION = 4
+
+# Run statuses a run can be resumed from (a run still "running" at startup was interrupted)
+RESUMABLE = ("interrupted", "cancelled", "failed")
+
+# Config fields safe and useful to show in run summaries (never the API key)
+DIGEST_FIELDS = ("model_name", "batch_size", "max_cycles", "concurrency", "thresholds")
+PROMPT_PREVIEW_CHARS = 400
+
+# Result keys that have their own columns; anything else is kept in `extra`
+SCENARIO_COLUMNS = ("cycle", "persona", "score", "metrics", "transcript", "feedback", "passed", "prompt_used", "updated_prompt")
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS runs (
+        id TEXT PRIMARY KEY,
+        timestamp TEXT,
+        success_rate REAL,
+        total_cycles INTEGER,
+        config TEXT,
+        status TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_runs_cursor ON runs(timestamp, id);
+
+    CREATE TABLE IF NOT EXISTS prompts (
+        id INTEGER PRIMARY KEY,
+        hash TEXT UNIQUE,
+        text TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS scenarios (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT REFERENCES runs(id) ON DELETE CASCADE,
+        position INTEGER,
+        cycle INTEGER,
+        persona TEXT,
+        score REAL,
+        feedback TEXT,
+        passed INTEGER,
+        transcript BLOB,
+        prompt_used_id INTEGER REFERENCES prompts(id),
+        updated_prompt_id INTEGER REFERENCES prompts(id),
+        extra TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_scenarios_run ON scenarios(run_id, position);
+    CREATE INDEX IF NOT EXISTS idx_scenarios_passed ON scenarios(passed, run_id);
+
+    CREATE TABLE IF NOT EXISTS scenario_metrics (
+        scenario_id INTEGER REFERENCES scenarios(id) ON DELETE CASCADE,
+        name TEXT,
+        value,
+        PRIMARY KEY (scenario_id, name)
+    );
+
+    CREATE TABLE IF NOT EXISTS run_metrics (
+        run_id TEXT REFERENCES runs(id) ON DELETE CASCADE,
+        name TEXT,
+        value,
+        PRIMARY KEY (run_id, name)
+    );
+
+    CREATE TABLE IF NOT EXISTS optimizations (
+        id INTEGER PRIMARY KEY,
+        run_id TEXT REFERENCES runs(id) ON DELETE CASCADE,
+        position INTEGER,
+        cycle INTEGER,
+        old_prompt_id INTEGER REFERENCES prompts(id),
+        new_prompt_id INTEGER REFERENCES prompts(id),
+        reasoning TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_optimizations_run ON optimizations(run_id, position);
+
+    CREATE TABLE IF NOT EXISTS run_checkpoints (
+        run_id TEXT PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+        cycle INTEGER,
+        position INTEGER,
+        prompt_id INTEGER REFERENCES prompts(id),
+        state TEXT,
+        updated_at TEXT
+    );
+'''
+
+
+def _flatten_metrics(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """{"cache": {"hits": 3}} -> {"cache.hits": 3}. Leaves must be scalars (or None)."""
+    flat = {}
+    for key, value in (metrics or {}).items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten_metrics(value, f"{name}."))
+        elif isinstance(value, (list, tuple)):
+            flat[name] = json.dumps(value)
+        else:
+            flat[name] = value
+    return flat
+
+
+def _compress_transcript(transcript) -> bytes:
+    return zlib.compress(json.dumps(transcript or []).encode("utf-8"))
+
+
+def _decompress_transcript(value) -> List[Dict[str, Any]]:
+    if not value:
+        return []
+    if isinstance(value, bytes):
+        return json.loads(zlib.decompress(value).decode("utf-8"))
+    return json.loads(value) # Schema v2 rows, before compression
+
+
+def _encode_cursor(timestamp: str, run_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([timestamp, run_id]).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, run_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return timestamp, run_id
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+def config_digest(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Small, key-free view of a run config for list pages."""
+    config = config or {}
+    public = {k: v for k, v in config.items() if k != "api_key"}
+    digest = {
+        "hash": hashlib.sha256(json.dumps(public, sort_keys=True).encode("utf-8")).hexdigest()[:12],
+        "prompt_preview": (config.get("base_prompt") or "")[:PROMPT_PREVIEW_CHARS],
+    }
+    for field in DIGEST_FIELDS:
+        if field in config:
+            digest[field] = config[field]
+    return digest
+
+
+def _unflatten_metrics(rows) -> Dict[str, Any]:
+    nested = {}
+    for name, value in rows:
+        node = nested
+        parts = name.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return nested
+
 
 class HistoryManager:
     def __init__(self, db_file="history.db"):
         self.db_file = db_file
+        # One connection for the life of the manager (WAL lets readers run alongside the writer);
+        # the lock serializes use of it across the threads asyncio.to_thread hands us.
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._lock = threading.RLock()
         self._init_db()
 
     def _init_db(self):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS runs (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT,
-                success_rate REAL,
-                total_cycles INTEGER,
-                config TEXT,
-                results TEXT,
-                optimization_history TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
-
-    def load_history(self) -> List[Dict[str, Any]]:
-        conn = sqlite3.connect(self.db_file)
-        # Use a dict factory to get dictionary results directly if preferred, 
-        # but manual mapping gives us control over JSON decoding.
-        c = conn.cursor()
-        c.execute('SELECT id, timestamp, success_rate, total_cycles, config, results, optimization_history FROM runs ORDER BY timestamp DESC')
-        rows = c.fetchall()
-        conn.close()
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute('PRAGMA journal_mode=WAL')
+            c.execute('PRAGMA synchronous=NORMAL')
+            c.execute('PRAGMA foreign_keys=ON')
 
-        history = []
+            version = c.execute('PRAGMA user_version').fetchone()[0]
+            c.execute('BEGIN')
+            try:
+                if version < 2 and self._has_legacy_runs(c):
+                    self._migrate_legacy(c)
+                else:
+                    self._create_schema(c)
+                    if version == 2:
+                        self._upgrade_v2(c)
+                    if version in (2, 3):
+                        self._upgrade_v3(c)
+                    c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def _create_schema(self, c):
+        # Statement by statement (not executescript) so it stays inside the caller's transaction
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                c.execute(statement)
+
+    def _has_legacy_runs(self, c) -> bool:
+        columns = [row[1] for row in c.execute('PRAGMA table_info(runs)')]
+        return "results" in columns
+
+    def _migrate_legacy(self, c):
+        """Moves a blob-per-run database onto the normalized schema, in one transaction."""
+        print("[HistoryManager] Migrating history database to the normalized schema...")
+        c.execute('ALTER TABLE runs RENAME TO runs_legacy')
+        self._create_schema(c)
+
+        legacy_columns = [row[1] for row in c.execute('PRAGMA table_info(runs_legacy)')]
+        has_metrics = "metrics" in legacy_columns
+        rows = c.execute(
+            'SELECT id, timestamp, success_rate, total_cycles, config, results, optimization_history'
+            + (', metrics' if has_metrics else '') + ' FROM runs_legacy'
+        ).fetchall()
+
+        migrated = 0
         for row in rows:
             try:
-                history.append({
+                run_data = {
                     "id": row[0],
                     "timestamp": row[1],
                     "success_rate": row[2],
                     "total_cycles": row[3],
-                    "config": json.loads(row[4]),
-                    "results": json.loads(row[5]),
-                    "optimization_history": json.loads(row[6])
-                })
+                    "config": json.loads(row[4]) if row[4] else {},
+                    "results": json.loads(row[5]) if row[5] else [],
+                    "optimization_history": json.loads(row[6]) if row[6] else [],
+                    "metrics": json.loads(row[7]) if has_metrics and row[7] else {},
+                }
             except json.JSONDecodeError:
-                continue # Skip corrupted rows
-                
-        return history
+                continue # Skip corrupted rows, same as load_history always did
+            self._write_run(c, run_data)
+            migrated += 1
 
-    def save_run(self, run_data: Dict[str, Any]):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        
+        c.execute('DROP TABLE runs_legacy')
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        print(f"[HistoryManager] Migrated {migrated}/{len(rows)} runs.")
+
+    def _upgrade_v2(self, c):
+        """v2 -> v3: compress transcripts, replace the timestamp index with the cursor index."""
+        c.execute('DROP INDEX IF EXISTS idx_runs_timestamp')
+        rows = c.execute("SELECT id, transcript FROM scenarios WHERE typeof(transcript) = 'text'").fetchall()
+        for scenario_id, transcript in rows:
+            try:
+                packed = _compress_transcript(json.loads(transcript))
+            except json.JSONDecodeError:
+                continue
+            c.execute('UPDATE scenarios SET transcript = ? WHERE id = ?', (packed, scenario_id))
+
+    def _upgrade_v3(self, c):
+        """v3 -> v4: run status column (existing runs were saved whole, so they are complete)."""
+        c.execute('ALTER TABLE runs ADD COLUMN status TEXT')
+        c.execute("UPDATE runs SET status = 'completed'")
+
+    # --- Writes ---
+
+    def _prompt_id(self, c, text: Optional[str]) -> Optional[int]:
+        """Prompts repeat across every scenario of a run, so they are stored once by hash."""
+        if text is None:
+            return None
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        c.execute('INSERT OR IGNORE INTO prompts (hash, text) VALUES (?, ?)', (digest, text))
+        return c.execute('SELECT id FROM prompts WHERE hash = ?', (digest,)).fetchone()[0]
+
+    def _write_scenario(self, c, run_id: str, position: int, result: Dict[str, Any]):
+        extra = {k: v for k, v in result.items() if k not in SCENARIO_COLUMNS}
+        c.execute('''
+            INSERT INTO scenarios (run_id, position, cycle, persona, score, feedback, passed, transcript,
+                                   prompt_used_id, updated_prompt_id, extra)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            run_id,
+            position,
+            result.get("cycle"),
+            json.dumps(result.get("persona")),
+            result.get("score"),
+            result.get("feedback"),
+            1 if result.get("passed") else 0,
+            _compress_transcript(result.get("transcript", [])),
+            self._prompt_id(c, result.get("prompt_used")),
+            self._prompt_id(c, result.get("updated_prompt")),
+            json.dumps(extra) if extra else None
+        ))
+        scenario_id = c.lastrowid
+        c.executemany(
+            'INSERT INTO scenario_metrics (scenario_id, name, value) VALUES (?, ?, ?)',
+            [(scenario_id, name, value) for name, value in _flatten_metrics(result.get("metrics")).items()]
+        )
+
+    def _write_optimization(self, c, run_id: str, position: int, entry: Dict[str, Any]):
+        c.execute('''
+            INSERT INTO optimizations (run_id, position, cycle, old_prompt_id, new_prompt_id, reasoning)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            run_id,
+            position,
+            entry.get("cycle"),
+            self._prompt_id(c, entry.get("old_prompt")),
+            self._prompt_id(c, entry.get("new_prompt")),
+            entry.get("reasoning")
+        ))
+
+    def _write_run(self, c, run_data: Dict[str, Any]):
         # Ensure ID and Timestamp
         run_id = run_data.get("id") or datetime.now().strftime("%Y%m%d%H%M%S")
         timestamp = run_data.get("timestamp") or datetime.now().isoformat()
-        
+
+        # Same "replace" semantics as before: a re-saved run overwrites its old rows
+        c.execute('DELETE FROM runs WHERE id = ?', (run_id,))
         c.execute('''
-            INSERT OR REPLACE INTO runs (id, timestamp, success_rate, total_cycles, config, results, optimization_history)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO runs (id, timestamp, success_rate, total_cycles, config, status)
+            VALUES (?, ?, ?, ?, ?, ?)
         ''', (
             run_id,
             timestamp,
             run_data.get("success_rate", 0.0),
             run_data.get("total_cycles", 0),
             json.dumps(run_data.get("config", {})),
-            json.dumps(run_data.get("results", [])),
-            json.dumps(run_data.get("optimization_history", []))
+            run_data.get("status", "completed")
         ))
-        
-        conn.commit()
-        conn.close()
+
+        for position, result in enumerate(run_data.get("results", [])):
+            self._write_scenario(c, run_id, position, result)
+        for position, entry in enumerate(run_data.get("optimization_history", [])):
+            self._write_optimization(c, run_id, position, entry)
+        c.executemany(
+            'INSERT INTO run_metrics (run_id, name, value) VALUES (?, ?, ?)',
+            [(run_id, name, value) for name, value in _flatten_metrics(run_data.get("metrics")).items()]
+        )
+
+    def save_run(self, run_data: Dict[str, Any]):
+        with self._lock:
+            c = self._conn.cursor()
+            try:
+                self._write_run(c, run_data)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    # --- Incremental writes (a run in progress) ---
+
+    def _transaction(self, write):
+        with self._lock:
+            c = self._conn.cursor()
+            try:
+                value = write(c)
+                self._conn.commit()
+                return value
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def start_run(self, run_id: str, config: Dict[str, Any], timestamp: Optional[str] = None):
+        """Creates the run row up front (or, for a resumed run, marks it running again)."""
+        def write(c):
+            c.execute('''
+                INSERT OR IGNORE INTO runs (id, timestamp, success_rate, total_cycles, config, status)
+                VALUES (?, ?, 0.0, 0, ?, 'running')
+            ''', (run_id, timestamp or datetime.now().isoformat(), json.dumps(config)))
+            c.execute("UPDATE runs SET status = 'running' WHERE id = ?", (run_id,))
+        self._transaction(write)
+
+    def append_progress(self, run_id: str, results: List[Dict[str, Any]] = (),
+                        optimizations: List[Dict[str, Any]] = (), checkpoint: Optional[Dict[str, Any]] = None):
+        """
+        Appends scenario results and optimization steps to a run and moves its
+        checkpoint, all in one transaction, so a crash never leaves a result
+        recorded without the checkpoint that accounts for it (or vice versa).
+        """
+        def write(c):
+            if results:
+                position = c.execute(
+                    'SELECT COALESCE(MAX(position), -1) + 1 FROM scenarios WHERE run_id = ?', (run_id,)
+                ).fetchone()[0]
+                for offset, result in enumerate(results):
+                    self._write_scenario(c, run_id, position + offset, result)
+            if optimizations:
+                position = c.execute(
+                    'SELECT COALESCE(MAX(position), -1) + 1 FROM optimizations WHERE run_id = ?', (run_id,)
+                ).fetchone()[0]
+                for offset, entry in enumerate(optimizations):
+                    self._write_optimization(c, run_id, position + offset, entry)
+            if checkpoint is not None:
+                c.execute('''
+                    INSERT OR REPLACE INTO run_checkpoints (run_id, cycle, position, prompt_id, state, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (
+                    run_id,
+                    checkpoint["cycle"],
+                    checkpoint["position"],
+                    self._prompt_id(c, checkpoint.get("prompt")),
+                    json.dumps(checkpoint.get("state") or {}),
+                    datetime.now().isoformat()
+                ))
+        self._transaction(write)
+
+    def finish_run(self, run_id: str, status: str, total_cycles: int, metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Final totals for a run written with append_progress. Returns {"scenarios", "success_rate"}."""
+        def write(c):
+            scenarios, passed = c.execute(
+                'SELECT COUNT(*), COALESCE(SUM(passed), 0) FROM scenarios WHERE run_id = ?', (run_id,)
+            ).fetchone()
+            success_rate = passed / scenarios if scenarios else 0.0
+            c.execute(
+                'UPDATE runs SET status = ?, success_rate = ?, total_cycles = ? WHERE id = ?',
+                (status, success_rate, total_cycles, run_id)
+            )
+            c.execute('DELETE FROM run_metrics WHERE run_id = ?', (run_id,))
+            c.executemany(
+                'INSERT INTO run_metrics (run_id, name, value) VALUES (?, ?, ?)',
+                [(run_id, name, value) for name, value in _flatten_metrics(metrics).items()]
+            )
+            if status == "completed":
+                c.execute('DELETE FROM run_checkpoints WHERE run_id = ?', (run_id,))
+            return {"scenarios": scenarios, "success_rate": success_rate}
+        return self._transaction(write)
+
+    def mark_interrupted(self) -> int:
+        """At startup: runs left "running" by a previous process died with it."""
+        def write(c):
+            c.execute("UPDATE runs SET status = 'interrupted' WHERE status = 'running'")
+            return c.rowcount
+        return self._transaction(write)
+
+    def get_checkpoint(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """What a resume needs: status, full config (with the API key), and where the run stopped."""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT r.status, r.config, k.cycle, k.position, p.text, k.state
+                FROM runs r
+                LEFT JOIN run_checkpoints k ON k.run_id = r.id
+                LEFT JOIN prompts p ON p.id = k.prompt_id
+                WHERE r.id = ?
+            ''', (run_id,)).fetchone()
+        if row is None:
+            return None
+        config = json.loads(row[1]) if row[1] else {}
+        return {
+            "status": row[0] or "completed",
+            "config": config,
+            "cycle": row[2] if row[2] is not None else 1,
+            "position": row[3] or 0,
+            "prompt": row[4] if row[4] is not None else config.get("base_prompt"),
+            "state": json.loads(row[5]) if row[5] else {},
+        }
+
+    # --- Reads ---
+
+    def _load_prompts(self, c, ids) -> Dict[int, str]:
+        ids = [i for i in set(ids) if i is not None]
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        return dict(c.execute(f'SELECT id, text FROM prompts WHERE id IN ({placeholders})', ids).fetchall())
+
+    def _result_from_row(self, s, metric_rows, prompts, include_transcript=True) -> Optional[Dict[str, Any]]:
+        # s = (id, run_id, cycle, persona, score, feedback, passed, transcript, prompt_used_id, updated_prompt_id, extra)
+        try:
+            result = {
+                "cycle": s[2],
+                "persona": json.loads(s[3]) if s[3] else None,
+                "score": s[4],
+                "metrics": _unflatten_metrics(metric_rows),
+                "feedback": s[5],
+                "passed": bool(s[6]),
+                "prompt_used": prompts.get(s[8]),
+                "updated_prompt": prompts.get(s[9]),
+            }
+            if include_transcript:
+                result["transcript"] = _decompress_transcript(s[7])
+            if s[10]:
+                result.update(json.loads(s[10]))
+        except (json.JSONDecodeError, zlib.error):
+            return None
+        return result
+
+    def _load_details(self, c, run_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Results, optimization history and metrics for a set of runs, in a fixed number of queries."""
+        details = {run_id: {"results": [], "optimization_history": [], "metrics": {}} for run_id in run_ids}
+        if not run_ids:
+            return details
+        placeholders = ",".join("?" * len(run_ids))
+
+        scenarios = c.execute(f'''
+            SELECT id, run_id, cycle, persona, score, feedback, passed, transcript,
+                   prompt_used_id, updated_prompt_id, extra
+            FROM scenarios WHERE run_id IN ({placeholders}) ORDER BY run_id, position
+        ''', run_ids).fetchall()
+        optimizations = c.execute(f'''
+            SELECT run_id, cycle, old_prompt_id, new_prompt_id, reasoning
+            FROM optimizations WHERE run_id IN ({placeholders}) ORDER BY run_id, position
+        ''', run_ids).fetchall()
+
+        scenario_metrics = {}
+        for scenario_id, name, value in c.execute(f'''
+            SELECT m.scenario_id, m.name, m.value FROM scenario_metrics m
+            JOIN scenarios s ON s.id = m.scenario_id WHERE s.run_id IN ({placeholders})
+        ''', run_ids):
+            scenario_metrics.setdefault(scenario_id, []).append((name, value))
+
+        run_metrics = {}
+        for run_id, name, value in c.execute(
+            f'SELECT run_id, name, value FROM run_metrics WHERE run_id IN ({placeholders})', run_ids
+        ):
+            run_metrics.setdefault(run_id, []).append((name, value))
+
+        prompts = self._load_prompts(
+            c,
+            [s[8] for s in scenarios] + [s[9] for s in scenarios] + [o[2] for o in optimizations] + [o[3] for o in optimizations]
+        )
+
+        for s in scenarios:
+            result = self._result_from_row(s, scenario_metrics.get(s[0], []), prompts)
+            if result is not None:
+                details[s[1]]["results"].append(result)
+
+        for o in optimizations:
+            details[o[0]]["optimization_history"].append({
+                "cycle": o[1],
+                "old_prompt": prompts.get(o[2]),
+                "new_prompt": prompts.get(o[3]),
+                "reasoning": o[4],
+            })
+
+        for run_id, rows in run_metrics.items():
+            details[run_id]["metrics"] = _unflatten_metrics(rows)
+
+        return details
+
+    def load_history(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict[str, Any]]:
+        """Newest runs first. `limit` bounds the work per call no matter how big the store gets."""
+        with self._lock:
+            c = self._conn.cursor()
+            query = 'SELECT id, timestamp, success_rate, total_cycles, config FROM runs ORDER BY timestamp DESC'
+            params = []
+            if limit is not None:
+                query += ' LIMIT ? OFFSET ?'
+                params = [limit, offset]
+            rows = c.execute(query, params).fetchall()
+            details = self._load_details(c, [row[0] for row in rows])
+
+        history = []
+        for row in rows:
+            try:
+                config = json.loads(row[4]) if row[4] else {}
+            except json.JSONDecodeError:
+                continue # Skip corrupted rows
+            history.append({
+                "id": row[0],
+                "timestamp": row[1],
+                "success_rate": row[2],
+                "total_cycles": row[3],
+                "config": config,
+                **details[row[0]]
+            })
+
+        return history
+
+    def list_runs(self, limit: int = 50, cursor: Optional[str] = None, min_success_rate: Optional[float] = None,
+                  max_success_rate: Optional[float] = None, since: Optional[str] = None, until: Optional[str] = None,
+                  model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of run summaries, newest first. Pagination is keyset on (timestamp, id),
+        so a page costs the same at 100 runs or 100k and doesn't shift when runs are added.
+        Pass the returned `next_cursor` back to get the following page (None on the last one).
+        """
+        where, params = [], []
+        if cursor:
+            timestamp, run_id = _decode_cursor(cursor)
+            where.append('(r.timestamp, r.id) < (?, ?)')
+            params += [timestamp, run_id]
+        if min_success_rate is not None:
+            where.append('r.success_rate >= ?')
+            params.append(min_success_rate)
+        if max_success_rate is not None:
+            where.append('r.success_rate <= ?')
+            params.append(max_success_rate)
+        if since:
+            where.append('r.timestamp >= ?')
+            params.append(since)
+        if until:
+            where.append('r.timestamp <= ?')
+            params.append(until)
+        if model_name:
+            where.append("json_extract(r.config, '$.model_name') = ?")
+            params.append(model_name)
+
+        # Per-run aggregates are correlated subqueries on idx_scenarios_run, so only
+        # the rows on this page pay for them.
+        query = '''
+            SELECT r.id, r.timestamp, r.success_rate, r.total_cycles, r.config,
+                   (SELECT COUNT(*) FROM scenarios s WHERE s.run_id = r.id),
+                   (SELECT COALESCE(SUM(s.passed), 0) FROM scenarios s WHERE s.run_id = r.id),
+                   (SELECT AVG(s.score) FROM scenarios s WHERE s.run_id = r.id),
+                   COALESCE(r.status, 'completed')
+            FROM runs r
+        '''
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY r.timestamp DESC, r.id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        page = rows[:limit]
+        runs = []
+        for row in page:
+            try:
+                config = json.loads(row[4]) if row[4] else {}
+            except json.JSONDecodeError:
+                config = {}
+            runs.append({
+                "id": row[0],
+                "timestamp": row[1],
+                "success_rate": row[2],
+                "total_cycles": row[3],
+                "config_digest": config_digest(config),
+                "scenario_count": row[5],
+                "passed_count": row[6],
+                "avg_score": row[7],
+                "status": row[8],
+            })
+
+        next_cursor = _encode_cursor(page[-1][1], page[-1][0]) if len(rows) > limit and page else None
+        return {"runs": runs, "next_cursor": next_cursor}
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Full detail for one run (results with transcripts, optimization history, metrics)."""
+        with self._lock:
+            c = self._conn.cursor()
+            row = c.execute(
+                'SELECT id, timestamp, success_rate, total_cycles, config, status FROM runs WHERE id = ?', (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            details = self._load_details(c, [run_id])
+
+        try:
+            config = json.loads(row[4]) if row[4] else {}
+        except json.JSONDecodeError:
+            config = {}
+        config.pop("api_key", None)
+        return {
+            "id": row[0],
+            "timestamp": row[1],
+            "success_rate": row[2],
+            "total_cycles": row[3],
+            "status": row[5] or "completed",
+            "config": config,
+            **details[run_id]
+        }
+
+    def list_scenarios(self, run_id: str, limit: int = 100, offset: int = 0, passed: Optional[bool] = None,
+                       cycle: Optional[int] = None, include_transcripts: bool = True) -> List[Dict[str, Any]]:
+        """A slice of one run's scenarios in run order, optionally only passes/failures or one cycle."""
+        where, params = ['run_id = ?'], [run_id]
+        if passed is not None:
+            where.append('passed = ?')
+            params.append(1 if passed else 0)
+        if cycle is not None:
+            where.append('cycle = ?')
+            params.append(cycle)
+        transcript_column = 'transcript' if include_transcripts else 'NULL'
+        params += [limit, offset]
+
+        with self._lock:
+            c = self._conn.cursor()
+            scenarios = c.execute(f'''
+                SELECT id, run_id, cycle, persona, score, feedback, passed, {transcript_column},
+                       prompt_used_id, updated_prompt_id, extra
+                FROM scenarios WHERE {' AND '.join(where)} ORDER BY position LIMIT ? OFFSET ?
+            ''', params).fetchall()
+            if not scenarios:
+                return []
+
+            ids = [s[0] for s in scenarios]
+            placeholders = ",".join("?" * len(ids))
+            scenario_metrics = {}
+            for scenario_id, name, value in c.execute(
+                f'SELECT scenario_id, name, value FROM scenario_metrics WHERE scenario_id IN ({placeholders})', ids
+            ):
+                scenario_metrics.setdefault(scenario_id, []).append((name, value))
+            prompts = self._load_prompts(c, [s[8] for s in scenarios] + [s[9] for s in scenarios])
+
+        results = []
+        for s in scenarios:
+            result = self._result_from_row(s, scenario_metrics.get(s[0], []), prompts, include_transcripts)
+            if result is not None:
+                results.append(result)
+        return results
 
     def delete_run(self, run_id: str):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('DELETE FROM runs WHERE id = ?', (run_id,))
-        conn.commit()
-        conn.close()
+        """Deletes the run (its rows cascade) and the prompts no other run still references."""
+        def write(c):
+            prompt_ids = [row[0] for row in c.execute('''
+                SELECT prompt_used_id FROM scenarios WHERE run_id = ?
+                UNION SELECT updated_prompt_id FROM scenarios WHERE run_id = ?
+                UNION SELECT old_prompt_id FROM optimizations WHERE run_id = ?
+                UNION SELECT new_prompt_id FROM optimizations WHERE run_id = ?
+                UNION SELECT prompt_id FROM run_checkpoints WHERE run_id = ?
+            ''', (run_id,) * 5) if row[0] is not None]
+            c.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+            for start in range(0, len(prompt_ids), 500):
+                chunk = prompt_ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                # One pass per referencing column, not one lookup per prompt (none of them is indexed)
+                c.execute(f'''
+                    DELETE FROM prompts WHERE id IN (
+                        SELECT id FROM prompts WHERE id IN ({marks})
+                        EXCEPT SELECT prompt_used_id FROM scenarios
+                        EXCEPT SELECT updated_prompt_id FROM scenarios
+                        EXCEPT SELECT old_prompt_id FROM optimizations
+                        EXCEPT SELECT new_prompt_id FROM optimizations
+                        EXCEPT SELECT prompt_id FROM run_checkpoints
+                    )
+                ''', chunk)
+
+        self._transaction(write)
 
     def clear_history(self):
-        conn = sqlite3.connect(self.db_file)
-        c = conn.cursor()
-        c.execute('DELETE FROM runs')
-        conn.commit()
-        conn.close()
+        def write(c):
+            c.execute('DELETE FROM runs')
+            c.execute('DELETE FROM prompts')
+
+        self._transaction(write)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
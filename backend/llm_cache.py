@@ -0,0 +1,162 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Per-call cache modes accepted by LLMClient.complete_chat(cache_mode=...)
+CACHE_USE = "use"          # Serve from cache if present, store on miss
+CACHE_BYPASS = "bypass"    # Don't read or write the cache
+CACHE_REFRESH = "refresh"  # Always call the provider, overwrite the cached entry
+CACHE_MODES = (CACHE_USE, CACHE_BYPASS, CACHE_REFRESH)
+
+
+def make_cache_key(provider, model_name, messages, temperature, stop, json_response, occurrence=0, schema=None) -> str:
+    """
+    Content address of a completion request.
+
+    `occurrence` is the number of times the client has already sent this exact
+    request. Identical requests (e.g. persona generation) would otherwise all
+    collapse onto one cached answer; with it, a re-run replays the same sequence.
+    `schema` is the JSON schema of a structured-output call: the request sent
+    differs (a forced tool call, a response schema), and so may the reply.
+    """
+    request = {
+        "provider": provider,
+        "model": model_name,
+        "messages": messages,
+        "temperature": temperature,
+        "stop": stop,
+        "json_response": json_response,
+        "occurrence": occurrence,
+    }
+    if schema is not None:
+        request["schema"] = schema  # Only when set, so plain calls keep their existing keys
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier completion cache: an in-memory LRU in front of a SQLite file.
+    Entries expire after `ttl_seconds`; the disk tier is trimmed (least recently
+    used first) once it grows past `max_disk_bytes`.
+    """
+
+    def __init__(self, db_file="llm_cache.db", max_memory_entries=1024, max_disk_bytes=256 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600, evict_every=50):
+        self.db_file = db_file
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+
+        self._memory = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        self._conn = None
+        if self.db_file:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    created_at REAL,
+                    last_access REAL,
+                    size INTEGER
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)')
+            self._conn.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT value, created_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+                        self._conn.commit()
+                        self._remember(key, value, created_at)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    self._conn.commit()
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        if value is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.stats["writes"] += 1
+
+            if self._conn is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO responses (key, value, created_at, last_access, size) VALUES (?, ?, ?, ?, ?)',
+                    (key, value, now, now, len(value.encode("utf-8")))
+                )
+                self._conn.commit()
+                self._writes_since_evict += 1
+                if self._writes_since_evict >= self.evict_every:
+                    self._evict_disk(now)
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        """Drops expired rows, then least-recently-used rows until under the size cap."""
+        self._writes_since_evict = 0
+        c = self._conn.cursor()
+        if self.ttl_seconds:
+            c.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl_seconds,))
+            self.stats["evictions"] += c.rowcount
+
+        total = c.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if self.max_disk_bytes and total > self.max_disk_bytes:
+            for key, size in c.execute('SELECT key, size FROM responses ORDER BY last_access ASC').fetchall():
+                if total <= self.max_disk_bytes:
+                    break
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                total -= size
+                self.stats["evictions"] += 1
+        self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM responses')
+                self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,20 +1,100 @@
 import os
+import copy
 import time
+import asyncio
+import inspect
 import httpx # S-Tier Fix: Robust timeouts
 import google.generativeai as genai
-from openai import OpenAI
-from groq import Groq, RateLimitError # S-Tier Fix: Handling 429s
+from openai import OpenAI, AsyncOpenAI
+from groq import Groq, AsyncGroq, RateLimitError # S-Tier Fix: Handling 429s
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter, parse_duration, OUTPUT_TOKEN_ALLOWANCE
+from token_budget import estimate_tokens, estimate_text_tokens
+from gemini_sessions import GeminiSessionCache
+from llm_cache import make_cache_key, CACHE_USE, CACHE_BYPASS, CACHE_MODES
+from llm_metrics import (CallRecord, CallStats, current_call, llm_metrics, note_usage, note_error, note_retry,
+                         note_rate_limited)
+from fake_llm import OfflineBackend, FakeProviderError, get_recorder
+from structured_output import StructuredOutputError, parse_model, json_schema, repair_messages, new_structured_stats, structured_rates
+from collections import OrderedDict
 
 load_dotenv()
 
+# Distinct requests whose repeat count a client remembers for cache keys (least recently seen dropped first)
+CACHE_OCCURRENCE_KEYS = 10000
+
+
+def _reset_call(token):
+    # A generator can be finalized from another context (e.g. aclose() after a cancel)
+    try:
+        current_call.reset(token)
+    except ValueError:
+        pass
+
+
+class StopSequenceFilter:
+    """
+    Applies stop sequences to a stream of deltas. Holds back just enough text to
+    catch a stop sequence split across chunks, and flags `stopped` once one appears
+    so the caller can close the stream instead of paying for the rest.
+    """
+
+    def __init__(self, stop=None):
+        self.stop = [s for s in (stop or []) if s]
+        self.hold = max((len(s) for s in self.stop), default=1) - 1
+        self.buffer = ""
+        self.stopped = False
+
+    def feed(self, delta: str) -> str:
+        if self.stopped:
+            return ""
+        self.buffer += delta
+        hits = [self.buffer.find(s) for s in self.stop]
+        hits = [i for i in hits if i >= 0]
+        if hits:
+            out = self.buffer[:min(hits)]
+            self.buffer = ""
+            self.stopped = True
+            return out
+        if self.hold and len(self.buffer) > self.hold:
+            out, self.buffer = self.buffer[:-self.hold], self.buffer[-self.hold:]
+            return out
+        if not self.hold:
+            out, self.buffer = self.buffer, ""
+            return out
+        return ""
+
+    def flush(self) -> str:
+        out, self.buffer = self.buffer, ""
+        return out
+
+
 class LLMClient:
-    def __init__(self, provider="gemini", api_key=None, model_name=None, base_url=None):
+    def __init__(self, provider="gemini", api_key=None, model_name=None, base_url=None, rpm=None, tpm=None, cache=None,
+                 role="default", offline=None, record_path=None):
         self.provider = provider
         self.api_key = api_key
         self.model_name = model_name
         self.base_url = base_url
 
+        # Metrics label for calls made through this client (see with_role) and its usage totals
+        self.role = role
+        self.call_stats = CallStats()
+
+        # Optional ResponseCache (see llm_cache.py); None disables caching entirely
+        self.cache = cache
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self._cache_occurrences = OrderedDict()  # base key -> times seen, bounded by CACHE_OCCURRENCE_KEYS
+
+        # Per-client counters; the budget itself lives in the shared limiter
+        self.rate_limit_stats = {"waits": 0, "wait_seconds": 0.0, "rate_limit_errors": 0}
+
+        # Outcomes of complete_chat(schema=...) calls (see structured_output.py)
+        self.structured_stats = new_structured_stats()
+
+        # Appends every completed call to a session file provider="replay" can serve later
+        self.recorder = get_recorder(record_path or os.getenv("LLM_RECORD_PATH"))
+
         # Defaults if not provided
         if not self.provider:
             self.provider = "gemini"
@@ -26,6 +106,9 @@ class LLMClient:
                 print("WARNING: GEMINI_API_KEY missing.")
             else:
                 genai.configure(api_key=self.api_key)
+
+            # Live chat sessions reused across turns of the same conversation (None disables)
+            self.gemini_sessions = GeminiSessionCache()
             
             if not self.model_name:
                 self.model_name = "gemini-flash-latest"
@@ -42,6 +125,11 @@ class LLMClient:
                 api_key=self.api_key,
                 timeout=httpx.Timeout(60.0, connect=10.0)
             )
+            # Async twin for complete_chat_async (no thread per in-flight call)
+            self.async_client = AsyncGroq(
+                api_key=self.api_key,
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
             
             if not self.model_name:
                 self.model_name = "llama-3.1-70b-versatile"
@@ -59,21 +147,466 @@ class LLMClient:
                 self.base_url = "http://localhost:1234/v1"
 
             self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
             
             if not self.model_name:
                 self.model_name = "gpt-4o" if self.provider == "openai" else "local-model"
 
-    def complete_chat(self, messages, temperature=0.7, json_response=False, stop=None):
+        elif self.provider in ["fake", "replay"]:
+            # No network: generated or recorded replies (see fake_llm.py for the options)
+            self.offline = OfflineBackend.from_options(self.provider, offline)
+
+            if not self.model_name:
+                self.model_name = self.provider
+
+        # Process-wide limiter: every client on the same provider + key draws from one budget
+        self.rate_limiter = get_rate_limiter(self.provider, self.api_key, rpm=rpm, tpm=tpm)
+
+    def with_role(self, role: str) -> "LLMClient":
+        """
+        The same client (connections, cache, limiter, counters) with calls labelled
+        as `role` in the metrics, e.g. one shared client handed out as "agent" and "evaluator".
+        """
+        view = copy.copy(self)
+        view.role = role
+        return view
+
+    def _begin_call(self, streaming=False):
+        record = CallRecord(self.provider, self.model_name, self.role, streaming=streaming)
+        return record, current_call.set(record)
+
+    def _end_call(self, record, messages, text, cached=False):
+        if cached:
+            outcome = "cached"
+        elif text:
+            outcome = "ok"
+        else:
+            outcome = "error" if record.errors else "empty"
+        record.finish(outcome)
+        if not cached:
+            # Streams and some providers don't report usage; fall back to the local estimate
+            if record.input_tokens is None:
+                record.input_tokens = estimate_tokens(messages)
+            if record.output_tokens is None:
+                record.output_tokens = estimate_text_tokens(text)
+        llm_metrics.observe(record)
+        self.call_stats.observe(record)
+
+    def complete_chat(self, messages, temperature=0.7, json_response=False, stop=None, cache_mode=CACHE_USE, schema=None):
+        """
+        Returns the completion text. With `schema` (a Pydantic model class) the reply
+        is requested as that schema, natively where the provider supports it, and
+        returned as a validated instance; a reply that doesn't validate gets one
+        repair call, and None comes back if that fails too.
+        """
+        if schema is not None:
+            return self._complete_structured(messages, temperature, cache_mode, schema)
+        return self._complete_text(messages, temperature, json_response, stop, cache_mode)
+
+    def _complete_text(self, messages, temperature, json_response, stop, cache_mode, schema=None):
+        record, token = self._begin_call()
+        try:
+            key = self._cache_lookup_key(messages, temperature, json_response, stop, cache_mode, schema)
+            if key and cache_mode == CACHE_USE:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    self._end_call(record, messages, cached, cached=True)
+                    return cached
+
+            response = self._dispatch(messages, temperature, json_response, stop, schema)
+        except Exception as e:
+            record.errors.append(type(e).__name__)
+            self._end_call(record, messages, None)
+            raise
+        finally:
+            current_call.reset(token)
+
+        self._end_call(record, messages, response)
+        if self.recorder and response:
+            self.recorder.record(self.role, messages, temperature, json_response, response, record.latency)
+        if key and response:
+            self.cache.set(key, response)
+        return response
+
+    async def complete_chat_async(self, messages, temperature=0.7, json_response=False, stop=None, cache_mode=CACHE_USE,
+                                  schema=None):
+        """Native async version of complete_chat. Same retry, JSON, schema and caching semantics."""
+        if schema is not None:
+            return await self._complete_structured_async(messages, temperature, cache_mode, schema)
+        return await self._complete_text_async(messages, temperature, json_response, stop, cache_mode)
+
+    async def _complete_text_async(self, messages, temperature, json_response, stop, cache_mode, schema=None):
+        record, token = self._begin_call()
+        try:
+            key = self._cache_lookup_key(messages, temperature, json_response, stop, cache_mode, schema)
+            if key and cache_mode == CACHE_USE:
+                cached = self._cache_get(key)
+                if cached is not None:
+                    self._end_call(record, messages, cached, cached=True)
+                    return cached
+
+            response = await self._dispatch_async(messages, temperature, json_response, stop, schema)
+        except Exception as e:
+            record.errors.append(type(e).__name__)
+            self._end_call(record, messages, None)
+            raise
+        finally:
+            current_call.reset(token)
+
+        self._end_call(record, messages, response)
+        if self.recorder and response:
+            self.recorder.record(self.role, messages, temperature, json_response, response, record.latency)
+        if key and response:
+            self.cache.set(key, response)
+        return response
+
+    def _begin_structured(self):
+        self.structured_stats["calls"] += 1
+        if self.provider in ["openai", "groq", "gemini"]:
+            self.structured_stats["native"] += 1
+
+    def _end_structured(self, schema, outcome, value=None):
+        """outcome: valid (first reply validated), repaired, or fallback (None returned)."""
+        self.structured_stats[outcome if outcome != "fallback" else "fallbacks"] += 1
+        llm_metrics.observe_structured((self.provider, self.model_name, self.role), schema.__name__, outcome)
+        return value
+
+    def _first_parse(self, schema, text):
+        """The validated reply, or the error to repair (None when there's nothing to repair)."""
+        try:
+            return parse_model(text, schema), None
+        except StructuredOutputError as e:
+            if not text:
+                return None, None # The call itself failed: retries already happened, a repair can't help
+            self.structured_stats["parse_failures"] += 1
+            print(f"[LLMClient] {schema.__name__} reply didn't validate ({e}). Repairing...")
+            self.structured_stats["repairs"] += 1
+            return None, e
+
+    def _repaired(self, schema, text):
+        try:
+            return self._end_structured(schema, "repaired", parse_model(text, schema))
+        except StructuredOutputError as e:
+            print(f"[LLMClient] {schema.__name__} repair failed ({e}). Falling back.")
+            return self._end_structured(schema, "fallback")
+
+    def _complete_structured(self, messages, temperature, cache_mode, schema):
+        self._begin_structured()
+        text = self._complete_text(messages, temperature, True, None, cache_mode, schema)
+        value, error = self._first_parse(schema, text)
+        if value is not None:
+            return self._end_structured(schema, "valid", value)
+        if error is None:
+            return self._end_structured(schema, "fallback")
+        # Cheap follow-up: only the broken reply and the error, at temperature 0
+        fixed = self._complete_text(repair_messages(schema, text, error), 0.0, True, None, CACHE_BYPASS, schema)
+        return self._repaired(schema, fixed)
+
+    async def _complete_structured_async(self, messages, temperature, cache_mode, schema):
+        self._begin_structured()
+        text = await self._complete_text_async(messages, temperature, True, None, cache_mode, schema)
+        value, error = self._first_parse(schema, text)
+        if value is not None:
+            return self._end_structured(schema, "valid", value)
+        if error is None:
+            return self._end_structured(schema, "fallback")
+        fixed = await self._complete_text_async(repair_messages(schema, text, error), 0.0, True, None, CACHE_BYPASS, schema)
+        return self._repaired(schema, fixed)
+
+    def _dispatch(self, messages, temperature, json_response, stop, schema=None):
+        if self.provider == "gemini":
+            return self._complete_gemini(messages, temperature, json_response, stop, schema)
+        elif self.provider in ["openai", "local"]:
+            return self._complete_openai(messages, temperature, json_response, stop, schema)
+        elif self.provider == "groq":
+            return self._complete_groq(messages, temperature, json_response, stop, schema)
+        elif self.provider in ["fake", "replay"]:
+            return self._complete_offline(messages, temperature, json_response, stop)
+        else:
+             raise ValueError(f"Unknown provider: {self.provider}")
+
+    async def _dispatch_async(self, messages, temperature, json_response, stop, schema=None):
         if self.provider == "gemini":
-            return self._complete_gemini(messages, temperature, json_response, stop)
+            return await self._complete_gemini_async(messages, temperature, json_response, stop, schema)
         elif self.provider in ["openai", "local"]:
-            return self._complete_openai(messages, temperature, json_response, stop)
+            return await self._complete_openai_async(messages, temperature, json_response, stop, schema)
         elif self.provider == "groq":
-            return self._complete_groq(messages, temperature, json_response, stop)
+            return await self._complete_groq_async(messages, temperature, json_response, stop, schema)
+        elif self.provider in ["fake", "replay"]:
+            return await self._complete_offline_async(messages, temperature, json_response, stop)
         else:
              raise ValueError(f"Unknown provider: {self.provider}")
 
-    def _complete_openai(self, messages, temperature, json_response, stop):
+    def _cache_lookup_key(self, messages, temperature, json_response, stop, cache_mode, schema=None):
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache_mode: {cache_mode}")
+        if not self.cache or cache_mode == CACHE_BYPASS:
+            return None
+
+        schema = json_schema(schema) if schema is not None else None
+        base_key = make_cache_key(self.provider, self.model_name, messages, temperature, stop, json_response, schema=schema)
+        occurrence = self._cache_occurrences.pop(base_key, 0)
+        self._cache_occurrences[base_key] = occurrence + 1
+        if len(self._cache_occurrences) > CACHE_OCCURRENCE_KEYS:
+            self._cache_occurrences.popitem(last=False)
+        if occurrence == 0:
+            return base_key
+        return make_cache_key(self.provider, self.model_name, messages, temperature, stop, json_response, occurrence, schema)
+
+    def _cache_get(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            self.cache_stats["misses"] += 1
+        else:
+            self.cache_stats["hits"] += 1
+        return cached
+
+    def stream_chat(self, messages, temperature=0.7, stop=None, cache_mode=CACHE_USE):
+        """
+        Yields the completion as text deltas. Stop sequences are applied client-side,
+        so the stream is closed as soon as one shows up.
+        """
+        key = self._cache_lookup_key(messages, temperature, False, stop, cache_mode)
+        if key and cache_mode == CACHE_USE:
+            cached = self._cache_get(key)
+            if cached is not None:
+                record, token = self._begin_call(streaming=True)
+                try:
+                    self._end_call(record, messages, cached, cached=True)
+                finally:
+                    _reset_call(token)
+                yield cached
+                return
+
+        stop_filter = StopSequenceFilter(stop)
+        chunks = []
+        record, token = self._begin_call(streaming=True)
+        deltas = self._stream_deltas(messages, temperature)
+        try:
+            for raw_delta in deltas:
+                delta = stop_filter.feed(raw_delta)
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+                if stop_filter.stopped:
+                    break
+        except Exception as e:
+            record.errors.append(type(e).__name__)
+            raise
+        finally:
+            deltas.close() # Cancels the provider stream if we stopped early
+            self._end_call(record, messages, "".join(chunks))
+            _reset_call(token)
+
+        tail = stop_filter.flush()
+        if tail:
+            chunks.append(tail)
+            yield tail
+
+        if self.recorder and chunks:
+            self.recorder.record(self.role, messages, temperature, False, "".join(chunks), record.latency)
+        if key and chunks:
+            self.cache.set(key, "".join(chunks))
+
+    async def stream_chat_async(self, messages, temperature=0.7, stop=None, cache_mode=CACHE_USE):
+        """Async iterator version of stream_chat."""
+        key = self._cache_lookup_key(messages, temperature, False, stop, cache_mode)
+        if key and cache_mode == CACHE_USE:
+            cached = self._cache_get(key)
+            if cached is not None:
+                record, token = self._begin_call(streaming=True)
+                try:
+                    self._end_call(record, messages, cached, cached=True)
+                finally:
+                    _reset_call(token)
+                yield cached
+                return
+
+        stop_filter = StopSequenceFilter(stop)
+        chunks = []
+        record, token = self._begin_call(streaming=True)
+        deltas = self._stream_deltas_async(messages, temperature)
+        try:
+            async for raw_delta in deltas:
+                delta = stop_filter.feed(raw_delta)
+                if delta:
+                    chunks.append(delta)
+                    yield delta
+                if stop_filter.stopped:
+                    break
+        except Exception as e:
+            record.errors.append(type(e).__name__)
+            raise
+        finally:
+            await deltas.aclose()
+            self._end_call(record, messages, "".join(chunks))
+            _reset_call(token)
+
+        tail = stop_filter.flush()
+        if tail:
+            chunks.append(tail)
+            yield tail
+
+        if self.recorder and chunks:
+            self.recorder.record(self.role, messages, temperature, False, "".join(chunks), record.latency)
+        if key and chunks:
+            self.cache.set(key, "".join(chunks))
+
+    def _stream_deltas(self, messages, temperature):
+        """Raw provider deltas, before stop sequences are applied."""
+        if self.provider not in ["gemini", "fake", "replay", "openai", "local", "groq"]:
+            raise ValueError(f"Unknown provider: {self.provider}")
+
+        chunks, usage, reserved = [], None, 0
+        try:
+            if self.provider == "gemini":
+                # Fresh session: a client-side stop can leave the chat holding text the caller never saw
+                chat, last_message, config, _ = self._prepare_gemini(messages, temperature, False, None)
+                reserved = self._throttle(messages)
+                response = chat.send_message(last_message, generation_config=config, stream=True)
+                for chunk in response:
+                    usage = self._stream_usage(chunk) or usage
+                    text = self._gemini_chunk_text(chunk)
+                    if text:
+                        chunks.append(text)
+                        yield text
+                return
+
+            if self.provider in ["fake", "replay"]:
+                reserved = self._throttle(messages)
+                for delta in self.offline.stream(messages, temperature):
+                    chunks.append(delta)
+                    yield delta
+                return
+
+            kwargs = self._stream_kwargs(messages, temperature)
+            stream, reserved = self._open_stream(kwargs, messages)
+            try:
+                for chunk in stream:
+                    usage = self._stream_usage(chunk) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+        finally:
+            self._settle_estimated(reserved, messages, "".join(chunks), usage)
+
+    async def _stream_deltas_async(self, messages, temperature):
+        if self.provider not in ["gemini", "fake", "replay", "openai", "local", "groq"]:
+            raise ValueError(f"Unknown provider: {self.provider}")
+
+        chunks, usage, reserved = [], None, 0
+        try:
+            if self.provider == "gemini":
+                chat, last_message, config, _ = self._prepare_gemini(messages, temperature, False, None)
+                reserved = await self._throttle_async(messages)
+                response = await chat.send_message_async(last_message, generation_config=config, stream=True)
+                async for chunk in response:
+                    usage = self._stream_usage(chunk) or usage
+                    text = self._gemini_chunk_text(chunk)
+                    if text:
+                        chunks.append(text)
+                        yield text
+                return
+
+            if self.provider in ["fake", "replay"]:
+                reserved = await self._throttle_async(messages)
+                async for delta in self.offline.stream_async(messages, temperature):
+                    chunks.append(delta)
+                    yield delta
+                return
+
+            kwargs = self._stream_kwargs(messages, temperature)
+            stream, reserved = await self._open_stream_async(kwargs, messages)
+            try:
+                async for chunk in stream:
+                    usage = self._stream_usage(chunk) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        chunks.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+        finally:
+            self._settle_estimated(reserved, messages, "".join(chunks), usage)
+
+    def _stream_kwargs(self, messages, temperature):
+        kwargs = self._chat_kwargs(messages, temperature, False, None)
+        kwargs["stream"] = True
+        if self.provider == "openai":
+            # One extra final chunk carrying the usage; Groq sends it unasked (x_groq.usage)
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    @staticmethod
+    def _stream_usage(chunk):
+        """(input, output) tokens if this chunk reports them: OpenAI's final chunk, Groq's x_groq, Gemini's usage_metadata."""
+        usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+        if usage is not None:
+            return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage is not None and getattr(usage, "prompt_token_count", None):
+            return usage.prompt_token_count, getattr(usage, "candidates_token_count", None)
+        return None
+
+    def _settle_estimated(self, reserved, messages, text, usage=None):
+        """
+        For calls with no raw HTTP response for _settle (streams, Gemini, the offline
+        providers): reconcile the limiter with the usage the call reported, or with an
+        estimate of what was sent and received.
+        """
+        input_tokens, output_tokens = usage or (None, None)
+        if input_tokens is not None:
+            note_usage(input_tokens, output_tokens)
+        if not self.rate_limiter or not reserved:
+            return
+        if input_tokens is not None and output_tokens is not None:
+            actual = input_tokens + output_tokens
+        else:
+            actual = estimate_tokens(messages) + estimate_text_tokens(text)
+        self.rate_limiter.settle(reserved, actual)
+
+    def _open_stream(self, kwargs, messages):
+        """Opens a streaming completion, with the same 429 handling as _complete_groq. Returns (stream, tokens reserved)."""
+        max_retries = 3 if self.provider == "groq" else 1
+        for current_try in range(max_retries):
+            if current_try:
+                note_retry()
+            reserved = self._throttle(messages)
+            try:
+                return self.client.chat.completions.create(**kwargs), reserved
+            except RateLimitError as e:
+                note_error(e)
+                wait_time = self._on_rate_limited(e, current_try)
+                if wait_time:
+                    time.sleep(wait_time)
+        raise RuntimeError("[LLMClient] Max retries reached opening stream.")
+
+    async def _open_stream_async(self, kwargs, messages):
+        max_retries = 3 if self.provider == "groq" else 1
+        for current_try in range(max_retries):
+            if current_try:
+                note_retry()
+            reserved = await self._throttle_async(messages)
+            try:
+                return await self.async_client.chat.completions.create(**kwargs), reserved
+            except RateLimitError as e:
+                note_error(e)
+                wait_time = self._on_rate_limited(e, current_try)
+                if wait_time:
+                    await asyncio.sleep(wait_time)
+        raise RuntimeError("[LLMClient] Max retries reached opening stream.")
+
+    @staticmethod
+    def _gemini_chunk_text(chunk):
+        # .text raises on chunks without parts (e.g. the final finish-reason chunk)
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    def _chat_kwargs(self, messages, temperature, json_response, stop, schema=None):
+        """Request body shared by the OpenAI-compatible providers (openai, local, groq)."""
         kwargs = {
             "model": self.model_name,
             "messages": messages,
@@ -81,40 +614,130 @@ class LLMClient:
         }
         if stop:
             kwargs["stop"] = stop
-        if json_response and self.provider == "openai":
-             # "local" might not support json_object mode
+        # "local" might not support json_object mode
+        if json_response and self.provider in ["openai", "groq"]:
             kwargs["response_format"] = {"type": "json_object"}
+        if schema is not None and self.provider == "openai":
+            kwargs["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": json_schema(schema)},
+            }
+        elif schema is not None and self.provider == "groq":
+            # Groq's Llama models take tool calls but not json_schema: force a call to one "tool" shaped like the schema
+            kwargs.pop("response_format", None)
+            kwargs["tools"] = [{"type": "function", "function": {
+                "name": schema.__name__, "description": f"Record the {schema.__name__}.", "parameters": json_schema(schema),
+            }}]
+            kwargs["tool_choice"] = {"type": "function", "function": {"name": schema.__name__}}
+        return kwargs
+
+    @staticmethod
+    def _message_text(response):
+        """The reply text, or a forced tool call's JSON arguments."""
+        message = response.choices[0].message
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            return tool_calls[0].function.arguments
+        return message.content
+
+    def _reserve_capacity(self, messages):
+        """Claims a slot in the shared limiter. Returns (tokens_reserved, seconds_to_wait)."""
+        if not self.rate_limiter:
+            return 0, 0.0
+        reserved = estimate_tokens(messages) + OUTPUT_TOKEN_ALLOWANCE
+        wait = self.rate_limiter.reserve(reserved)
+        if wait > 0:
+            self.rate_limit_stats["waits"] += 1
+            self.rate_limit_stats["wait_seconds"] += wait
+        return reserved, wait
 
-        response = self.client.chat.completions.create(**kwargs)
-        return response.choices[0].message.content
+    def _throttle(self, messages):
+        reserved, wait = self._reserve_capacity(messages)
+        if wait > 0:
+            time.sleep(wait)
+        return reserved
 
-    def _complete_groq(self, messages, temperature, json_response, stop):
+    async def _throttle_async(self, messages):
+        reserved, wait = self._reserve_capacity(messages)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return reserved
+
+    def _settle(self, raw, response, reserved):
+        """Feeds the provider's quota headers and real token usage back into the limiter (and the call's metrics)."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            note_usage(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+        if not self.rate_limiter:
+            return
+        self.rate_limiter.update_from_headers(raw.headers)
+        self.rate_limiter.settle(reserved, getattr(usage, "total_tokens", None))
+
+    def _on_rate_limited(self, error, current_try):
+        """
+        Backs off every caller sharing this key by the provider's retry-after.
+        Returns how long *this* caller still has to sleep (0 when the limiter queues it).
+        """
+        self.rate_limit_stats["rate_limit_errors"] += 1
+        note_rate_limited()
+        response = getattr(error, "response", None)
+        headers = response.headers if response is not None else None
+        retry_after = parse_duration(headers.get("retry-after")) if headers else None
+        wait_time = retry_after or 20 * (current_try + 1)
+
+        if not self.rate_limiter:
+            return wait_time
+
+        self.rate_limiter.update_from_headers(headers)
+        self.rate_limiter.penalize(wait_time)
+        print(f"[LLMClient] Rate Limit Hit. Queued behind shared limiter for ~{wait_time:.1f}s...")
+        return 0
+
+    def _complete_openai(self, messages, temperature, json_response, stop, schema=None):
+        kwargs = self._chat_kwargs(messages, temperature, json_response, stop, schema)
+        reserved = self._throttle(messages)
+        raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+        response = raw.parse()
+        self._settle(raw, response, reserved)
+        return self._message_text(response)
+
+    async def _complete_openai_async(self, messages, temperature, json_response, stop, schema=None):
+        kwargs = self._chat_kwargs(messages, temperature, json_response, stop, schema)
+        reserved = await self._throttle_async(messages)
+        raw = await self.async_client.chat.completions.with_raw_response.create(**kwargs)
+        response = raw.parse()
+        if inspect.isawaitable(response):
+            response = await response
+        self._settle(raw, response, reserved)
+        return self._message_text(response)
+
+    def _complete_groq(self, messages, temperature, json_response, stop, schema=None):
         # S-TIER FIX: Retry logic for Rate Limits
         max_retries = 3
         current_try = 0
         
-        kwargs = {
-            "model": self.model_name,
-            "messages": messages,
-            "temperature": temperature,
-        }
-        if stop:
-            kwargs["stop"] = stop
-        if json_response:
-             kwargs["response_format"] = {"type": "json_object"}
+        kwargs = self._chat_kwargs(messages, temperature, json_response, stop, schema)
 
         while current_try < max_retries:
+            if current_try:
+                note_retry()
+            reserved = self._throttle(messages)
             try:
-                response = self.client.chat.completions.create(**kwargs)
-                return response.choices[0].message.content
+                raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+                response = raw.parse()
+                self._settle(raw, response, reserved)
+                return self._message_text(response)
             
-            except RateLimitError:
-                wait_time = 20 * (current_try + 1)
-                print(f"[LLMClient] Rate Limit Hit. Cooling down for {wait_time}s...")
-                time.sleep(wait_time)
+            except RateLimitError as e:
+                note_error(e)
+                wait_time = self._on_rate_limited(e, current_try)
+                if wait_time:
+                    print(f"[LLMClient] Rate Limit Hit. Cooling down for {wait_time}s...")
+                    time.sleep(wait_time)
                 current_try += 1
             
             except Exception as e:
+                note_error(e)
                 print(f"[LLMClient] Groq Error: {e}. Retrying ({current_try + 1}/{max_retries})...")
                 time.sleep(2) # Short pause for transient errors
                 current_try += 1
@@ -122,7 +745,88 @@ class LLMClient:
         print("[LLMClient] Max retries reached. Returning None.")
         return None
 
-    def _complete_gemini(self, messages, temperature, json_response, stop):
+    async def _complete_groq_async(self, messages, temperature, json_response, stop, schema=None):
+        # Same retry policy as _complete_groq, but cooling down never blocks the event loop
+        max_retries = 3
+        current_try = 0
+
+        kwargs = self._chat_kwargs(messages, temperature, json_response, stop, schema)
+
+        while current_try < max_retries:
+            if current_try:
+                note_retry()
+            reserved = await self._throttle_async(messages)
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(**kwargs)
+                response = raw.parse()
+                if inspect.isawaitable(response):
+                    response = await response
+                self._settle(raw, response, reserved)
+                return self._message_text(response)
+
+            except RateLimitError as e:
+                note_error(e)
+                wait_time = self._on_rate_limited(e, current_try)
+                if wait_time:
+                    print(f"[LLMClient] Rate Limit Hit. Cooling down for {wait_time}s...")
+                    await asyncio.sleep(wait_time)
+                current_try += 1
+
+            except Exception as e:
+                note_error(e)
+                print(f"[LLMClient] Groq Error: {e}. Retrying ({current_try + 1}/{max_retries})...")
+                await asyncio.sleep(2) # Short pause for transient errors
+                current_try += 1
+
+        print("[LLMClient] Max retries reached. Returning None.")
+        return None
+
+    @staticmethod
+    def _apply_stop(text, stop):
+        # Real providers cut the completion at a stop sequence server-side
+        stop_filter = StopSequenceFilter(stop)
+        out = stop_filter.feed(text)
+        return out if stop_filter.stopped else out + stop_filter.flush()
+
+    def _complete_offline(self, messages, temperature, json_response, stop):
+        # Injected failures get the same retry policy as _complete_groq, minus the pause
+        max_retries = 3
+        for current_try in range(max_retries):
+            if current_try:
+                note_retry()
+            reserved = self._throttle(messages)
+            try:
+                text = self.offline.complete(messages, temperature, json_response)
+                self._settle_estimated(reserved, messages, text)
+                return self._apply_stop(text, stop)
+            except FakeProviderError as e:
+                self._settle_estimated(reserved, messages, "")
+                note_error(e)
+                print(f"[LLMClient] Fake Error: {e}. Retrying ({current_try + 1}/{max_retries})...")
+
+        print("[LLMClient] Max retries reached. Returning None.")
+        return None
+
+    async def _complete_offline_async(self, messages, temperature, json_response, stop):
+        max_retries = 3
+        for current_try in range(max_retries):
+            if current_try:
+                note_retry()
+            reserved = await self._throttle_async(messages)
+            try:
+                text = await self.offline.complete_async(messages, temperature, json_response)
+                self._settle_estimated(reserved, messages, text)
+                return self._apply_stop(text, stop)
+            except FakeProviderError as e:
+                self._settle_estimated(reserved, messages, "")
+                note_error(e)
+                print(f"[LLMClient] Fake Error: {e}. Retrying ({current_try + 1}/{max_retries})...")
+
+        print("[LLMClient] Max retries reached. Returning None.")
+        return None
+
+    def _to_gemini_turns(self, messages):
+        """Splits OpenAI-style messages into system instruction, prior history and the trigger message."""
         system_instruction = None
         gemini_history = []
         last_message = ""
@@ -144,17 +848,85 @@ class LLMClient:
         else:
             last_message = "continue"
 
-        model = genai.GenerativeModel(
-            model_name=self.model_name,
-            system_instruction=system_instruction
-        )
+        return system_instruction, gemini_history, last_message
+
+    def _prepare_gemini(self, messages, temperature, json_response, stop, reuse_session=False, schema=None):
+        """
+        Converts OpenAI-style messages into a Gemini chat session + trigger message.
+        With reuse_session, a cached session already holding this history is used when
+        there is one. Returns (chat, last_message, config, session) where `session`
+        is what _finish_gemini needs to file the chat away again.
+        """
+        system_instruction, gemini_history, last_message = self._to_gemini_turns(messages)
         
         config = genai.types.GenerationConfig(
             temperature=temperature,
             response_mime_type="application/json" if json_response else "text/plain",
-            stop_sequences=stop if stop else []
+            stop_sequences=stop if stop else [],
+            # Gemini's schema dialect has no titles or refs
+            response_schema=json_schema(schema, strip_titles=True) if schema is not None else None
         )
 
+        if reuse_session and self.gemini_sessions is not None:
+            turns = [[turn["role"], turn["parts"][0]] for turn in gemini_history]
+            chat = self.gemini_sessions.checkout(self.model_name, system_instruction, turns, gemini_history)
+            return chat, last_message, config, (system_instruction, turns)
+
+        model = genai.GenerativeModel(
+            model_name=self.model_name,
+            system_instruction=system_instruction
+        )
         chat = model.start_chat(history=gemini_history)
+        return chat, last_message, config, None
+
+    def _finish_gemini(self, chat, last_message, text, session):
+        if session is None or not text:
+            return
+        system_instruction, turns = session
+        turns = turns + [["user", last_message], ["model", text]]
+        self.gemini_sessions.checkin(self.model_name, system_instruction, turns, chat)
+
+    def _complete_gemini(self, messages, temperature, json_response, stop, schema=None):
+        chat, last_message, config, session = self._prepare_gemini(messages, temperature, json_response, stop, reuse_session=True, schema=schema)
+        reserved = self._throttle(messages)
         response = chat.send_message(last_message, generation_config=config)
-        return response.text
\ No newline at end of file
+        self._settle_estimated(reserved, messages, response.text, self._stream_usage(response))
+        self._finish_gemini(chat, last_message, response.text, session)
+        return response.text
+
+    async def _complete_gemini_async(self, messages, temperature, json_response, stop, schema=None):
+        chat, last_message, config, session = self._prepare_gemini(messages, temperature, json_response, stop, reuse_session=True, schema=schema)
+        reserved = await self._throttle_async(messages)
+        response = await chat.send_message_async(last_message, generation_config=config)
+        self._settle_estimated(reserved, messages, response.text, self._stream_usage(response))
+        self._finish_gemini(chat, last_message, response.text, session)
+        return response.text
+
+
+def summarize_cache(clients) -> dict:
+    """Rolls up response-cache hit/miss counters across a role -> client mapping."""
+    summary = {"hits": 0, "misses": 0}
+    # Role views of one client share its counters (see LLMClient.with_role)
+    for client in {id(c.cache_stats): c for c in clients.values()}.values():
+        for key in summary:
+            summary[key] += client.cache_stats.get(key, 0)
+    return summary
+
+
+def summarize_structured(clients) -> dict:
+    """Rolls up structured-output outcomes (and their rates) across a role -> client mapping."""
+    summary = new_structured_stats()
+    for client in {id(c.structured_stats): c for c in clients.values()}.values():
+        for key in summary:
+            summary[key] += client.structured_stats.get(key, 0)
+    return structured_rates(summary)
+
+
+def summarize_rate_limits(clients) -> dict:
+    """Rolls up rate-limit counters across a role -> client mapping (shared clients counted once)."""
+    summary = {"waits": 0, "wait_seconds": 0.0, "rate_limit_errors": 0}
+    for client in {id(c.rate_limit_stats): c for c in clients.values()}.values():
+        for key in summary:
+            summary[key] += client.rate_limit_stats.get(key, 0)
+    summary["wait_seconds"] = round(summary["wait_seconds"], 2)
+    return summary
@@ -0,0 +1,334 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million (input, output) tokens, list prices at time of writing. Unknown
+# models are still counted, just without a cost (reported as unknown, not 0).
+# LLM_PRICES='{"model": [in, out]}' adds or overrides entries.
+MODEL_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+    "llama3-8b-8192": (0.05, 0.08),
+    "llama3-70b-8192": (0.59, 0.79),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-flash-latest": (0.30, 2.50),  # The app's Gemini default; an alias, currently of gemini-2.5-flash
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+# Latency samples kept per run for percentiles (reservoir, so memory stays fixed)
+RESERVOIR_SIZE = 2048
+
+
+def call_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    price = MODEL_PRICES.get(model)
+    if price is None:
+        return None
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+
+class CallRecord:
+    """What happened during one complete_chat/stream_chat call, filled in as it goes."""
+
+    def __init__(self, provider: str, model: str, role: str, streaming: bool = False):
+        self.provider = provider
+        self.model = model
+        self.role = role
+        self.streaming = streaming
+        self.started = time.perf_counter()
+        self.latency = 0.0
+        self.outcome = "ok"  # ok | empty | error | cached
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors: List[str] = []  # Exception class per failed attempt, retried or not
+
+    @property
+    def labels(self) -> Tuple[str, str, str]:
+        return (self.provider, self.model, self.role)
+
+    def finish(self, outcome: str):
+        self.outcome = outcome
+        self.latency = time.perf_counter() - self.started
+
+
+# The call in progress on this thread/task, so the retry loops deep inside
+# LLMClient can count retries, 429s and token usage against it
+current_call: contextvars.ContextVar[Optional[CallRecord]] = contextvars.ContextVar("current_call", default=None)
+
+
+def note_usage(input_tokens: Optional[int], output_tokens: Optional[int]):
+    record = current_call.get()
+    if record is not None:
+        record.input_tokens = input_tokens
+        record.output_tokens = output_tokens
+
+
+def note_error(error: BaseException):
+    record = current_call.get()
+    if record is not None:
+        record.errors.append(type(error).__name__)
+
+
+def note_retry():
+    record = current_call.get()
+    if record is not None:
+        record.retries += 1
+
+
+def note_rate_limited():
+    record = current_call.get()
+    if record is not None:
+        record.rate_limited += 1
+
+
+class _Series:
+    __slots__ = ("requests", "buckets", "latency_sum", "latency_count", "input_tokens", "output_tokens",
+                 "retries", "rate_limited", "cost", "errors")
+
+    def __init__(self):
+        self.requests = defaultdict(int)  # outcome -> count
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.cost: Optional[float] = None  # Stays None (no sample exported) for unpriced models
+        self.errors = defaultdict(int)  # exception class -> count
+
+
+class LLMMetrics:
+    """Process-wide counters and latency histograms per (provider, model, role), in Prometheus text format."""
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str], _Series] = defaultdict(_Series)
+        # (labels, schema, outcome) -> count for complete_chat(schema=...)
+        self._structured: Dict[Tuple[Tuple[str, str, str], str, str], int] = defaultdict(int)
+        # (labels, attempt, outcome) -> count for calls routed by a RoutingClient
+        self._routed: Dict[Tuple[Tuple[str, str, str], str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def observe(self, record: CallRecord):
+        with self._lock:
+            series = self._series[record.labels]
+            series.requests[record.outcome] += 1
+            series.retries += record.retries
+            series.rate_limited += record.rate_limited
+            for error in record.errors:
+                series.errors[error] += 1
+            if series.cost is None and record.model in MODEL_PRICES:
+                series.cost = 0.0
+            if record.outcome == "cached":
+                return # Served locally: no latency or provider tokens to speak of
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if record.latency <= bound), len(LATENCY_BUCKETS))
+            series.buckets[index] += 1
+            series.latency_sum += record.latency
+            series.latency_count += 1
+            series.input_tokens += record.input_tokens or 0
+            series.output_tokens += record.output_tokens or 0
+            cost = call_cost(record.model, record.input_tokens or 0, record.output_tokens or 0)
+            if cost is not None:
+                series.cost += cost
+
+    def observe_structured(self, labels: Tuple[str, str, str], schema: str, outcome: str):
+        with self._lock:
+            self._structured[(labels, schema, outcome)] += 1
+
+    def observe_routing(self, labels: Tuple[str, str, str], attempt: str, outcome: str):
+        with self._lock:
+            self._routed[(labels, attempt, outcome)] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            series = sorted(self._series.items())
+            lines = []
+
+            def header(name, kind, help_text):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            header("odeon_llm_requests_total", "counter", "LLM calls by outcome (ok, empty, error, cached).")
+            for key, s in series:
+                for outcome, count in sorted(s.requests.items()):
+                    lines.append(f"odeon_llm_requests_total{_labels(key, outcome=outcome)} {count}")
+
+            header("odeon_llm_request_duration_seconds", "histogram", "Wall time of LLM calls, retries and rate-limit waits included.")
+            for key, s in series:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), s.buckets):
+                    cumulative += count
+                    lines.append(f"odeon_llm_request_duration_seconds_bucket{_labels(key, le=bound)} {cumulative}")
+                lines.append(f"odeon_llm_request_duration_seconds_sum{_labels(key)} {s.latency_sum:.6f}")
+                lines.append(f"odeon_llm_request_duration_seconds_count{_labels(key)} {s.latency_count}")
+
+            for name, attr, help_text in (
+                ("odeon_llm_input_tokens_total", "input_tokens", "Prompt tokens (provider-reported, estimated when not)."),
+                ("odeon_llm_output_tokens_total", "output_tokens", "Completion tokens (provider-reported, estimated when not)."),
+                ("odeon_llm_retries_total", "retries", "Attempts retried after an error or a 429."),
+                ("odeon_llm_rate_limited_total", "rate_limited", "429 responses from the provider."),
+                ("odeon_llm_cost_usd_total", "cost", "Estimated spend from MODEL_PRICES (no sample for unpriced models)."),
+            ):
+                header(name, "counter", help_text)
+                for key, s in series:
+                    value = getattr(s, attr)
+                    if value is None:
+                        continue
+                    lines.append(f"{name}{_labels(key)} {value:.6f}" if isinstance(value, float) else f"{name}{_labels(key)} {value}")
+
+            header("odeon_llm_errors_total", "counter", "Failed attempts by exception class.")
+            for key, s in series:
+                for error, count in sorted(s.errors.items()):
+                    lines.append(f"odeon_llm_errors_total{_labels(key, error=error)} {count}")
+
+            header("odeon_llm_structured_outputs_total", "counter", "Schema-validated calls by outcome (valid, repaired, fallback).")
+            for (key, schema, outcome), count in sorted(self._structured.items()):
+                lines.append(f"odeon_llm_structured_outputs_total{_labels(key, schema=schema, outcome=outcome)} {count}")
+
+            header("odeon_llm_routed_attempts_total", "counter", "Routed attempts by kind (primary, hedge, failover) and outcome (won, failed, cancelled).")
+            for (key, attempt, outcome), count in sorted(self._routed.items()):
+                lines.append(f"odeon_llm_routed_attempts_total{_labels(key, attempt=attempt, outcome=outcome)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key: Tuple[str, str, str], **extra) -> str:
+    pairs = list(zip(("provider", "model", "role"), key)) + list(extra.items())
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CallStats:
+    """One run's (or one client's) LLM usage, for the per-run cost/latency summary."""
+
+    def __init__(self, reservoir_size: int = RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self._roles: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, record: CallRecord):
+        with self._lock:
+            stats = self._roles.setdefault(record.role, {
+                "calls": 0, "cached": 0, "errors": 0, "empty": 0, "retries": 0, "rate_limited": 0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "priced": True,
+                "latency_total": 0.0, "latency_max": 0.0, "samples": [], "seen": 0,
+            })
+            stats["calls"] += 1
+            stats["retries"] += record.retries
+            stats["rate_limited"] += record.rate_limited
+            if record.outcome == "cached":
+                stats["cached"] += 1
+                return
+            if record.outcome == "error":
+                stats["errors"] += 1
+            elif record.outcome == "empty":
+                stats["empty"] += 1
+            stats["input_tokens"] += record.input_tokens or 0
+            stats["output_tokens"] += record.output_tokens or 0
+            cost = call_cost(record.model, record.input_tokens or 0, record.output_tokens or 0)
+            if cost is None:
+                stats["priced"] = False
+            else:
+                stats["cost_usd"] += cost
+            stats["latency_total"] += record.latency
+            stats["latency_max"] = max(stats["latency_max"], record.latency)
+            stats["seen"] += 1
+            if len(stats["samples"]) < self.reservoir_size:
+                stats["samples"].append(record.latency)
+            else:
+                slot = random.randrange(stats["seen"])
+                if slot < self.reservoir_size:
+                    stats["samples"][slot] = record.latency
+
+    def summary(self) -> Dict:
+        """Totals plus a per-role breakdown; latency in milliseconds, cost None if any model is unpriced."""
+        with self._lock:
+            roles = {role: _summarize(stats) for role, stats in sorted(self._roles.items())}
+            merged = _merge(list(self._roles.values()))
+        return {**_summarize(merged), "by_role": roles} if self._roles else {}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summarize(stats: Dict) -> Dict:
+    samples = stats["samples"]
+    timed = stats["seen"]
+    return {
+        "calls": stats["calls"],
+        "cached": stats["cached"],
+        "errors": stats["errors"],
+        "empty": stats["empty"],
+        "retries": stats["retries"],
+        "rate_limited": stats["rate_limited"],
+        "input_tokens": stats["input_tokens"],
+        "output_tokens": stats["output_tokens"],
+        "cost_usd": round(stats["cost_usd"], 6) if stats["priced"] else None,
+        "latency_ms": {
+            "mean": round(stats["latency_total"] / timed * 1000, 1) if timed else None,
+            "p50": round(_percentile(samples, 0.5) * 1000, 1) if samples else None,
+            "p95": round(_percentile(samples, 0.95) * 1000, 1) if samples else None,
+            "max": round(stats["latency_max"] * 1000, 1) if timed else None,
+        },
+    }
+
+
+def _merge(all_stats: List[Dict]) -> Dict:
+    merged = {"calls": 0, "cached": 0, "errors": 0, "empty": 0, "retries": 0, "rate_limited": 0,
+              "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "priced": True,
+              "latency_total": 0.0, "latency_max": 0.0, "samples": [], "seen": 0}
+    for stats in all_stats:
+        for key in ("calls", "cached", "errors", "empty", "retries", "rate_limited", "input_tokens",
+                    "output_tokens", "cost_usd", "latency_total", "seen"):
+            merged[key] += stats[key]
+        merged["priced"] = merged["priced"] and stats["priced"]
+        merged["latency_max"] = max(merged["latency_max"], stats["latency_max"])
+        merged["samples"] += stats["samples"]
+    return merged
+
+
+def summarize_llm_calls(clients) -> Dict:
+    """Per-run LLM summary for a role -> client mapping (role views of one client share its stats)."""
+    seen = {id(c.call_stats): c.call_stats for c in clients.values() if getattr(c, "call_stats", None)}
+    if len(seen) == 1:
+        return next(iter(seen.values())).summary()
+    combined = CallStats()
+    for stats in seen.values():
+        with stats._lock:
+            for role, role_stats in stats._roles.items():
+                existing = combined._roles.get(role)
+                combined._roles[role] = _merge([existing, role_stats]) if existing else dict(role_stats, samples=list(role_stats["samples"]))
+    return combined.summary()
+
+
+def format_llm_summary(summary: Dict) -> str:
+    """One-line version of a CallStats summary for the run log."""
+    if not summary:
+        return "LLM calls: none"
+    cost = f"${summary['cost_usd']:.4f}" if summary["cost_usd"] is not None else "n/a (unpriced model)"
+    p95 = summary["latency_ms"]["p95"]
+    return (f"LLM calls: {summary['calls']} ({summary['cached']} cached, {summary['errors']} failed, {summary['retries']} retries), "
+            f"{summary['input_tokens']} in / {summary['output_tokens']} out tokens, cost {cost}, "
+            f"p95 {p95 if p95 is not None else '-'} ms")
+
+
+# Process-wide registry behind GET /metrics
+llm_metrics = LLMMetrics()
@@ -0,0 +1,430 @@
+import asyncio
+import copy
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from llm_cache import CACHE_USE
+from llm_metrics import llm_metrics
+
+# Recent calls per backend that its latency and error-rate estimates are based on
+HEALTH_WINDOW = 50
+# Successful calls needed before a backend's own p95 is used as its hedge delay
+HEDGE_MIN_SAMPLES = 10
+# Hedge delay (seconds) until then
+DEFAULT_HEDGE_DELAY = 8.0
+# Consecutive failed calls that take a backend out of rotation, and for how long
+# (doubled each time it trips again without a success in between)
+FAILURE_THRESHOLD = 3
+COOLDOWN_SECONDS = 30.0
+MAX_COOLDOWN_SECONDS = 300.0
+# A backend's expected latency is scaled by (1 + ERROR_PENALTY * error rate) when ranking
+ERROR_PENALTY = 4.0
+# Every PROBE_EVERY-th call goes first to a healthy backend that has never answered,
+# so one configured behind a fast backend still gets measured
+PROBE_EVERY = 20
+# Routing decisions kept for the run summary (counts cover every call)
+DECISION_LOG_SIZE = 200
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BackendHealth:
+    """Rolling latency/error picture of one backend, shared by every role view of a RoutingClient."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = deque(maxlen=HEALTH_WINDOW)  # Seconds; lost hedges count with the time they had run
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)  # True for a usable reply
+        self.consecutive_failures = 0
+        self.cooldown = COOLDOWN_SECONDS
+        self.down_until = 0.0
+        # routed: attempts sent here; won: replies used; trips: times taken out of rotation
+        self.stats = {"routed": 0, "primary": 0, "hedge": 0, "failover": 0, "won": 0, "failed": 0,
+                      "cancelled": 0, "trips": 0}
+        self._lock = threading.Lock()
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return DEFAULT_HEDGE_DELAY
+            return _percentile(self.latencies, 0.95)
+
+    def score(self) -> Optional[float]:
+        """Expected latency, inflated by the error rate. None until the backend has answered once."""
+        with self._lock:
+            if not self.latencies:
+                return None
+            return _percentile(self.latencies, 0.5) * (1 + ERROR_PENALTY * self.error_rate())
+
+    def succeeded(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.cooldown = COOLDOWN_SECONDS
+            self.stats["won"] += 1
+
+    def failed(self) -> bool:
+        """Counts a failed call; True if that took the backend out of rotation."""
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            self.stats["failed"] += 1
+            if self.consecutive_failures < FAILURE_THRESHOLD:
+                return False
+            self.down_until = time.monotonic() + self.cooldown
+            self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN_SECONDS)
+            self.consecutive_failures = 0
+            self.stats["trips"] += 1
+            return True
+
+    def lost(self, elapsed: float):
+        """A hedge race this backend lost: not an error, but it was at least this slow."""
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.stats["cancelled"] += 1
+
+    def summary(self) -> Dict:
+        score = self.score()
+        with self._lock:
+            return {
+                "name": self.name,
+                **self.stats,
+                "error_rate": round(self.error_rate(), 3),
+                "p50_ms": round(_percentile(self.latencies, 0.5) * 1000, 1) if self.latencies else None,
+                "p95_ms": round(_percentile(self.latencies, 0.95) * 1000, 1) if self.latencies else None,
+                "score": round(score, 3) if score is not None else None,
+                "down": not self.healthy(time.monotonic()),
+            }
+
+
+class RoutingClient:
+    """
+    Several LLMClients (different providers or models) behind the LLMClient
+    interface. Each call goes to the healthy backend with the lowest expected
+    latency (p50 scaled by its recent error rate; unmeasured backends keep
+    their configured order, except that every PROBE_EVERY-th call leads with
+    one of them). If no reply arrives within that backend's p95, a duplicate
+    goes to the next one and whichever answers first wins; the other is
+    cancelled. A failed call (an exception, or None once the client's own
+    retries are spent) fails over to the next backend, and a backend that
+    fails FAILURE_THRESHOLD calls in a row sits out a cooldown.
+
+    Hedging needs the async path; complete_chat (sync) and streams only fail
+    over. Every call appends a decision record to `decisions`.
+    """
+
+    def __init__(self, clients: List, role: str = "default", hedging: bool = True):
+        if not clients:
+            raise ValueError("RoutingClient needs at least one backend")
+        self.clients = [client.with_role(role) for client in clients]
+        self.role = role
+        self.hedging = hedging
+        self.backends = [BackendHealth(f"{client.provider}:{client.model_name}") for client in clients]
+        self.decisions = deque(maxlen=DECISION_LOG_SIZE)
+        self.routing_stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failed": 0, "probes": 0}
+        self._lock = threading.Lock()
+        self._ranked_calls = itertools.count(1)  # Shared by the role views, like the health
+
+        # The run summaries (summarize_llm_calls, summarize_cache, ...) read one set of
+        # counters per client, so the backends pool theirs into the first one's
+        first = self.clients[0]
+        for client in self.clients[1:]:
+            client.call_stats = first.call_stats
+            client.cache_stats = first.cache_stats
+            client.rate_limit_stats = first.rate_limit_stats
+            client.structured_stats = first.structured_stats
+
+    @property
+    def provider(self) -> str:
+        return "router"
+
+    @property
+    def model_name(self) -> str:
+        return ",".join(backend.name for backend in self.backends)
+
+    @property
+    def call_stats(self):
+        return self.clients[0].call_stats
+
+    @property
+    def cache_stats(self):
+        return self.clients[0].cache_stats
+
+    @property
+    def rate_limit_stats(self):
+        return self.clients[0].rate_limit_stats
+
+    @property
+    def structured_stats(self):
+        return self.clients[0].structured_stats
+
+    def with_role(self, role: str) -> "RoutingClient":
+        """Same backends, health and decision log; calls labelled as `role`."""
+        view = copy.copy(self)
+        view.role = role
+        view.clients = [client.with_role(role) for client in self.clients]
+        return view
+
+    def _rank(self) -> List[int]:
+        """Backend indexes in the order to try them: healthy by score, then the ones cooling down."""
+        now = time.monotonic()
+        healthy = [i for i, b in enumerate(self.backends) if b.healthy(now)]
+        scores = {i: self.backends[i].score() for i in healthy}
+        # Unmeasured backends rank after measured ones, in configured order
+        ranked = sorted(healthy, key=lambda i: (scores[i] is None, scores[i] or 0.0, i))
+        unmeasured = [i for i in ranked if scores[i] is None]
+        call = next(self._ranked_calls)
+        if unmeasured and len(unmeasured) < len(ranked) and call % PROBE_EVERY == 0:
+            probe = unmeasured[(call // PROBE_EVERY) % len(unmeasured)]
+            ranked.remove(probe)
+            ranked.insert(0, probe)
+            with self._lock:
+                self.routing_stats["probes"] += 1
+        cooling = sorted((i for i in range(len(self.backends)) if i not in healthy),
+                         key=lambda i: self.backends[i].down_until)
+        return ranked + cooling
+
+    def _new_decision(self, kind: str, ranked: List[int]) -> Dict:
+        return {"role": self.role, "kind": kind, "ranking": [self.backends[i].name for i in ranked],
+                "attempts": [], "hedged": False, "winner": None, "latency": None}
+
+    def _attempt_started(self, decision: Dict, index: int, attempt: str, started: float) -> Dict:
+        backend = self.backends[index]
+        with backend._lock:
+            backend.stats["routed"] += 1
+            backend.stats[attempt] += 1
+        entry = {"backend": backend.name, "attempt": attempt,
+                 "at": round(time.monotonic() - started, 3), "outcome": None, "latency": None}
+        decision["attempts"].append(entry)
+        return entry
+
+    def _attempt_finished(self, index: int, entry: Dict, ok: bool, latency: float, error: str = None):
+        backend = self.backends[index]
+        entry["latency"] = round(latency, 3)
+        if ok:
+            entry["outcome"] = "won"
+            backend.succeeded(latency)
+        else:
+            entry["outcome"] = error or "failed"
+            if backend.failed():
+                print(f"[Router] {backend.name} failed {FAILURE_THRESHOLD} calls in a row. "
+                      f"Routing around it for {backend.down_until - time.monotonic():.0f}s.")
+        client = self.clients[index]
+        llm_metrics.observe_routing((client.provider, client.model_name, self.role), entry["attempt"], entry["outcome"])
+
+    def _attempt_cancelled(self, index: int, entry: Dict, latency: float):
+        entry["outcome"] = "cancelled"
+        entry["latency"] = round(latency, 3)
+        self.backends[index].lost(latency)
+        client = self.clients[index]
+        llm_metrics.observe_routing((client.provider, client.model_name, self.role), entry["attempt"], "cancelled")
+
+    def _record(self, decision: Dict, started: float):
+        decision["latency"] = round(time.monotonic() - started, 3)
+        with self._lock:
+            stats = self.routing_stats
+            stats["calls"] += 1
+            stats["hedged"] += decision["hedged"]
+            stats["hedge_wins"] += any(a["attempt"] == "hedge" and a["outcome"] == "won" for a in decision["attempts"])
+            stats["failovers"] += sum(a["attempt"] == "failover" for a in decision["attempts"])
+            stats["failed"] += decision["winner"] is None
+            self.decisions.append(decision)
+
+    def _route(self, kind: str, call):
+        """Sync path: the ranked backends one after another until one answers."""
+        ranked = self._rank()
+        decision = self._new_decision(kind, ranked)
+        started = time.monotonic()
+        result, last_error = None, None
+        try:
+            for position, index in enumerate(ranked):
+                entry = self._attempt_started(decision, index, "primary" if position == 0 else "failover", started)
+                attempt_started = time.monotonic()
+                try:
+                    result = call(self.clients[index])
+                except Exception as e:
+                    last_error = e
+                    self._attempt_finished(index, entry, False, time.monotonic() - attempt_started, type(e).__name__)
+                    continue
+                ok = result is not None and result != ""
+                self._attempt_finished(index, entry, ok, time.monotonic() - attempt_started)
+                if ok:
+                    decision["winner"] = self.backends[index].name
+                    return result
+                last_error = None
+        finally:
+            self._record(decision, started)
+        if last_error is not None:
+            raise last_error
+        return result
+
+    async def _route_async(self, kind: str, call):
+        """
+        Async path: the top-ranked backend first; a hedge on the next one once
+        the first has run for its p95; on failure, the next untried backend.
+        The first usable reply wins and anything still in flight is cancelled.
+        """
+        ranked = self._rank()
+        queue = list(ranked)
+        decision = self._new_decision(kind, ranked)
+        started = time.monotonic()
+        pending = {}  # task -> (backend index, attempt entry, start time)
+
+        def launch(attempt: str):
+            index = queue.pop(0)
+            entry = self._attempt_started(decision, index, attempt, started)
+            task = asyncio.ensure_future(call(self.clients[index]))
+            pending[task] = (index, entry, time.monotonic())
+
+        launch("primary")
+        # Hedges only go to a healthy backend; one cooling down is left for failover
+        can_hedge = self.hedging and queue and self.backends[queue[0]].healthy(time.monotonic())
+        hedge_delay = self.backends[ranked[0]].hedge_delay()
+        if can_hedge and self.backends[ranked[0]].score() is None:
+            # An unmeasured primary (a probe) gets no longer than the next backend's p95
+            hedge_delay = min(hedge_delay, self.backends[queue[0]].hedge_delay())
+        hedge_at = started + hedge_delay if can_hedge else None
+        result, last_error = None, None
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None and not decision["hedged"]:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if queue:
+                        decision["hedged"] = True
+                        launch("hedge")
+                    else:
+                        hedge_at = None
+                    continue
+
+                for task in done:
+                    index, entry, attempt_started = pending.pop(task)
+                    latency = time.monotonic() - attempt_started
+                    error = task.exception()
+                    if error is not None:
+                        last_error = error
+                        self._attempt_finished(index, entry, False, latency, type(error).__name__)
+                        continue
+                    value = task.result()
+                    ok = value is not None and value != ""
+                    self._attempt_finished(index, entry, ok, latency)
+                    if ok and decision["winner"] is None:
+                        decision["winner"] = self.backends[index].name
+                        result = value
+                    elif not ok:
+                        last_error = None
+                if decision["winner"] is not None:
+                    break
+                if not pending and queue:
+                    # Everything in flight failed: no point waiting out a hedge delay
+                    hedge_at = None
+                    launch("failover")
+        finally:
+            for task, (index, entry, attempt_started) in pending.items():
+                task.cancel()
+                self._attempt_cancelled(index, entry, time.monotonic() - attempt_started)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            self._record(decision, started)
+
+        if decision["winner"] is None and last_error is not None:
+            raise last_error
+        return result
+
+    def complete_chat(self, messages, temperature=0.7, json_response=False, stop=None, cache_mode=CACHE_USE, schema=None):
+        return self._route("structured" if schema is not None else "complete", lambda client: client.complete_chat(
+            messages, temperature=temperature, json_response=json_response, stop=stop, cache_mode=cache_mode, schema=schema
+        ))
+
+    async def complete_chat_async(self, messages, temperature=0.7, json_response=False, stop=None, cache_mode=CACHE_USE,
+                                  schema=None):
+        return await self._route_async("structured" if schema is not None else "complete", lambda client: client.complete_chat_async(
+            messages, temperature=temperature, json_response=json_response, stop=stop, cache_mode=cache_mode, schema=schema
+        ))
+
+    def stream_chat(self, messages, temperature=0.7, stop=None, cache_mode=CACHE_USE):
+        """Streams from the top-ranked backend, failing over only if it breaks before the first delta."""
+        ranked = self._rank()
+        decision = self._new_decision("stream", ranked)
+        started = time.monotonic()
+        try:
+            for position, index in enumerate(ranked):
+                entry = self._attempt_started(decision, index, "primary" if position == 0 else "failover", started)
+                attempt_started = time.monotonic()
+                produced = False
+                try:
+                    for delta in self.clients[index].stream_chat(messages, temperature=temperature, stop=stop, cache_mode=cache_mode):
+                        produced = True
+                        yield delta
+                except Exception as e:
+                    self._attempt_finished(index, entry, False, time.monotonic() - attempt_started, type(e).__name__)
+                    if produced or position == len(ranked) - 1:
+                        raise
+                    continue
+                self._attempt_finished(index, entry, produced, time.monotonic() - attempt_started)
+                if produced:
+                    decision["winner"] = self.backends[index].name
+                    return
+        finally:
+            self._record(decision, started)
+
+    async def stream_chat_async(self, messages, temperature=0.7, stop=None, cache_mode=CACHE_USE):
+        """Async iterator version of stream_chat."""
+        ranked = self._rank()
+        decision = self._new_decision("stream", ranked)
+        started = time.monotonic()
+        try:
+            for position, index in enumerate(ranked):
+                entry = self._attempt_started(decision, index, "primary" if position == 0 else "failover", started)
+                attempt_started = time.monotonic()
+                produced = False
+                try:
+                    async for delta in self.clients[index].stream_chat_async(messages, temperature=temperature, stop=stop,
+                                                                             cache_mode=cache_mode):
+                        produced = True
+                        yield delta
+                except Exception as e:
+                    self._attempt_finished(index, entry, False, time.monotonic() - attempt_started, type(e).__name__)
+                    if produced or position == len(ranked) - 1:
+                        raise
+                    continue
+                self._attempt_finished(index, entry, produced, time.monotonic() - attempt_started)
+                if produced:
+                    decision["winner"] = self.backends[index].name
+                    return
+        finally:
+            self._record(decision, started)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            decisions = list(self.decisions)
+            return {**self.routing_stats, "backends": [b.summary() for b in self.backends], "decisions": decisions}
+
+
+def summarize_routing(clients) -> Optional[Dict]:
+    """Routing totals, per-backend health and recent decisions for a role -> client mapping (None without a router)."""
+    routers = {id(c.decisions): c for c in clients.values() if isinstance(c, RoutingClient)}
+    if not routers:
+        return None
+    summaries = [router.summary() for router in routers.values()]
+    if len(summaries) == 1:
+        return summaries[0]
+    merged = {key: sum(s[key] for s in summaries) for key in ("calls", "hedged", "hedge_wins", "failovers", "failed", "probes")}
+    merged["backends"] = [health for s in summaries for health in s["backends"]]
+    merged["decisions"] = [d for s in summaries for d in s["decisions"]][-DECISION_LOG_SIZE:]
+    return merged
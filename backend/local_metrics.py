@@ -0,0 +1,200 @@
+import re
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # In requirements.txt; without it the pure-Python path gives the same numbers, just slower
+    np = None
+
+# Word n-gram size used to compare agent turns
+NGRAM = 3
+# Two agent turns sharing at least this share of their n-grams (Jaccard) count as near-duplicates
+NEAR_DUPLICATE = 0.7
+
+# A concrete payment plan: "$50/month", "$75 per month", "$100 a month", "$40/mo"
+OFFER_PATTERN = re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?\s*(?:/|per|a|each)\s*(?:month|mo)\b", re.IGNORECASE)
+# What the rubric scores as Negotiation 1-2: no plan, can't help, passing the buck
+GAVE_UP_PATTERN = re.compile(
+    r"\b(?:i|we)\s+(?:do not|don't|dont)\s+have\s+(?:a|any)\s+plans?\b"
+    r"|\b(?:i|we)\s+(?:cannot|can't|cant|can not)\s+help\b"
+    r"|\b(?:ask|check with|transfer you to)\s+(?:my|a)\s+(?:supervisor|manager)\b",
+    re.IGNORECASE
+)
+# Acknowledging the customer's situation
+EMPATHY_PATTERN = re.compile(
+    r"\b(?:i understand|i hear you|i'm sorry|i am sorry|that sounds|i appreciate|must be (?:hard|difficult|stressful)"
+    r"|thank you for (?:sharing|being|telling))\b",
+    re.IGNORECASE
+)
+WORD_PATTERN = re.compile(r"[a-z0-9$']+")
+
+# Negotiation reported for a locally failed conversation with neither an offer nor a refusal
+# (the rubric's "offered no solution" band)
+NO_OFFER_NEGOTIATION = 3
+
+
+def ngrams(text: str) -> set:
+    """Word n-grams of a turn (the whole turn when it's shorter than NGRAM words)."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < NGRAM:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + NGRAM]) for i in range(len(words) - NGRAM + 1)}
+
+
+def similarity(a: set, b: set) -> float:
+    """Jaccard overlap of two n-gram sets."""
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+
+def _overlap_numpy(turn_grams: List[set], owners: List[int]):
+    """
+    Per agent turn: its largest n-gram Jaccard with an earlier turn of the same
+    transcript, and how many of its n-grams an earlier turn already used. Turns
+    are laid out as a (transcript, turn, n-gram) tensor so one batched matrix
+    product compares every pair of turns within each conversation.
+    """
+    # Each distinct n-gram gets its own id (not its hash, which could collide and inflate the overlap)
+    rows, keys, vocabulary = [], [], {}
+    for row, grams in enumerate(turn_grams):
+        rows.extend([row] * len(grams))
+        keys.extend(vocabulary.setdefault(gram, len(vocabulary)) for gram in grams)
+    n = len(turn_grams)
+    owner = np.asarray(owners, dtype=np.int64)
+    turn = np.arange(n) - np.searchsorted(owner, owner, side="left")  # Index of the turn within its transcript
+    sizes = np.bincount(np.asarray(rows, dtype=np.int64), minlength=n)
+    if not keys:
+        return [0.0] * n, [0] * n, sizes.tolist()
+
+    rows = np.asarray(rows, dtype=np.int64)
+    entry_owner = owner[rows]
+    # Number the distinct (transcript, n-gram) pairs, and each n-gram within its transcript
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.lexsort((keys, entry_owner))
+    new_pair = np.ones(len(order), dtype=bool)
+    new_pair[1:] = (np.diff(keys[order]) != 0) | (np.diff(entry_owner[order]) != 0)
+    column = np.empty(len(order), dtype=np.int64)
+    column[order] = np.cumsum(new_pair) - 1
+    pair_owner = entry_owner[order][new_pair]
+    local_column = column - np.searchsorted(pair_owner, entry_owner, side="left")
+
+    transcripts = int(owner.max()) + 1
+    tensor = np.zeros((transcripts, int(turn.max()) + 1, int(local_column.max()) + 1))
+    tensor[entry_owner, turn[rows], local_column] = 1.0
+    shared = tensor @ tensor.transpose(0, 2, 1)
+    counts = tensor.sum(axis=2)
+    union = counts[:, :, None] + counts[:, None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    earlier = np.tri(jaccard.shape[1], k=-1, dtype=bool)  # Only turns before this one count
+    max_overlap = np.where(earlier, jaccard, 0.0).max(axis=2)[owner, turn]
+
+    # An n-gram is a repeat if the transcript first used it in an earlier turn
+    first_turn = np.full(len(pair_owner), n, dtype=np.int64)
+    np.minimum.at(first_turn, column, turn[rows])
+    repeated = np.bincount(rows, weights=first_turn[column] < turn[rows], minlength=n)
+    return max_overlap.tolist(), repeated.astype(int).tolist(), sizes.tolist()
+
+
+def _overlap_python(turn_grams: List[set], owners: List[int]):
+    max_overlap, repeated, sizes = [], [], []
+    seen: Dict[int, set] = {}
+    previous: Dict[int, List[set]] = {}
+    for grams, owner in zip(turn_grams, owners):
+        max_overlap.append(max((similarity(grams, other) for other in previous.get(owner, [])), default=0.0))
+        repeated.append(len(grams & seen.get(owner, set())))
+        sizes.append(len(grams))
+        seen.setdefault(owner, set()).update(grams)
+        previous.setdefault(owner, []).append(grams)
+    return max_overlap, repeated, sizes
+
+
+def score_transcripts(transcripts: List[List[Dict]]) -> List[Dict]:
+    """
+    Local signals for a batch of conversations, no LLM involved: how much the
+    agent repeats itself (n-gram and near-duplicate overlap between its turns),
+    whether it made a concrete $/month offer or gave up, and how often it
+    acknowledged the customer. Each entry also carries 1-10 estimates on the
+    evaluator's scale (negotiation is None when the text doesn't settle it).
+    """
+    turn_grams, owners, texts = [], [], []
+    for index, logs in enumerate(transcripts):
+        for entry in logs:
+            if entry.get("role") == "agent" and entry.get("content"):
+                turn_grams.append(ngrams(entry["content"]))
+                owners.append(index)
+                texts.append(entry["content"])
+
+    if np is not None and turn_grams:
+        max_overlap, repeated, sizes = _overlap_numpy(turn_grams, owners)
+    else:
+        max_overlap, repeated, sizes = _overlap_python(turn_grams, owners)
+
+    signals = [{"agent_turns": 0, "near_duplicates": 0, "ngrams": 0, "repeated_ngrams": 0,
+                "offers": 0, "gave_up": False, "empathetic_turns": 0} for _ in transcripts]
+    for text, owner, overlap, rep, size in zip(texts, owners, max_overlap, repeated, sizes):
+        s = signals[owner]
+        s["agent_turns"] += 1
+        s["near_duplicates"] += overlap >= NEAR_DUPLICATE
+        s["ngrams"] += size
+        s["repeated_ngrams"] += rep
+        s["offers"] += len(OFFER_PATTERN.findall(text))
+        s["gave_up"] = s["gave_up"] or bool(GAVE_UP_PATTERN.search(text))
+        s["empathetic_turns"] += bool(EMPATHY_PATTERN.search(text))
+
+    for s in signals:
+        turns = s["agent_turns"]
+        s["repeat_share"] = round(s["repeated_ngrams"] / s["ngrams"], 3) if s["ngrams"] else 0.0
+        s["duplicate_share"] = round(s["near_duplicates"] / (turns - 1), 3) if turns > 1 else 0.0
+        s["empathy_share"] = round(s["empathetic_turns"] / turns, 3) if turns else 0.0
+        s["repetition"] = max(1, min(10, round(10 - 9 * max(s["repeat_share"], s["duplicate_share"]))))
+        # Rubric: "no plan" / "cannot help" -> 1, a specific dollar plan -> 8+
+        s["negotiation"] = 1 if s["gave_up"] else (8 if s["offers"] else None)
+        s["empathy"] = max(1, min(10, round(2 + 8 * s["empathy_share"])))
+    return signals
+
+
+class LocalScorer:
+    """
+    Decides from local signals alone when a conversation clearly passes or
+    clearly fails the run's targets, so only the ambiguous ones need the LLM
+    evaluator. A clear fail is an agent that gave up (the rubric's Negotiation 1)
+    or one stuck repeating itself well below the repetition target. A clear pass
+    needs a concrete offer, no repetition and steady empathy, with every local
+    estimate at or above its target.
+    """
+
+    def __init__(self, targets: Dict[str, float], repetition_margin: float = 3):
+        self.targets = targets
+        self.repetition_margin = repetition_margin
+
+    def decide(self, signals: Dict) -> Optional[str]:
+        """Returns "pass", "fail", or None to leave the conversation to the LLM."""
+        if not signals["agent_turns"]:
+            return None
+        if signals["gave_up"] and self.targets["negotiation"] > 1:
+            return "fail"
+        if signals["repetition"] <= self.targets["repetition"] - self.repetition_margin:
+            return "fail"
+        if signals["negotiation"] is None or signals["duplicate_share"] > 0 or signals["empathy_share"] < 0.5:
+            return None
+        scores = {"repetition": signals["repetition"], "negotiation": signals["negotiation"], "empathy": signals["empathy"]}
+        overall = sum(scores.values()) / 3
+        if all(scores[k] >= self.targets[k] for k in scores) and overall >= self.targets["overall"]:
+            return "pass"
+        return None
+
+    @staticmethod
+    def metrics(signals: Dict) -> Dict[str, int]:
+        """The local estimates as evaluator metrics."""
+        negotiation = signals["negotiation"] if signals["negotiation"] is not None else NO_OFFER_NEGOTIATION
+        return {"repetition": signals["repetition"], "negotiation": negotiation, "empathy": signals["empathy"]}
+
+    @staticmethod
+    def explain(signals: Dict, decision: str) -> str:
+        if decision == "fail" and signals["gave_up"]:
+            return "Agent said it had no plan or couldn't help."
+        if decision == "fail":
+            return (f"Agent repeated itself ({signals['duplicate_share']:.0%} of turns near-duplicates, "
+                    f"{signals['repeat_share']:.0%} of phrases reused).")
+        return (f"Concrete $/month offer, no repeated turns, empathy in "
+                f"{signals['empathy_share']:.0%} of agent turns.")
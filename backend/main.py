@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import os
 from rich.console import Console
 from rich.table import Table
@@ -6,23 +7,28 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from llm_client import LLMClient
+from llm_client import LLMClient, summarize_rate_limits, summarize_cache, summarize_structured
+from llm_cache import ResponseCache
+from llm_metrics import summarize_llm_calls, format_llm_summary
 from agent import DebtCollectionAgent
 from personalities import DefaulterGenerator, DefaulterAgent
 from simulation import ConversationSimulator
 from evaluator import Evaluator
+from token_budget import summarize_compaction
+from context_window import summarize_context
+from early_stopping import PassRateTest
 from optimizer import ScriptOptimizer
 
 console = Console()
 
 from rich.prompt import Prompt, Confirm
 
-def setup_wizard():
+def setup_wizard(cache: ResponseCache = None):
     console.clear()
     console.rule("[bold cyan]Voice Agent Gym - Setup Wizard[/bold cyan]")
     
     # 1. Select Provider
-    providers = ["gemini", "groq", "openai", "local"]
+    providers = ["gemini", "groq", "openai", "local", "fake", "replay"]
     provider = Prompt.ask("Select LLM Provider", choices=providers, default="groq")
     
     # Defaults
@@ -41,10 +47,10 @@ def setup_wizard():
         api_key = Prompt.ask("Enter Groq API Key", default=default_key, password=True)
         
         # Instantiate 3 clients with recommended models
-        clients["agent"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant")
-        clients["generator"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant")
-        clients["evaluator"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant") 
-        clients["optimizer"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant")
+        clients["agent"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant", cache=cache, role="agent")
+        clients["generator"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant", cache=cache, role="generator")
+        clients["evaluator"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant", cache=cache, role="evaluator")
+        clients["optimizer"] = LLMClient(provider="groq", api_key=api_key, model_name="llama-3.1-8b-instant", cache=cache, role="optimizer")
         
         console.print("[dim]Persona: llama-3.1-8b-instant[/dim]")
         console.print("[dim]Agent (SUT): llama-3.1-8b-instant[/dim]")
@@ -67,23 +73,40 @@ def setup_wizard():
         model_name = Prompt.ask("Enter Model Name (optional)", default="local-model")
         api_key = "lm-studio"
 
+    elif provider in ["fake", "replay"]:
+        # Offline: no key needed. FAKE_LLM_LATENCY / FAKE_LLM_SEED tune the fake provider.
+        offline = None
+        if provider == "replay":
+            offline = {"file": Prompt.ask("Recorded session file", default=os.getenv("LLM_REPLAY_FILE", "session.jsonl"))}
+        client = LLMClient(provider=provider, cache=cache, offline=offline)
+        return {role: client.with_role(role) for role in ("agent", "generator", "evaluator", "optimizer")}
+
     # For non-Groq (or standard), use same client for all
-    client = LLMClient(provider=provider, api_key=api_key, model_name=model_name, base_url=base_url)
+    client = LLMClient(provider=provider, api_key=api_key, model_name=model_name, base_url=base_url, cache=cache)
     return {
-        "agent": client,
-        "generator": client,
-        "evaluator": client,
-        "optimizer": client
+        "agent": client.with_role("agent"),
+        "generator": client.with_role("generator"),
+        "evaluator": client.with_role("evaluator"),
+        "optimizer": client.with_role("optimizer")
     }
 
-def run_simulation_loop(max_cycles: int, batch_size: int = 5, pass_threshold: float = 0.8):
+def run_simulation_loop(max_cycles: int, batch_size: int = 5, pass_threshold: float = 0.8, cache_file: str = None,
+                        early_stop: float = None, context_turns: int = 0):
     # Interactive Setup
-    clients = setup_wizard()
-    
-    agent = DebtCollectionAgent(clients["agent"])
+    cache = ResponseCache(cache_file) if cache_file else None
+    clients = setup_wizard(cache)
+
+    # Everything after setup runs on a single event loop via the async LLM API
+    asyncio.run(_run_cycles(clients, max_cycles, batch_size, pass_threshold, early_stop, context_turns))
+
+async def _run_cycles(clients: dict, max_cycles: int, batch_size: int, pass_threshold: float, early_stop: float = None,
+                      context_turns: int = 0):
+    agent = DebtCollectionAgent(clients["agent"], max_context_turns=context_turns)
     generator = DefaulterGenerator(clients["generator"])
     evaluator = Evaluator(clients["evaluator"])
     optimizer = ScriptOptimizer(clients["optimizer"])
+    context_saved = 0
+    scenarios_saved = 0
 
     for cycle in range(1, max_cycles + 1):
         console.rule(f"[bold yellow]Optimization Cycle {cycle}/{max_cycles}[/bold yellow]")
@@ -92,12 +115,17 @@ def run_simulation_loop(max_cycles: int, batch_size: int = 5, pass_threshold: fl
         failures = []
         
         # --- Batch Execution ---
+        # Early stopping: a Bayesian test on the pass rate ends the batch once the
+        # cycle's outcome is settled at the requested confidence.
+        stopper = PassRateTest(pass_threshold, confidence=early_stop) if early_stop else None
+        settled = None
+        scenarios = []
         for b in range(1, batch_size + 1):
             console.print(f"\n[dim]--- Simulation {b}/{batch_size} ---[/dim]")
             
             # 1. Generate Persona
-            persona = generator.generate_persona()
-            defaulter = DefaulterAgent(persona, clients["generator"])
+            persona = await generator.generate_persona_async()
+            defaulter = DefaulterAgent(persona, clients["generator"], max_context_turns=context_turns)
             
             # Inject name into Agent (SUT)
             agent.reset(defaulter_name=persona.name)
@@ -106,39 +134,58 @@ def run_simulation_loop(max_cycles: int, batch_size: int = 5, pass_threshold: fl
     
             # 2. Run Simulation
             simulator = ConversationSimulator(agent, defaulter)
-            logs = simulator.run()
-    
-            # 3. Evaluate
-            result = evaluator.evaluate_conversation(logs)
-            
-            # Display Score
-            table = Table(title=f"Result: {persona.name}")
-            table.add_column("Metric", style="cyan")
-            table.add_column("Score", style="magenta")
-            
-            table.add_row("Repetition", str(result.metrics.repetition))
-            table.add_row("Negotiation", str(result.metrics.negotiation))
-            table.add_row("Empathy", str(result.metrics.empathy))
-            table.add_row("Overall", str(result.overall_rating))
-            
-            console.print(table)
-            console.print(f"[bold]Feedback:[/bold] {result.feedback}")
-            
-            batch_results.append(result)
-            
-            if result.overall_rating < 8.5:
-                failures.append({
-                    "persona": persona,
-                    "result": result,
-                    "logs": logs
-                })
+            logs = await simulator.run_async()
+            context_saved += summarize_context(agent, defaulter)["tokens_saved"]
+            scenarios.append((persona, logs))
+
+            # 3. Evaluate. Without early stopping the whole batch is scored together
+            # (fewest evaluator calls); with it, each scenario is scored right away.
+            if not stopper and b < batch_size:
+                continue
+            results = await evaluator.evaluate_many([logs for _, logs in scenarios])
+
+            for (persona, logs), result in zip(scenarios, results):
+                # Display Score
+                table = Table(title=f"Result: {persona.name}")
+                table.add_column("Metric", style="cyan")
+                table.add_column("Score", style="magenta")
+                
+                table.add_row("Repetition", str(result.metrics.repetition))
+                table.add_row("Negotiation", str(result.metrics.negotiation))
+                table.add_row("Empathy", str(result.metrics.empathy))
+                table.add_row("Overall", str(result.overall_rating))
+                
+                console.print(table)
+                console.print(f"[bold]Feedback:[/bold] {result.feedback}")
+                
+                batch_results.append(result)
+                if stopper:
+                    stopper.add(result.overall_rating >= 8.5)
+                
+                if result.overall_rating < 8.5:
+                    failures.append({
+                        "persona": persona,
+                        "result": result,
+                        "logs": logs
+                    })
+            scenarios = []
+
+            if stopper:
+                settled = stopper.decision()
+                if settled:
+                    console.print(f"[dim]Early stop: outcome settled ({settled}) after {b}/{batch_size} scenarios.[/dim]")
+                    break
         
         # --- Batch Analysis ---
+        completed = len(batch_results)
         passes = len([r for r in batch_results if r.overall_rating >= 8.5])
-        success_rate = passes / batch_size
+        success_rate = passes / max(completed, 1)
         
         console.rule("[bold green]Batch Report[/bold green]")
-        console.print(f"Cycle {cycle} Result: [bold]{passes}/{batch_size} Passed[/bold] ({success_rate*100:.1f}%)")
+        console.print(f"Cycle {cycle} Result: [bold]{passes}/{completed} Passed[/bold] ({success_rate*100:.1f}%)")
+        if stopper:
+            scenarios_saved += batch_size - completed
+            console.print(f"[dim]Early stopping saved {batch_size - completed} scenarios this cycle.[/dim]")
         
         if success_rate >= pass_threshold:
             console.print(f"[bold green]SUCCESS! Threshold ({pass_threshold*100}%) met. stopping optimization.[/bold green]")
@@ -154,10 +201,25 @@ def run_simulation_loop(max_cycles: int, batch_size: int = 5, pass_threshold: fl
             
             # 4. Self-Correction
             # Use raw_system_prompt to avoid baking in the current defaulter's name
-            new_prompt = optimizer.optimize_screenplay(agent.raw_system_prompt, failures)
+            new_prompt = await optimizer.optimize_screenplay(agent.raw_system_prompt, failures)
             agent.update_prompt(new_prompt)
             console.print("[dim]New prompt applied for next round.[/dim]")
-            
+
+    rate_limits = summarize_rate_limits(clients)
+    cache_stats = summarize_cache(clients)
+    console.print(f"[dim]Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses[/dim]")
+    console.print(f"[dim]Evaluator calls: {evaluator.batch_stats['batched_calls']} batched ({evaluator.batch_stats['batched_transcripts']} transcripts), {evaluator.batch_stats['single_calls']} single[/dim]")
+    compaction = summarize_compaction(evaluator, optimizer)
+    console.print(f"[dim]Prompt compaction: {compaction['tokens_before']} -> {compaction['tokens_after']} tokens ({compaction['tokens_saved']} saved)[/dim]")
+    if early_stop:
+        console.print(f"[dim]Early stopping: {scenarios_saved} scenarios saved in total[/dim]")
+    if context_turns:
+        console.print(f"[dim]Conversation context: {context_saved} input tokens saved by the sliding window[/dim]")
+    console.print(f"[dim]Rate limit waits: {rate_limits['waits']} ({rate_limits['wait_seconds']:.1f}s), 429s: {rate_limits['rate_limit_errors']}[/dim]")
+    console.print(f"[dim]{format_llm_summary(summarize_llm_calls(clients))}[/dim]")
+    structured = summarize_structured(clients)
+    if structured["calls"]:
+        console.print(f"[dim]Structured outputs: {structured['calls']} calls, {structured['parse_failure_rate']:.1%} failed to parse, {structured['repaired']}/{structured['repairs']} repaired, {structured['fallback_rate']:.1%} fell back[/dim]")
     console.print("[bold blue]Test Suite Completed.[/bold blue]")
 
 if __name__ == "__main__":
@@ -165,6 +227,10 @@ if __name__ == "__main__":
     parser.add_argument("--cycles", type=int, default=5, help="Max optimization cycles")
     parser.add_argument("--batch", type=int, default=5, help="Simulations per cycle")
     parser.add_argument("--threshold", type=float, default=0.8, help="Pass threshold (0.0-1.0)")
+    parser.add_argument("--cache", nargs="?", const="llm_cache.db", default=None, help="Replay identical LLM calls from a SQLite response cache")
+    parser.add_argument("--early-stop", nargs="?", type=float, const=0.95, default=None, metavar="CONFIDENCE", help="End a batch once its pass/fail outcome is settled at this confidence")
+    parser.add_argument("--context-turns", type=int, default=0, metavar="N", help="Resend only the last N messages per turn, plus a summary of older ones (default: full history)")
     args = parser.parse_args()
     
-    run_simulation_loop(args.cycles, args.batch, args.threshold)
+    run_simulation_loop(args.cycles, args.batch, args.threshold, cache_file=args.cache, early_stop=args.early_stop,
+                        context_turns=args.context_turns)
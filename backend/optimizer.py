@@ -1,12 +1,27 @@
-from llm_client import LLMClient
-from typing import List, Union
 import asyncio
+from llm_client import LLMClient
+from token_budget import estimate_text_tokens, truncate_text, record_compaction, new_compaction_stats
+from typing import List, Optional, Union
+
+# Angles for search mode, so K candidates aren't K samples of the same rewrite
+CANDIDATE_FOCUSES = [
+    None,
+    "Prioritize negotiation: have the agent name exact authorized $/month plans early and steer to one.",
+    "Prioritize empathy: have the agent acknowledge the customer's hardship before every ask.",
+    "Prioritize natural variety: short turns, never repeating a sentence or an offer verbatim.",
+]
 
 class ScriptOptimizer:
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, max_prompt_tokens: int = 3000, max_feedback_tokens: int = 150):
         self.llm = llm_client
+        # Caps on what gets embedded in the rewrite request. Only the feedback is ever
+        # cut: the prompt is the rewrite target and always goes in whole; one over
+        # max_prompt_tokens is just logged.
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_feedback_tokens = max_feedback_tokens
+        self.compaction_stats = new_compaction_stats()
 
-    async def optimize_screenplay(self, current_prompt: str, failures: List[dict], previous_success_rate: float = 0.0, target_thresholds: Union[dict, object] = None) -> str:
+    async def optimize_screenplay(self, current_prompt: str, failures: List[dict], previous_success_rate: float = 0.0, target_thresholds: Union[dict, object] = None, focus: Optional[str] = None) -> str:
         
         # 1. Safe Threshold Extraction
         if hasattr(target_thresholds, 'dict'):
@@ -41,10 +56,25 @@ class ScriptOptimizer:
                 feedback = res.get('feedback', '')
                 scores = f"Rep:{m.get('repetition')} Neg:{m.get('negotiation')}"
 
-            failure_summaries.append(f"- **{persona_name}** [{scores}]: {feedback}")
+            failure_summaries.append((persona_name, scores, feedback))
+
+        raw_feedback_block = "\n".join(f"- **{n}** [{s}]: {fb}" for n, s, fb in failure_summaries)
+
+        # Identical feedback across personas is listed once; long feedback is truncated
+        grouped = {}
+        for name, scores, feedback in failure_summaries:
+            grouped.setdefault((scores, feedback), []).append(name)
+        feedback_block = "\n".join(
+            f"- **{', '.join(names)}** [{scores}]: {truncate_text(feedback or '', self.max_feedback_tokens)}"
+            for (scores, feedback), names in grouped.items()
+        )
+        prompt_tokens = estimate_text_tokens(current_prompt)
+        if prompt_tokens > self.max_prompt_tokens:
+            print(f"[Optimizer] Prompt is ~{prompt_tokens} tokens (budget {self.max_prompt_tokens}). "
+                  f"Sending it whole: a truncated prompt would be rewritten without its missing instructions.")
+
+        focus_line = f"\n- **FOCUS:** {focus}" if focus else ""
 
-        feedback_block = "\n".join(failure_summaries)
-        
         # 3. Prompt Construction
         prompt = f"""You are a Lead AI Architect. REWRITE the System Prompt to fix behavioral failures.
 
@@ -70,20 +100,39 @@ Rewrite the `CURRENT PROMPT`.
 - **PRESERVE SAFETY:** Keep the "CRITICAL OUTPUT RULES" (No headers).
 - **ANTI-HALLUCINATION:** Keep the constraints, but ADD specific authorized plans to the `<user_instructions>`.
 - **XML HYGIENE:** Ensure tags like `<strict_constraints>` are properly closed.
-- Ensure the new prompt is **SIMPLE** text. Do not over-engineer the XML structure.
+- Ensure the new prompt is **SIMPLE** text. Do not over-engineer the XML structure.{focus_line}
 
 **OUTPUT:**
 Return ONLY the full, executable System Prompt. No markdown.
 """
 
-        # CRITICAL FIX: Wrapped synchronous LLM call in to_thread
-        # This prevents "object str can't be used in 'await'" and "coroutine not iterable" errors
-        response = await asyncio.to_thread(
-            self.llm.complete_chat,
+        after = estimate_text_tokens(prompt)
+        saved = estimate_text_tokens(raw_feedback_block) - estimate_text_tokens(feedback_block)
+        record_compaction(self.compaction_stats, after + saved, after)
+
+        # Native async call: no worker thread tied up while waiting on the network
+        response = await self.llm.complete_chat_async(
             [
                 {"role": "system", "content": "You are a prompt engineer. Output raw text only."},
                 {"role": "user", "content": prompt}
             ]
         )
         
-        return response if response else current_prompt
\ No newline at end of file
+        return response if response else current_prompt
+
+    async def generate_candidates(self, current_prompt: str, failures: List[dict], k: int, **kwargs) -> List[str]:
+        """K rewrites of `current_prompt`, requested concurrently, each from a different angle. Duplicates dropped."""
+        focuses = [CANDIDATE_FOCUSES[i % len(CANDIDATE_FOCUSES)] for i in range(k)]
+        rewrites = await asyncio.gather(
+            *(self.optimize_screenplay(current_prompt, failures, focus=focus, **kwargs) for focus in focuses),
+            return_exceptions=True
+        )
+
+        candidates = []
+        for rewrite in rewrites:
+            if isinstance(rewrite, Exception) or not rewrite or not rewrite.strip():
+                continue
+            if rewrite.strip() == current_prompt.strip() or rewrite in candidates:
+                continue
+            candidates.append(rewrite)
+        return candidates
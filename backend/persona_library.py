@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from personalities import Persona, DefaulterGenerator
+
+
+def persona_fingerprint(persona: Persona) -> str:
+    """Dedup key: the persona's fields, case- and whitespace-insensitive."""
+    fields = persona.dict()
+    normalized = {k: " ".join(str(v).lower().split()) for k, v in sorted(fields.items())}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PersonaLibrary:
+    """Deduplicated, persisted set of generated personas that runs can sample from."""
+
+    def __init__(self, db_file="history.db"):
+        self.db_file = db_file
+        # One connection for the life of the library, as in HistoryManager; the lock
+        # serializes use of it across the threads asyncio.to_thread hands us.
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _init_db(self):
+        self._transaction(lambda c: c.execute('''
+            CREATE TABLE IF NOT EXISTS personas (
+                fingerprint TEXT PRIMARY KEY,
+                name TEXT,
+                data TEXT,
+                created_at TEXT,
+                times_used INTEGER DEFAULT 0
+            )
+        '''))
+
+    def _transaction(self, write):
+        with self._lock:
+            c = self._conn.cursor()
+            try:
+                value = write(c)
+                self._conn.commit()
+                return value
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def add_many(self, personas: List[Persona]) -> int:
+        """Stores new personas, skipping ones already in the library. Returns how many were added."""
+        if not personas:
+            return 0
+        now = datetime.now().isoformat()
+
+        def write(c):
+            added = 0
+            for persona in personas:
+                c.execute(
+                    'INSERT OR IGNORE INTO personas (fingerprint, name, data, created_at) VALUES (?, ?, ?, ?)',
+                    (persona_fingerprint(persona), persona.name, json.dumps(persona.dict()), now)
+                )
+                added += c.rowcount
+            return added
+
+        return self._transaction(write)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM personas').fetchone()[0]
+
+    def fingerprints(self) -> List[str]:
+        """All fingerprints, least-used first (random order among equals)."""
+        with self._lock:
+            rows = self._conn.execute('SELECT fingerprint FROM personas ORDER BY times_used ASC, RANDOM()').fetchall()
+        return [row[0] for row in rows]
+
+    def take(self, fingerprint: str) -> Optional[Persona]:
+        """Loads a persona and bumps its usage count."""
+        def write(c):
+            row = c.execute('SELECT data FROM personas WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            if row is not None:
+                c.execute('UPDATE personas SET times_used = times_used + 1 WHERE fingerprint = ?', (fingerprint,))
+            return row
+
+        row = self._transaction(write)
+        if row is None:
+            return None
+        try:
+            return Persona(**json.loads(row[0]))
+        except Exception:
+            return None
+
+    def sample(self, n: int) -> List[Persona]:
+        personas = []
+        for fingerprint in self.fingerprints()[:n]:
+            persona = self.take(fingerprint)
+            if persona:
+                personas.append(persona)
+        return personas
+
+    def clear(self):
+        self._transaction(lambda c: c.execute('DELETE FROM personas'))
+
+
+class PersonaPool:
+    """
+    Hands out personas for one run. Draws from the library first (each persona at
+    most once per pass), while a background task tops the library up with bulk
+    generations. Only falls back to a one-off LLM call if the library is empty.
+    """
+
+    def __init__(self, library: PersonaLibrary, generator: DefaulterGenerator, target_size: int,
+                 bulk_size: int = 10, max_failures: int = 3):
+        self.library = library
+        self.generator = generator
+        self.target_size = target_size
+        self.bulk_size = bulk_size
+        self.max_failures = max_failures
+
+        self.stats = {"from_library": 0, "generated_single": 0, "generated_bulk": 0}
+        self._unseen = deque()
+        self._seen = set()
+        self._lock = asyncio.Lock()  # Concurrent next() calls refill the queue one at a time
+        self._prefill_task = None
+
+    def start(self):
+        self._prefill_task = asyncio.create_task(self._prefill())
+
+    def stop(self):
+        if self._prefill_task:
+            self._prefill_task.cancel()
+
+    async def _prefill(self):
+        failures = 0
+        while failures < self.max_failures:
+            total = await asyncio.to_thread(self.library.count)
+            if total >= self.target_size:
+                return
+            count = min(self.bulk_size, self.target_size - total)
+            personas = await self.generator.generate_personas_async(count)
+            added = await asyncio.to_thread(self.library.add_many, personas)
+            self.stats["generated_bulk"] += added
+            if added == 0:
+                failures += 1
+
+    async def next(self) -> Persona:
+        async with self._lock:
+            if not self._unseen:
+                fingerprints = await asyncio.to_thread(self.library.fingerprints)
+                fresh = [fp for fp in fingerprints if fp not in self._seen]
+                if not fresh and fingerprints:
+                    # Everything in the library has been used this run: start another pass
+                    self._seen.clear()
+                    fresh = fingerprints
+                self._unseen.extend(fresh)
+
+        while self._unseen:
+            fingerprint = self._unseen.popleft()
+            self._seen.add(fingerprint)
+            persona = await asyncio.to_thread(self.library.take, fingerprint)
+            if persona:
+                self.stats["from_library"] += 1
+                return persona
+
+        # Library still empty (first run, prefill in flight): pay for a single call
+        self.stats["generated_single"] += 1
+        persona = await self.generator.generate_persona_async()
+        if persona != self.generator._fallback_persona():
+            await asyncio.to_thread(self.library.add_many, [persona])
+        return persona
@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
-import json
-import re
+from typing import List
 from llm_client import LLMClient
+from structured_output import extract_json
+from context_window import ContextWindow
 from rich.console import Console
 
 console = Console()
@@ -33,29 +34,19 @@ Loan Details: $500 overdue, 30 days late.
 4. **YIELD CONDITION:** You only agree to pay if the Agent offers a specific Monthly Payment Plan that fits your budget AND treats you with respect. Otherwise, hang up or stall.
 """
 
+class PersonaBatch(BaseModel):
+    personas: List[Persona]
+
 class DefaulterGenerator:
-    def __init__(self, llm_client: LLMClient):
+    def __init__(self, llm_client: LLMClient, logger=None):
         self.llm = llm_client
+        self.console = logger or console
 
     def _clean_and_parse_json(self, text: str) -> dict:
         """S-Tier Parsing: Handles Markdown blocks and extra text."""
-        try:
-            cleaned = text.strip()
-            if "```" in cleaned:
-                cleaned = re.sub(r'```json\s*', '', cleaned, flags=re.IGNORECASE)
-                cleaned = re.sub(r'```', '', cleaned)
-            
-            match = re.search(r'\{.*\}', cleaned, re.DOTALL)
-            if match:
-                cleaned = match.group(0)
-            
-            return json.loads(cleaned)
-        except Exception:
-            raise ValueError("Could not parse Persona JSON")
+        return extract_json(text)
 
-    def generate_persona(self) -> Persona:
-        console.print("[bold cyan]Generating Persona...[/bold cyan]")
-        prompt = """Generate a realistic persona for a customer who has defaulted on a loan.
+    PERSONA_PROMPT = """Generate a realistic persona for a customer who has defaulted on a loan.
 The persona should be challenging but realistic for a debt collection voice agent to handle.
 
 RETURN RAW JSON ONLY. NO MARKDOWN.
@@ -68,41 +59,134 @@ Input Schema:
   "objection_type": "Objection (String)"
 }
 """
+
+    def _persona_messages(self):
+        return [
+            {"role": "system", "content": "You are a creative writer generating personas. Output valid flat JSON only."},
+            {"role": "user", "content": self.PERSONA_PROMPT}
+        ]
+
+    def _fallback_persona(self) -> Persona:
+        return Persona(
+            name="John Doe", 
+            personality_traits="Neutral", 
+            financial_situation="Forgot to pay", 
+            communication_style="Direct", 
+            objection_type="Forgot"
+        )
+
+    def generate_persona(self) -> Persona:
+        self.console.print("[bold cyan]Generating Persona...[/bold cyan]")
         try:
             # console.print("[dim]Calling LLM for persona...[/dim]")
-            response_text = self.llm.complete_chat([
-                {"role": "system", "content": "You are a creative writer generating personas. Output valid flat JSON only."},
-                {"role": "user", "content": prompt}
-            ], json_response=True)
-            
-            data = self._clean_and_parse_json(response_text)
-            persona = Persona(**data)
+            persona = self.llm.complete_chat(self._persona_messages(), schema=Persona)
+            if persona is None:
+                raise ValueError("No valid persona in the reply, even after repair")
             # console.print(f"[green]Persona Generated:[/green] {persona.name}")
             return persona
         except Exception as e:
-            console.print(f"[bold red]Persona Gen Error:[/bold red] {e}")
+            self.console.print(f"[bold red]Persona Gen Error:[/bold red] {e}")
             # Fallback
-            return Persona(
-                name="John Doe", 
-                personality_traits="Neutral", 
-                financial_situation="Forgot to pay", 
-                communication_style="Direct", 
-                objection_type="Forgot"
-            )
+            return self._fallback_persona()
+
+    async def generate_persona_async(self) -> Persona:
+        self.console.print("[bold cyan]Generating Persona...[/bold cyan]")
+        try:
+            persona = await self.llm.complete_chat_async(self._persona_messages(), schema=Persona)
+            if persona is None:
+                raise ValueError("No valid persona in the reply, even after repair")
+            return persona
+        except Exception as e:
+            self.console.print(f"[bold red]Persona Gen Error:[/bold red] {e}")
+            return self._fallback_persona()
+
+    BULK_PERSONA_PROMPT = """Generate {count} distinct, realistic personas for customers who have defaulted on a loan.
+Each persona should be challenging but realistic for a debt collection voice agent to handle.
+Vary the names, personality traits, financial situations, communication styles and objections.
+
+RETURN RAW JSON ONLY. NO MARKDOWN.
+Input Schema:
+{{
+  "personas": [
+    {{
+      "name": "Full Name (String)",
+      "personality_traits": "Traits (String)",
+      "financial_situation": "Context (String)",
+      "communication_style": "Style (String)",
+      "objection_type": "Objection (String)"
+    }}
+  ]
+}}
+"""
+
+    def _bulk_messages(self, count: int):
+        return [
+            {"role": "system", "content": "You are a creative writer generating personas. Output valid JSON only."},
+            {"role": "user", "content": self.BULK_PERSONA_PROMPT.format(count=count)}
+        ]
+
+    def generate_personas(self, count: int) -> List[Persona]:
+        """Bulk mode: `count` personas in one LLM call, validated (and repaired if needed) as a PersonaBatch."""
+        self.console.print(f"[bold cyan]Generating {count} Personas...[/bold cyan]")
+        try:
+            batch = self.llm.complete_chat(self._bulk_messages(count), schema=PersonaBatch)
+            return batch.personas if batch else []
+        except Exception as e:
+            self.console.print(f"[bold red]Bulk Persona Gen Error:[/bold red] {e}")
+            return []
+
+    async def generate_personas_async(self, count: int) -> List[Persona]:
+        self.console.print(f"[bold cyan]Generating {count} Personas...[/bold cyan]")
+        try:
+            batch = await self.llm.complete_chat_async(self._bulk_messages(count), schema=PersonaBatch)
+            return batch.personas if batch else []
+        except Exception as e:
+            self.console.print(f"[bold red]Bulk Persona Gen Error:[/bold red] {e}")
+            return []
 
 class DefaulterAgent:
-    def __init__(self, persona: Persona, llm_client: LLMClient):
+    def __init__(self, persona: Persona, llm_client: LLMClient, max_context_turns: int = 0):
         self.persona = persona
         self.llm = llm_client
         self.history = [{"role": "system", "content": self.persona.to_system_prompt()}]
+        self.context = ContextWindow(max_turns=max_context_turns, labels={"user": "Agent", "assistant": "You"})
+
+    # Stop sequences to prevent the Defaulter from writing the Agent's lines
+    STOP_SEQUENCES = ["Agent:", "Rachel:", "Collector:", "\n\n"]
 
     def respond(self, message: str):
         self.history.append({"role": "user", "content": message})
         
-        # Stop sequences to prevent the Defaulter from writing the Agent's lines
-        stops = ["Agent:", "Rachel:", "Collector:", "\n\n"]
-        
-        response = self.llm.complete_chat(self.history, stop=stops)
+        response = self.llm.complete_chat(self.context.messages(self.history), stop=self.STOP_SEQUENCES)
+        if response:
+            self.history.append({"role": "assistant", "content": response})
+        return response
+
+    async def respond_async(self, message: str):
+        self.history.append({"role": "user", "content": message})
+
+        response = await self.llm.complete_chat_async(self.context.messages(self.history), stop=self.STOP_SEQUENCES)
+        if response:
+            self.history.append({"role": "assistant", "content": response})
+        return response
+
+    async def respond_stream_async(self, message: str, on_delta=None):
+        """Streams the reply through `await on_delta(text)`; falls back to a regular call if the stream fails."""
+        self.history.append({"role": "user", "content": message})
+
+        chunks = []
+        try:
+            async for delta in self.llm.stream_chat_async(self.context.messages(self.history), stop=self.STOP_SEQUENCES):
+                chunks.append(delta)
+                if on_delta:
+                    await on_delta(delta)
+        except Exception as e:
+            print(f"[Defaulter] ERROR: LLM stream failed: {e}. Falling back to a regular call.")
+            chunks = []  # A reply cut off mid-stream is dropped, not kept as the turn
+
+        response = "".join(chunks)
+        if not response.strip():
+            response = await self.llm.complete_chat_async(self.context.messages(self.history), stop=self.STOP_SEQUENCES)
         if response:
             self.history.append({"role": "assistant", "content": response})
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+# How often a running pipeline reports its stage stats (seconds)
+STATS_INTERVAL = 1.0
+
+
+class Stage:
+    """
+    One step of a Pipeline: `concurrency` workers taking items from a bounded
+    queue. `handler(item)` returns the item for the next stage, or None to drop
+    it. A full queue blocks whoever feeds it, so a slow stage holds back the
+    ones before it instead of letting work pile up (backpressure).
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], concurrency: int = 1,
+                 queue_size: Optional[int] = None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(1, queue_size if queue_size is not None else self.concurrency)
+        self.queue: Optional[asyncio.Queue] = None
+        self.stats = {"processed": 0, "dropped": 0, "in_flight": 0, "max_queue": 0,
+                      "busy_seconds": 0.0, "blocked_seconds": 0.0}
+
+    def snapshot(self, elapsed: float) -> Dict[str, Any]:
+        depth = self.queue.qsize() if self.queue else 0
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "queue": depth,
+            "queue_size": self.queue_size,
+            "max_queue": self.stats["max_queue"],
+            "in_flight": self.stats["in_flight"],
+            "processed": self.stats["processed"],
+            "dropped": self.stats["dropped"],
+            # Share of worker time spent in the handler (waiting on downstream excluded)
+            "utilization": round(min(1.0, self.stats["busy_seconds"] / (self.concurrency * elapsed)), 3) if elapsed > 0 else 0.0,
+            "blocked_seconds": round(self.stats["blocked_seconds"], 2),
+        }
+
+
+class Pipeline:
+    """
+    Streams items through stages connected by bounded queues, e.g.
+    generate -> simulate -> evaluate -> optimize, each stage with its own
+    worker count. `run(items)` returns once every item has left the last stage
+    (or been dropped); an exception in any handler stops the whole pipeline
+    and is re-raised.
+    """
+
+    def __init__(self, stages: List[Stage], on_stats: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+                 stats_interval: float = STATS_INTERVAL):
+        self.stages = stages
+        self.on_stats = on_stats
+        self.stats_interval = stats_interval
+        self._stopped = False
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def stop(self):
+        """Stops feeding new items; the ones already inside still finish."""
+        self._stopped = True
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        if self._started is None:
+            return [stage.snapshot(0.0) for stage in self.stages]
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return [stage.snapshot(elapsed) for stage in self.stages]
+
+    async def _put(self, stage: Stage, item):
+        start = time.perf_counter()
+        await stage.queue.put(item)
+        stage.stats["max_queue"] = max(stage.stats["max_queue"], stage.queue.qsize())
+        return time.perf_counter() - start
+
+    async def _work(self, index: int):
+        stage = self.stages[index]
+        downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = await stage.queue.get()
+            try:
+                stage.stats["in_flight"] += 1
+                start = time.perf_counter()
+                try:
+                    out = await stage.handler(item)
+                finally:
+                    stage.stats["in_flight"] -= 1
+                    stage.stats["busy_seconds"] += time.perf_counter() - start
+                if out is None:
+                    stage.stats["dropped"] += 1
+                    continue
+                stage.stats["processed"] += 1
+                if downstream is not None:
+                    stage.stats["blocked_seconds"] += await self._put(downstream, out)
+            finally:
+                stage.queue.task_done()
+
+    async def _drain(self, items: Iterable):
+        for item in items:
+            if self._stopped:
+                break
+            await self._put(self.stages[0], item)
+        # Each stage only hands items downstream before marking them done, so joining in order drains everything
+        for stage in self.stages:
+            await stage.queue.join()
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            await self.on_stats(self.snapshot())
+
+    async def run(self, items: Iterable):
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        self._started = time.perf_counter()
+        self._finished = None
+
+        workers = [asyncio.create_task(self._work(i)) for i, stage in enumerate(self.stages) for _ in range(stage.concurrency)]
+        drain = asyncio.create_task(self._drain(items))
+        reporter = asyncio.create_task(self._report()) if self.on_stats else None
+        try:
+            # Workers only finish by raising; the drain finishes when the pipeline is empty
+            done, _ = await asyncio.wait([drain, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in [drain, *workers] + ([reporter] if reporter else []):
+                task.cancel()
+            await asyncio.gather(drain, *workers, *([reporter] if reporter else []), return_exceptions=True)
+            self._finished = time.perf_counter()
+            if self.on_stats:
+                await self.on_stats(self.snapshot())
@@ -0,0 +1,105 @@
+import math
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from optimizer import ScriptOptimizer
+
+# score_batch([(prompt, persona), ...]) -> [(score, passed), ...] in the same order
+ScoreBatch = Callable[[List[Tuple[str, object]]], Awaitable[List[Tuple[float, bool]]]]
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+class PromptSearch:
+    """
+    Successive halving over candidate prompts.
+
+    The incumbent and K fresh rewrites all play the same personas in the same
+    order. Each rung gives every surviving candidate `budget` personas, then
+    keeps the better half and doubles the budget, so most scenarios are spent
+    on the leaders. The winner only replaces the incumbent if it scored higher
+    on the personas both of them played, and only once both have played at
+    least `min_shared` of them (never fewer than rung 0's budget); whichever is
+    short of that is topped up first, so one lucky persona can't swap prompts.
+    """
+
+    def __init__(self, optimizer: ScriptOptimizer, score_batch: ScoreBatch, num_candidates: int = 4,
+                 initial_budget: int = 1, min_shared: int = 3):
+        self.optimizer = optimizer
+        self.score_batch = score_batch
+        self.num_candidates = num_candidates
+        self.initial_budget = max(1, initial_budget)
+        self.min_shared = max(self.initial_budget, min_shared)
+
+    async def run(self, incumbent: str, failures: List[dict], personas: List[object], **optimize_kwargs) -> Dict:
+        rewrites = await self.optimizer.generate_candidates(incumbent, failures, self.num_candidates, **optimize_kwargs)
+        entries = [{"label": "incumbent", "prompt": incumbent, "scores": [], "passes": [], "eliminated_in": None}]
+        entries += [
+            {"label": f"candidate {i + 1}", "prompt": prompt, "scores": [], "passes": [], "eliminated_in": None}
+            for i, prompt in enumerate(rewrites)
+        ]
+
+        alive = list(entries)
+        budget = self.initial_budget
+        rung = 0
+        scenarios_run = 0
+
+        async def play(players: List[Dict], upto: int):
+            nonlocal scenarios_run
+            jobs = [(entry, personas[i]) for entry in players for i in range(len(entry["scores"]), upto)]
+            if not jobs:
+                return
+            results = await self.score_batch([(entry["prompt"], persona) for entry, persona in jobs])
+            for (entry, _), (score, passed) in zip(jobs, results):
+                entry["scores"].append(score)
+                entry["passes"].append(passed)
+            scenarios_run += len(jobs)
+
+        while personas:
+            budget = min(budget, len(personas))
+            await play(alive, budget)
+
+            if len(alive) == 1 or budget >= len(personas):
+                break
+            alive.sort(key=lambda e: _mean(e["scores"]), reverse=True)
+            keep = math.ceil(len(alive) / 2)
+            for entry in alive[keep:]:
+                entry["eliminated_in"] = rung
+            alive = alive[:keep]
+            budget *= 2
+            rung += 1
+
+        incumbent_entry = entries[0]
+        winner = max(alive, key=lambda e: _mean(e["scores"]))
+        required = min(self.min_shared, len(personas))
+        if winner is not incumbent_entry:
+            # The incumbent may have been knocked out on rung 0's single persona
+            await play([winner, incumbent_entry], required)
+        # Compare on the personas both played, so an early exit doesn't skew the means
+        shared = min(len(winner["scores"]), len(incumbent_entry["scores"]))
+        adopted = (
+            winner is not incumbent_entry and shared > 0 and shared >= required
+            and _mean(winner["scores"][:shared]) > _mean(incumbent_entry["scores"][:shared])
+        )
+
+        return {
+            "prompt": winner["prompt"] if adopted else incumbent,
+            "adopted": adopted,
+            "winner": winner["label"],
+            "scenarios_run": scenarios_run,
+            "leaderboard": self._leaderboard(entries),
+        }
+
+    def _leaderboard(self, entries: List[Dict]) -> List[Dict]:
+        board = [{
+            "label": e["label"],
+            "mean_score": round(_mean(e["scores"]), 2),
+            "pass_rate": _mean([1.0 if p else 0.0 for p in e["passes"]]),
+            "scenarios": len(e["scores"]),
+            "eliminated_in": e["eliminated_in"],
+            "prompt_preview": e["prompt"][:200],
+        } for e in entries]
+        # Survivors first (they played the most personas), then by score
+        board.sort(key=lambda e: (e["eliminated_in"] is not None, -(e["eliminated_in"] or 0), -e["mean_score"]))
+        return board
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Starting (requests/min, tokens/min) budgets per provider: the free tiers we
+# develop against. Buckets are resized to the x-ratelimit-limit-* headers the
+# provider sends, so paid keys aren't held to these. Gemini sends no such headers,
+# so it gets no default (a free-tier guess would never be corrected) and is not
+# throttled unless asked. To fix a budget, pass rpm/tpm to LLMClient
+# (SimulationConfig.rpm/tpm) or set e.g. GROQ_RPM / GEMINI_RPM.
+DEFAULT_LIMITS = {
+    "groq": (30, 6000),
+    "openai": (500, 30000),
+}
+
+# Tokens reserved for the completion before we know how long it will be.
+# Reconciled against the real usage once the response arrives.
+OUTPUT_TOKEN_ALLOWANCE = 256
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_duration(value) -> Optional[float]:
+    """Parses provider reset headers ('7.66s', '2m59.56s', '20ms', '12') into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+class TokenBucket:
+    """
+    Refills continuously at `capacity` per minute. Reservations may drive the
+    level negative; the deficit is what later callers have to wait out, so
+    callers are served in the order they reserved (FIFO).
+    """
+
+    def __init__(self, capacity: int, fixed: bool = False):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.fixed = fixed  # Configured explicitly: provider limit headers don't resize it
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        wait = max(0.0, self.updated - now)
+        if self.level < 0:
+            wait += -self.level / self.rate
+        return wait
+
+    def adjust(self, amount: float, now: float):
+        """Gives back (positive) or charges (negative) tokens after the fact."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def resize(self, capacity: float, now: float):
+        """New per-minute budget; the level moves by the difference so reservations already made still count."""
+        self._refill(now)
+        self.level = min(capacity, self.level + capacity - self.capacity)
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+
+    def cap(self, remaining: float, now: float):
+        """Never believe we have more headroom than the provider says we do."""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def pause(self, seconds: float, now: float):
+        """Stops refilling until `now + seconds` (e.g. after a 429 / retry-after)."""
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+        self.updated = max(self.updated, now + seconds)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget shared by every client on one key."""
+
+    def __init__(self, rpm: int, tpm: int, fixed_rpm: bool = False, fixed_tpm: bool = False):
+        self.requests = TokenBucket(rpm, fixed=fixed_rpm)
+        self.tokens = TokenBucket(tpm, fixed=fixed_tpm)
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Claims a slot and returns how long the caller must wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            return max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+    def settle(self, reserved_tokens: int, actual_tokens: Optional[int]):
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self.tokens.adjust(reserved_tokens - actual_tokens, time.monotonic())
+
+    def update_from_headers(self, headers):
+        """Syncs the local buckets with the provider's x-ratelimit-* / retry-after headers."""
+        if headers is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+                if limit and not bucket.fixed and limit != bucket.capacity:
+                    bucket.resize(limit, now)
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                bucket.cap(remaining, now)
+                if remaining <= 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        bucket.pause(reset, now)
+
+            retry_after = parse_duration(headers.get("retry-after"))
+            if retry_after:
+                self.requests.pause(retry_after, now)
+
+    def penalize(self, seconds: float):
+        """Called on a 429: everyone sharing this key backs off together."""
+        with self._lock:
+            self.requests.pause(seconds, time.monotonic())
+
+
+def _header_number(headers, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _env_limit(provider: str, kind: str) -> Optional[int]:
+    value = os.getenv(f"{provider.upper()}_{kind}")
+    return int(value) if value else None
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, api_key: Optional[str], rpm: int = None, tpm: int = None) -> Optional[RateLimiter]:
+    """
+    Returns the process-wide limiter for (provider, api_key), creating it on first use.
+    Providers without a known budget (e.g. "local") are not limited unless rpm/tpm is given.
+    An explicit rpm/tpm (argument, then <PROVIDER>_RPM / <PROVIDER>_TPM) is kept as is;
+    otherwise the defaults are a starting point the provider's limit headers replace.
+    """
+    fixed_rpm = rpm or _env_limit(provider or "", "RPM")
+    fixed_tpm = tpm or _env_limit(provider or "", "TPM")
+    default_rpm, default_tpm = DEFAULT_LIMITS.get(provider, (None, None))
+    rpm = fixed_rpm or default_rpm
+    tpm = fixed_tpm or default_tpm
+    if not rpm and not tpm:
+        return None
+
+    # Don't keep raw API keys around as dict keys
+    key_digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    key = (provider, key_digest)
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(rpm or 10 ** 6, tpm or 10 ** 9, fixed_rpm=bool(fixed_rpm), fixed_tpm=bool(fixed_tpm))
+            _limiters[key] = limiter
+        else:
+            # A later run on the same key asking for a specific budget gets it
+            with limiter._lock:
+                now = time.monotonic()
+                for bucket, fixed in ((limiter.requests, fixed_rpm), (limiter.tokens, fixed_tpm)):
+                    if fixed:
+                        bucket.fixed = True
+                        if fixed != bucket.capacity:
+                            bucket.resize(fixed, now)
+        return limiter
@@ -1,23 +1,30 @@
 import asyncio
 import json
 import logging
-from typing import Dict, Any, List
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from typing import Dict, Any, List, Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from datetime import datetime
 import traceback
 
 # Import existing logic
-from llm_client import LLMClient
+from llm_client import summarize_rate_limits, summarize_cache, summarize_structured
+from llm_router import summarize_routing
+from llm_cache import ResponseCache
+from llm_metrics import llm_metrics, summarize_llm_calls, format_llm_summary
 from agent import DebtCollectionAgent
-from personalities import DefaulterGenerator, DefaulterAgent
+from personalities import DefaulterAgent, Persona
 from simulation import ConversationSimulator
-from evaluator import Evaluator
-from optimizer import ScriptOptimizer
-import simulation  # To override console
-import main  # To override console if needed
-from history_manager import HistoryManager
+from evaluator import EvaluationBatcher, EvaluationResult, EvaluationMetrics
+from history_manager import HistoryManager, RESUMABLE
+from persona_library import PersonaLibrary
+from session import RunSession, RunRegistry, RunLimitExceeded, new_run_id, FINISHED
+from prompt_search import PromptSearch
+from early_stopping import MeanTargetsTest
+from token_budget import summarize_compaction
+from pipeline import Pipeline, Stage
+from context_window import summarize_context
 
 # Setup Request Object
 class ThresholdConfig(BaseModel):
@@ -26,6 +33,11 @@ class ThresholdConfig(BaseModel):
     empathy: float
     overall: float
 
+class BackendConfig(BaseModel):
+    provider: str  # groq, openai, local, gemini (or fake/replay)
+    model_name: Optional[str] = None  # Default: the provider's default model
+    offline: Optional[Dict[str, Any]] = None  # fake/replay options for this backend
+
 class SimulationConfig(BaseModel):
     api_key: str
     model_name: str
@@ -33,9 +45,43 @@ class SimulationConfig(BaseModel):
     max_cycles: int
     batch_size: int
     thresholds: ThresholdConfig
+    concurrency: int = 1  # Conversations in flight per batch (the simulate stage's workers)
+    generate_concurrency: int = 2  # Persona generations in flight, ahead of the conversations
+    evaluate_concurrency: Optional[int] = None  # Evaluator calls in flight (default: same as concurrency)
+    optimize_concurrency: int = 1  # Prompt rewrites in flight; above 1 rewrites overlap and the last to finish wins
+    stage_queue_size: Optional[int] = None  # Items waiting between stages (default: the receiving stage's workers)
+    rpm: Optional[int] = None  # Fixed requests/min for the provider's key (default: sized from its rate-limit headers)
+    tpm: Optional[int] = None  # Fixed tokens/min, same
+    use_cache: bool = False  # Replay identical LLM calls from the response cache
+    persona_library: bool = True  # Sample personas from the persisted library instead of one LLM call each
+    stream_turns: bool = True  # Forward per-token `turn_delta` events while conversations run
+    batch_evaluation: bool = True  # Concurrent scenarios share evaluator calls (needs concurrency > 1)
+    eval_batch_tokens: int = 4000  # Token budget for one batched evaluator request
+    context_turns: int = 0  # >0: each speaker resends only this many recent messages plus a summary of older ones (0 = full history)
+    search_candidates: int = 0  # >0: end-of-cycle prompt search over this many rewrites instead of rewriting after each failure
+    search_personas: int = 4  # Shared persona set the search candidates are scored on
+    early_stopping: bool = False  # End a batch once the cycle's pass/fail outcome is statistically settled (rewrites then wait for the cycle's end)
+    early_stop_confidence: float = 0.95
+    local_prescoring: bool = False  # Grade clear passes/fails with local text heuristics, the LLM evaluator only sees the rest
+    termination: str = "bye"  # When a call ends: "bye" (goodbye only), "rules" (+ agreement/hang-up/loop/stall), "classifier" (rules + a cheap model)
+    termination_model: Optional[str] = None  # Model for the "classifier" check (default: model_name)
+    provider: str = "groq"  # "fake" or "replay" run without network (see fake_llm.py)
+    offline: Optional[Dict[str, Any]] = None  # fake/replay options: seed, latency, error_rate, script, on_miss
+    backends: List[BackendConfig] = []  # More providers/models to route between, by latency and error rate (see llm_router.py)
+    hedging: bool = True  # With backends: re-send a call that is slower than its backend's p95 to the next one
 
 app = FastAPI()
 history_manager = HistoryManager()
+history_manager.mark_interrupted()  # Runs still "running" from a previous process can be resumed
+persona_library = PersonaLibrary(history_manager.db_file)
+run_registry = RunRegistry()
+response_cache = None  # Created on first run that asks for it
+
+def get_response_cache() -> ResponseCache:
+    global response_cache
+    if response_cache is None:
+        response_cache = ResponseCache("llm_cache.db")
+    return response_cache
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,136 +91,285 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ... (Logger classes) ...
-class WebSocketLogger:
-    def __init__(self, websocket: WebSocket):
-        self.websocket = websocket
-
-    def print(self, *args, **kwargs):
-        pass
+@app.get("/metrics")
+async def get_metrics():
+    """LLM call counters and latency histograms in the Prometheus text format."""
+    return PlainTextResponse(llm_metrics.render(), media_type="text/plain; version=0.0.4")
 
-log_queue = asyncio.Queue()
-
-class AsyncConsoleLogger:
-    def print(self, *args, **kwargs):
-        msg = " ".join(str(arg) for arg in args)
-        log_queue.put_nowait(msg)
-    
-    def rule(self, *args, **kwargs):
-        self.print("---", *args, "---")
+@app.get("/history")
+async def get_history(limit: int = 50, cursor: Optional[str] = None, min_success_rate: Optional[float] = None,
+                      max_success_rate: Optional[float] = None, since: Optional[str] = None,
+                      until: Optional[str] = None, model_name: Optional[str] = None):
+    # Summaries only; transcripts come from /history/{run_id}
+    limit = max(1, min(limit, 500))
+    try:
+        return await asyncio.to_thread(
+            history_manager.list_runs, limit, cursor, min_success_rate, max_success_rate, since, until, model_name
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    def clear(self):
-        pass
+@app.get("/history/{run_id}")
+async def get_history_run(run_id: str):
+    run = await asyncio.to_thread(history_manager.get_run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
 
-@app.get("/history")
-async def get_history():
-    return history_manager.load_history()
+@app.get("/history/{run_id}/scenarios")
+async def get_history_scenarios(run_id: str, limit: int = 100, offset: int = 0, passed: Optional[bool] = None,
+                                cycle: Optional[int] = None, include_transcripts: bool = True):
+    limit = max(1, min(limit, 1000))
+    return await asyncio.to_thread(
+        history_manager.list_scenarios, run_id, limit, offset, passed, cycle, include_transcripts
+    )
 
 @app.delete("/history/{run_id}")
 async def delete_history(run_id: str):
-    history_manager.delete_run(run_id)
+    await asyncio.to_thread(history_manager.delete_run, run_id)
     return {"status": "success"}
 
-@app.websocket("/ws/simulate")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    
-    original_console = simulation.console
-    simulation.console = AsyncConsoleLogger()
-    main.console = simulation.console 
-    
-    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
-    all_results_storage = []
-    optimization_storage = []
-    config = None
+async def run_simulation(session: RunSession):
+    """Runs one optimization loop, publishing logs/results on the session's event channel."""
+    session.build(persona_library, cache=get_response_cache() if session.config.use_cache else None)
+    config = session.config
+    run_id = session.run_id
+    clients = session.clients
+    agent = session.agent
+    generator = session.generator
+    evaluator = session.evaluator
+    optimizer = session.optimizer
+    persona_pool = session.persona_pool
+    termination = session.termination
+
+    # Results and optimization steps go straight to the history store as they
+    # happen; only the current cycle's scores are kept here.
+    resume = session.resume
+    state = resume["state"] if resume else {}
+    search_history = state.get("search_history", [])
+    early_stops = state.get("early_stops", [])
+    context_totals = state.get("context_totals") or {"calls": 0, "tokens_full": 0, "tokens_sent": 0, "tokens_saved": 0}
+    pipeline_stats = state.get("pipeline", [])
+    prescoring_cycles = state.get("prescoring", [])
+    termination_totals = state.get("termination") or {"conversations": 0, "turns": 0, "reasons": {}}
     final_success_rate = 0.0
-    cycle = 0
+    status = "completed"
+    start_cycle = resume["cycle"] if resume else 1
+    cycle = start_cycle - 1
 
     try:
-        data = await websocket.receive_text()
-        config_dict = json.loads(data)
-        config = SimulationConfig(**config_dict)
-        
-        # Initialize Clients
-        agent_client = LLMClient(provider="groq", api_key=config.api_key, model_name=config.model_name)
-        
-        clients = {
-            "agent": agent_client,
-            "generator": agent_client, 
-            "evaluator": agent_client,
-            "optimizer": agent_client
-        }
-        
-        # Initialize Components
-        agent = DebtCollectionAgent(clients["agent"], system_prompt=config.base_prompt)
-        generator = DefaulterGenerator(clients["generator"])
-        evaluator = Evaluator(clients["evaluator"])
-        optimizer = ScriptOptimizer(clients["optimizer"])
-        
-        # Start Log Streamer Task
-        async def stream_logs():
-            while True:
-                msg = await log_queue.get()
-                await websocket.send_json({"type": "log", "message": msg})
-                log_queue.task_done()
-        
-        log_task = asyncio.create_task(stream_logs())
-
-        await websocket.send_json({"type": "log", "message": "Starting Simulation Loop..."})
+        await asyncio.to_thread(history_manager.start_run, run_id, config.dict())
+        if resume:
+            agent.update_prompt(resume["prompt"])
+            await session.send({"type": "log", "message": f"Resuming run {run_id} at cycle {start_cycle}, scenario {resume['position'] + 1}..."})
+        else:
+            await session.send({"type": "log", "message": "Starting Simulation Loop..."})
 
         # Run Loop Configuration
         batch_size = config.batch_size
         max_cycles = config.max_cycles
+        concurrency = max(1, min(config.concurrency, batch_size))
+        # Workers per pipeline stage (conversations use `concurrency`)
+        generate_concurrency = max(1, config.generate_concurrency)
+        evaluate_concurrency = max(1, config.evaluate_concurrency or concurrency)
+        optimize_concurrency = max(1, config.optimize_concurrency)
+        queue_size = config.stage_queue_size
+
+        # Scenarios finishing together are scored in one evaluator call
+        evaluation_batcher = None
+        if config.batch_evaluation and evaluate_concurrency > 1:
+            evaluation_batcher = EvaluationBatcher(evaluator, max_pending=evaluate_concurrency)
         
         target_repetition = config.thresholds.repetition
         target_negotiation = config.thresholds.negotiation
         target_empathy = config.thresholds.empathy
         target_overall = config.thresholds.overall
 
-        # Start with the initial prompt (wrapped by Agent)
-        current_prompt = agent.raw_system_prompt
+        def meets_targets(result) -> bool:
+            return (
+                result.metrics.repetition >= target_repetition and
+                result.metrics.negotiation >= target_negotiation and
+                result.metrics.empathy >= target_empathy and
+                result.overall_rating >= target_overall
+            )
+
+        async def next_persona():
+            if persona_pool:
+                return await persona_pool.next()
+            return await generator.generate_persona_async()
+
+        async def score_candidates(jobs):
+            """Prompt search scorer: plays each (prompt, persona) pair and grades the batch together."""
+            slots = asyncio.Semaphore(concurrency)
+
+            async def play(prompt, persona):
+                async with slots:
+                    candidate_agent = DebtCollectionAgent(
+                        clients["agent"], system_prompt=prompt, max_context_turns=config.context_turns
+                    )
+                    candidate_agent.reset(defaulter_name=persona.name)
+                    defaulter = DefaulterAgent(persona, clients["generator"], max_context_turns=config.context_turns)
+                    return await ConversationSimulator(
+                        candidate_agent, defaulter, logger=session.logger, termination=termination
+                    ).run_async()
+
+            transcripts = await asyncio.gather(*(play(prompt, persona) for prompt, persona in jobs))
+            results = await evaluator.evaluate_many(list(transcripts))
+            return [(r.overall_rating, meets_targets(r)) for r in results]
+
+        prompt_search = None
+        if config.search_candidates > 0:
+            prompt_search = PromptSearch(optimizer, score_candidates, num_candidates=config.search_candidates)
+
+        # Early stopping pools the cycle's scores, so they must all come from one prompt:
+        # outside search mode the failures are rewritten together once the cycle ends
+        deferred_rewrites = config.early_stopping and prompt_search is None
+        # Bumped on every prompt change; each scenario records the version it played, so
+        # results that overlapped a rewrite can be told apart from ones on the latest prompt
+        prompt_version = 0
+
+        async def save_progress(at_cycle: int, position: int, results=(), optimizations=()):
+            """Appends to the run's history and moves its checkpoint, in one write."""
+            checkpoint = {
+                "cycle": at_cycle,
+                "position": position,
+                "prompt": agent.raw_system_prompt,
+                "state": {"search_history": search_history, "early_stops": early_stops, "context_totals": context_totals,
+                          "pipeline": pipeline_stats, "prescoring": prescoring_cycles, "termination": termination_totals}
+            }
+            await asyncio.to_thread(history_manager.append_progress, run_id, list(results), list(optimizations), checkpoint)
 
-        for cycle in range(1, max_cycles + 1):
-            await websocket.send_json({"type": "log", "message": f"--- Cycle {cycle}/{max_cycles} ---"})
+        for cycle in range(start_cycle, max_cycles + 1):
+            await session.send({"type": "log", "message": f"--- Cycle {cycle}/{max_cycles} ---"})
+            cycle_failures = []
             
             batch_results = []
             batch_passes = 0
-            
-            for b in range(1, batch_size + 1):
-                await websocket.send_json({"type": "log", "message": f"Simulating {b}/{batch_size}..."})
-                
-                # 1. Generate Persona (Sync task running in thread)
-                persona = await asyncio.to_thread(generator.generate_persona)
-                defaulter = DefaulterAgent(persona, clients["generator"])
-                
-                # Reset agent with key details
-                agent.reset(defaulter_name=persona.name)
-                current_prompt = agent.raw_system_prompt
-                
-                # 2. Run Simulation (Sync task running in thread)
-                sim = ConversationSimulator(agent, defaulter)
-                logs = await asyncio.to_thread(sim.run)
-                
-                # 3. Evaluate (Async task - direct await)
-                result = await evaluator.evaluate(logs)
-                
-                # GRANULAR PASS CHECK
-                passed = (
-                    result.metrics.repetition >= target_repetition and
-                    result.metrics.negotiation >= target_negotiation and
-                    result.metrics.empathy >= target_empathy and
-                    result.overall_rating >= target_overall
+            completed = 0
+            settled = None
+
+            # Resuming mid-cycle: the cycle's finished scenarios are already stored
+            restored = []
+            if resume and cycle == start_cycle and resume["position"]:
+                restored = await asyncio.to_thread(
+                    history_manager.list_scenarios, run_id, batch_size, 0, None, cycle,
+                    prompt_search is not None or deferred_rewrites
+                )
+
+            # Early stopping: the cycle's success test is "every metric mean meets its target"
+            stopper = None
+            if config.early_stopping:
+                stopper = MeanTargetsTest(
+                    {"repetition": target_repetition, "negotiation": target_negotiation,
+                     "empathy": target_empathy, "overall": target_overall},
+                    confidence=config.early_stop_confidence
                 )
 
-                if passed:
+            for stored in restored:
+                result = EvaluationResult(
+                    metrics=EvaluationMetrics(**stored["metrics"]), overall_score=stored["score"], feedback=stored["feedback"]
+                )
+                batch_results.append(result)
+                completed += 1
+                if stored["passed"]:
                     batch_passes += 1
-                
+                elif prompt_search or deferred_rewrites:
+                    cycle_failures.append({"persona": Persona(**stored["persona"]), "result": result, "logs": stored["transcript"]})
+                if stopper:
+                    stopper.add({**result.metrics.dict(), "overall": result.overall_rating})
+            if stopper and restored:
+                settled = stopper.decision()
+
+            # Streaming pipeline: personas are generated, conversations played,
+            # transcripts graded and failures optimized in separate stages with
+            # bounded queues between them, so a slow evaluator call doesn't stop
+            # the next conversation from starting. Bookkeeping (pass counts, the
+            # stored results) is serialized under a lock.
+            results_lock = asyncio.Lock()
+
+            async def generate(b: int):
+                if settled:
+                    return None # Outcome already decided: don't prepare another scenario
+                return b, await next_persona()
+
+            async def simulate(item):
+                b, persona = item
+                if settled:
+                    return None
+                await session.send({"type": "log", "message": f"Simulating {b}/{batch_size}..."})
+                defaulter = DefaulterAgent(persona, clients["generator"], max_context_turns=config.context_turns)
+
+                # Each scenario gets its own Agent (history is per-conversation),
+                # seeded with the latest prompt held by the template agent.
+                scenario_agent = DebtCollectionAgent(
+                    clients["agent"], system_prompt=agent.raw_system_prompt, max_context_turns=config.context_turns
+                )
+                scenario_agent.reset(defaulter_name=persona.name)
+                prompt_used = scenario_agent.raw_system_prompt
+                version_used = prompt_version
+
+                # Native async, no worker thread per conversation
+                async def forward_turn(event):
+                    await session.send({
+                        "type": "turn_delta",
+                        "cycle": cycle,
+                        "scenario": b,
+                        "persona": persona.name,
+                        **event
+                    })
+
+                sim = ConversationSimulator(
+                    scenario_agent,
+                    defaulter,
+                    on_event=forward_turn if config.stream_turns else None,
+                    logger=session.logger,
+                    termination=termination
+                )
+                logs = await sim.run_async()
+                ending = {"end_reason": sim.end_reason, "turns": sim.turns}
+                ending = {**ending, "prompt_version": version_used}
+                return b, persona, prompt_used, logs, summarize_context(scenario_agent, defaulter), ending
+
+            async def evaluate(item):
+                logs = item[3]
+                if evaluation_batcher:
+                    result = await evaluation_batcher.evaluate(logs)
+                else:
+                    result = await evaluator.evaluate(logs)
+                return (*item, result)
+
+            async def optimize(item):
+                nonlocal batch_passes, completed, recorded, settled, prompt_version
+                b, persona, prompt_used, logs, context_stats, ending, result = item
+
+                async with results_lock:
+                    completed += 1
+                    for key in context_totals:
+                        context_totals[key] += context_stats[key]
+                    termination_totals["conversations"] += 1
+                    termination_totals["turns"] += ending["turns"]
+                    end_reasons = termination_totals["reasons"]
+                    end_reasons[ending["end_reason"]] = end_reasons.get(ending["end_reason"], 0) + 1
+
+                    # GRANULAR PASS CHECK
+                    passed = meets_targets(result)
+                    if passed:
+                        batch_passes += 1
+
+                    # Calculate current cumulative rate
+                    current_rate = batch_passes / completed
+
+                    if stopper and not settled:
+                        stopper.add({**result.metrics.dict(), "overall": result.overall_rating})
+                        settled = stopper.decision()
+                        if settled:
+                            pipeline.stop()
+                            await session.send({"type": "log", "message": f"Early stop: cycle outcome settled ({settled}) after {completed}/{batch_size} scenarios."})
+
                 new_prompt_str = None
-                
-                # Calculate current cumulative rate
-                current_rate = batch_passes / b
-                
-                # 4. Immediate Optimization if Failed
+                opt_entry = None
+
+                # Immediate Optimization if Failed
                 if not passed:
                     # Construct detailed failure reason
                     reasons = []
@@ -186,51 +381,67 @@ async def websocket_endpoint(websocket: WebSocket):
                         reasons.append(f"Empathy {result.metrics.empathy}<{target_empathy}")
                     if result.overall_rating < target_overall:
                         reasons.append(f"Overall {result.overall_rating}<{target_overall}")
-                    
+
                     failure_msg = ", ".join(reasons)
-                    await websocket.send_json({"type": "log", "message": f"Scenario Failed: {failure_msg}. Rate: {current_rate:.1%}. Optimizing..."})
-                    
+
                     # We optimize based on this single failure for immediate feedback
                     single_failure = [{
                         "persona": persona,
                         "result": result,
                         "logs": logs
                     }]
-                    
+
+                if not passed and prompt_search:
+                    # Search mode: failures feed one candidate search at the end of the cycle
+                    cycle_failures.extend(single_failure)
+                    await session.send({"type": "log", "message": f"Scenario Failed: {failure_msg}. Rate: {current_rate:.1%}. Queued for prompt search."})
+
+                elif not passed and deferred_rewrites:
+                    cycle_failures.extend(single_failure)
+                    await session.send({"type": "log", "message": f"Scenario Failed: {failure_msg}. Rate: {current_rate:.1%}. Queued for the end-of-cycle rewrite."})
+
+                elif not passed:
+                    await session.send({"type": "log", "message": f"Scenario Failed: {failure_msg}. Rate: {current_rate:.1%}. Optimizing..."})
+
+                    # Rewrite the latest prompt, not the one this scenario started
+                    # with, so concurrent failures don't clobber each other's fixes.
+                    current_prompt = agent.raw_system_prompt
+
                     try:
                         # CRITICAL FIX: optimize_screenplay is async, do NOT use to_thread
                         # Pass specific targets to optimizer
                         new_prompt = await optimizer.optimize_screenplay(
-                            current_prompt, 
-                            single_failure, 
-                            previous_success_rate=current_rate, 
+                            current_prompt,
+                            single_failure,
+                            previous_success_rate=current_rate,
                             target_thresholds=config.thresholds
                         )
-                        
+
                         agent.update_prompt(new_prompt)
                         new_prompt_str = new_prompt
-                        
+                        played = ending["prompt_version"]
+                        stale = f" It played prompt v{played}, {prompt_version - played} rewrites back." if played < prompt_version else ""
+                        prompt_version += 1
+
                         opt_entry = {
                             "cycle": cycle,
                             "old_prompt": current_prompt,
                             "new_prompt": new_prompt,
-                            "reasoning": f"Optimized after scenario {b} failure ({failure_msg})."
+                            "reasoning": f"Optimized after scenario {b} failure ({failure_msg}).{stale}"
                         }
-                        optimization_storage.append(opt_entry)
-                        
-                        await websocket.send_json({
+                        await session.send({
                             "type": "optimization",
                             **opt_entry
                         })
-                        await websocket.send_json({"type": "log", "message": "Prompt Updated."})
-                        
+                        await session.send({"type": "log", "message": "Prompt Updated."})
+
                     except Exception as opt_err:
                         # Print full traceback to console for debugging
                         traceback.print_exc()
-                        await websocket.send_json({"type": "log", "message": f"[red]Optimization Error: {opt_err}[/red]"})
-                
+                        await session.send({"type": "log", "message": f"[red]Optimization Error: {opt_err}[/red]"})
+
                 else:
-                     await websocket.send_json({"type": "log", "message": f"Scenario Passed. Rate {current_rate:.1%}."})
+                    await session.send({"type": "log", "message": f"Scenario Passed. Rate {current_rate:.1%}."})
 
                 # Add to storage
                 result_dict = {
@@ -241,40 +452,70 @@ async def websocket_endpoint(websocket: WebSocket):
                     "transcript": logs,
                     "feedback": result.feedback,
                     "passed": passed,
-                    "prompt_used": current_prompt,
-                    "updated_prompt": new_prompt_str
+                    "prompt_used": prompt_used,
+                    "updated_prompt": new_prompt_str,
+                    "context_tokens": context_stats,
+                    **ending
                 }
-                all_results_storage.append(result_dict)
+                async with results_lock:
+                    recorded += 1
+                    await save_progress(cycle, recorded, [result_dict], [opt_entry] if new_prompt_str else [])
 
-                # Send Frontend Event
-                transcript_text = "\n".join([f"{l['role']}: {l['content']}" for l in logs])
-                
-                await websocket.send_json({
-                    "type": "result",
-                    "cycle": cycle,
-                    "persona": persona.name,
-                    "score": result.overall_rating,
-                    "metrics": result.metrics.dict(),
-                    "transcript": transcript_text,
-                    "feedback": result.feedback,
-                    "passed": passed,
-                    "prompt_used": current_prompt,
-                    "updated_prompt": new_prompt_str
-                })
+                    # Send Frontend Event
+                    transcript_text = "\n".join([f"{l['role']}: {l['content']}" for l in logs])
 
-                batch_results.append(result)
+                    await session.send({
+                        "type": "result",
+                        "cycle": cycle,
+                        "scenario": b,
+                        "persona": persona.name,
+                        "score": result.overall_rating,
+                        "metrics": result.metrics.dict(),
+                        "transcript": transcript_text,
+                        "feedback": result.feedback,
+                        "passed": passed,
+                        "prompt_used": prompt_used,
+                        "updated_prompt": new_prompt_str,
+                        **ending
+                    })
+
+                    batch_results.append(result)
                 await asyncio.sleep(0.1)
 
-            final_success_rate = batch_passes / batch_size
+            async def report_stages(stages):
+                await session.send({"type": "pipeline", "cycle": cycle, "stages": stages})
+
+            pipeline = Pipeline([
+                Stage("generate", generate, generate_concurrency, queue_size),
+                Stage("simulate", simulate, concurrency, queue_size),
+                Stage("evaluate", evaluate, evaluate_concurrency, queue_size),
+                Stage("optimize", optimize, optimize_concurrency, queue_size),
+            ], on_stats=report_stages)
+            recorded = completed
+            prescored_before = dict(evaluator.prescore_stats)
+            await pipeline.run(range(completed + 1, batch_size + 1))
+            pipeline_stats.append({"cycle": cycle, "stages": pipeline.snapshot()})
+
+            if evaluator.prescorer:
+                prescored = {k: evaluator.prescore_stats[k] - prescored_before[k] for k in prescored_before}
+                prescoring_cycles.append({"cycle": cycle, **prescored})
+                await session.send({"type": "log", "message": f"Cycle {cycle}: {prescored['local_passes'] + prescored['local_fails']} scenarios scored locally ({prescored['local_passes']} pass, {prescored['local_fails']} fail), {prescored['llm_calls_saved']} evaluator calls saved."})
+
+            final_success_rate = batch_passes / max(completed, 1)
+
+            if stopper:
+                saved = batch_size - completed
+                early_stops.append({"cycle": cycle, "decision": settled, "scenarios_run": completed, "scenarios_saved": saved})
+                await session.send({"type": "log", "message": f"Cycle {cycle}: {saved} scenarios saved by early stopping."})
             
             # Calculate Batch Averages
             if batch_results:
-                avg_rep = sum(r.metrics.repetition for r in batch_results) / batch_size
-                avg_neg = sum(r.metrics.negotiation for r in batch_results) / batch_size
-                avg_emp = sum(r.metrics.empathy for r in batch_results) / batch_size
-                avg_overall = sum(r.overall_rating for r in batch_results) / batch_size
+                avg_rep = sum(r.metrics.repetition for r in batch_results) / len(batch_results)
+                avg_neg = sum(r.metrics.negotiation for r in batch_results) / len(batch_results)
+                avg_emp = sum(r.metrics.empathy for r in batch_results) / len(batch_results)
+                avg_overall = sum(r.overall_rating for r in batch_results) / len(batch_results)
                 
-                await websocket.send_json({"type": "log", "message": f"Cycle {cycle} Stats: Rep={avg_rep:.1f}, Neg={avg_neg:.1f}, Emp={avg_emp:.1f}, Overall={avg_overall:.1f}"})
+                await session.send({"type": "log", "message": f"Cycle {cycle} Stats: Rep={avg_rep:.1f}, Neg={avg_neg:.1f}, Emp={avg_emp:.1f}, Overall={avg_overall:.1f}"})
 
                 # STRICT SUCCESS CONDITION
                 if (avg_rep >= target_repetition and
@@ -282,54 +523,284 @@ async def websocket_endpoint(websocket: WebSocket):
                     avg_emp >= target_empathy and
                     avg_overall >= target_overall):
                     
-                    await websocket.send_json({"type": "log", "message": f"[bold green]SUCCESS! All targets met in Cycle {cycle}. Stopping Optimization.[/bold green]"})
-                    # success_rate = final_success_rate # For history
+                    await session.send({"type": "log", "message": f"[bold green]SUCCESS! All targets met in Cycle {cycle}. Stopping Optimization.[/bold green]"})
                     break
             else:
-                await websocket.send_json({"type": "log", "message": "Cycle complete (no results to average)."})
+                await session.send({"type": "log", "message": "Cycle complete (no results to average)."})
 
-        await websocket.send_json({"type": "log", "message": "Optimization Complete."})
-        log_task.cancel()
-        
-    except WebSocketDisconnect:
-        print("Client disconnected")
+            # Search mode: K rewrites race the current prompt on a shared persona set
+            cycle_entry = None
+            if prompt_search and cycle_failures and cycle < max_cycles:
+                await session.send({"type": "log", "message": f"Prompt search: {config.search_candidates} candidates from {len(cycle_failures)} failures..."})
+                current_prompt = agent.raw_system_prompt
+                try:
+                    search_personas = [await next_persona() for _ in range(max(1, config.search_personas))]
+                    outcome = await prompt_search.run(
+                        current_prompt,
+                        cycle_failures,
+                        search_personas,
+                        previous_success_rate=final_success_rate,
+                        target_thresholds=config.thresholds
+                    )
+                except Exception as search_err:
+                    traceback.print_exc()
+                    await session.send({"type": "log", "message": f"[red]Prompt Search Error: {search_err}[/red]"})
+                    outcome = None
+
+                if outcome:
+                    summary = {k: v for k, v in outcome.items() if k != "prompt"}
+                    search_history.append({"cycle": cycle, **summary})
+                    await session.send({"type": "leaderboard", "cycle": cycle, **{k: v for k, v in summary.items() if k != "leaderboard"}, "entries": outcome["leaderboard"]})
+
+                    if outcome["adopted"]:
+                        agent.update_prompt(outcome["prompt"])
+                        prompt_version += 1
+                        board = {e["label"]: e for e in outcome["leaderboard"]}
+                        opt_entry = {
+                            "cycle": cycle,
+                            "old_prompt": current_prompt,
+                            "new_prompt": outcome["prompt"],
+                            "reasoning": f"Prompt search after cycle {cycle}: {outcome['winner']} ({board[outcome['winner']]['mean_score']}) beat the incumbent ({board['incumbent']['mean_score']}) over {outcome['scenarios_run']} scenarios."
+                        }
+                        cycle_entry = opt_entry
+                        await session.send({"type": "optimization", **opt_entry})
+                        await session.send({"type": "log", "message": f"Prompt search: {outcome['winner']} adopted."})
+                    else:
+                        await session.send({"type": "log", "message": "Prompt search: no candidate beat the current prompt. Keeping it."})
+
+            # Early stopping without search: one rewrite from all of the cycle's failures
+            if deferred_rewrites and cycle_failures and cycle < max_cycles:
+                await session.send({"type": "log", "message": f"Rewriting the prompt from {len(cycle_failures)} failures..."})
+                current_prompt = agent.raw_system_prompt
+                try:
+                    new_prompt = await optimizer.optimize_screenplay(
+                        current_prompt,
+                        cycle_failures,
+                        previous_success_rate=final_success_rate,
+                        target_thresholds=config.thresholds
+                    )
+                    agent.update_prompt(new_prompt)
+                    prompt_version += 1
+                    cycle_entry = {
+                        "cycle": cycle,
+                        "old_prompt": current_prompt,
+                        "new_prompt": new_prompt,
+                        "reasoning": f"Optimized after cycle {cycle} from {len(cycle_failures)} failures."
+                    }
+                    await session.send({"type": "optimization", **cycle_entry})
+                    await session.send({"type": "log", "message": "Prompt Updated."})
+                except Exception as opt_err:
+                    traceback.print_exc()
+                    await session.send({"type": "log", "message": f"[red]Optimization Error: {opt_err}[/red]"})
+
+            # Cycle done: a resume from here starts the next one
+            await save_progress(cycle + 1, 0, optimizations=[cycle_entry] if cycle_entry else [])
+
+        await session.send({"type": "log", "message": "Optimization Complete."})
+
+    except asyncio.CancelledError:
+        status = "cancelled"
+        print(f"Run {run_id} cancelled")
+        await session.send({"type": "log", "message": "[yellow]Run cancelled.[/yellow]"})
+        raise
     except Exception as e:
-        await websocket.send_json({"type": "error", "message": str(e)})
+        status = session.status = "failed"
+        await session.send({"type": "error", "message": str(e)})
         traceback.print_exc()
     finally:
-        # ALWAYS SAVE HISTORY (Even if empty, to show the attempt)
-        if config:
-            try:
-                await websocket.send_json({"type": "log", "message": f"Saving Simulation History (Run ID: {run_id})..."})
-            except Exception:
-                pass # Socket likely closed
-
-            # Recalculate success rate based on actual results stored
-            if all_results_storage:
-                passed_count = sum(1 for r in all_results_storage if r.get('passed', False))
-                final_success_rate = passed_count / len(all_results_storage)
-            else:
-                final_success_rate = 0.0
-
-            run_data = {
-                "id": run_id,
-                "timestamp": datetime.now().isoformat(),
-                "config": config.dict(),
-                "results": all_results_storage,
-                "optimization_history": optimization_storage,
-                "success_rate": final_success_rate,
-                "total_cycles": cycle
-            }
-            try:
-                await asyncio.to_thread(history_manager.save_run, run_data)
-                try:
-                    await websocket.send_json({"type": "log", "message": "History Saved."})
-                except Exception:
-                    pass
-            except Exception as hist_e:
-                print(f"History Save Failed: {hist_e}")
-        
-        simulation.console = original_console
+        if persona_pool:
+            persona_pool.stop()
+
+        # Results are already stored; this records the run's totals and final status
+        await session.send({"type": "log", "message": f"Saving Simulation History (Run ID: {run_id})..."})
+
+        rate_limits = summarize_rate_limits(clients)
+        cache_stats = summarize_cache(clients)
+        llm_calls = summarize_llm_calls(clients)
+        structured = summarize_structured(clients)
+        routing = summarize_routing(clients)
+        await session.send({"type": "metrics", "rate_limits": rate_limits, "cache": cache_stats, "llm": llm_calls,
+                            "structured": structured, "routing": routing})
+        await session.send({"type": "log", "message": f"Rate limit waits: {rate_limits['waits']} ({rate_limits['wait_seconds']:.1f}s), 429s: {rate_limits['rate_limit_errors']}"})
+        await session.send({"type": "log", "message": format_llm_summary(llm_calls)})
+        if structured["calls"]:
+            await session.send({"type": "log", "message": f"Structured outputs: {structured['calls']} calls, {structured['parse_failure_rate']:.1%} failed to parse, {structured['repaired']}/{structured['repairs']} repaired, {structured['fallback_rate']:.1%} fell back"})
+
+        if routing and routing["calls"]:
+            backends = ", ".join(f"{b['name']} {b['won']}/{b['routed']}" + (" (down)" if b["down"] else "") for b in routing["backends"])
+            await session.send({"type": "log", "message": f"Routing: {routing['calls']} calls, {routing['hedged']} hedged ({routing['hedge_wins']} won by the hedge), {routing['failovers']} failovers, {routing['failed']} failed everywhere; replies used/attempts: {backends}"})
+
+        if evaluator:
+            await session.send({"type": "log", "message": f"Evaluator calls: {evaluator.batch_stats['batched_calls']} batched ({evaluator.batch_stats['batched_transcripts']} transcripts), {evaluator.batch_stats['single_calls']} single, {evaluator.batch_stats['rescored']} re-scored"})
+
+        compaction = summarize_compaction(evaluator, optimizer)
+        if compaction["calls"]:
+            await session.send({"type": "log", "message": f"Prompt compaction: {compaction['tokens_before']} -> {compaction['tokens_after']} tokens over {compaction['calls']} calls ({compaction['tokens_saved']} saved)"})
+
+        if context_totals["calls"]:
+            await session.send({"type": "log", "message": f"Conversation context: {context_totals['tokens_sent']} input tokens sent instead of {context_totals['tokens_full']} ({context_totals['tokens_saved']} saved)"})
+
+        if termination_totals["conversations"]:
+            ended = ", ".join(f"{reason} {count}" for reason, count in sorted(termination_totals["reasons"].items(), key=lambda kv: -kv[1]))
+            await session.send({"type": "log", "message": f"Conversations: {termination_totals['turns'] / termination_totals['conversations']:.1f} exchanges on average; ended by {ended}"})
+
+        if persona_pool:
+            await session.send({"type": "log", "message": f"Personas: {persona_pool.stats['from_library']} from library, {persona_pool.stats['generated_single']} generated on demand, {persona_pool.stats['generated_bulk']} added by prefill"})
+
+        metrics = {
+            "rate_limits": rate_limits,
+            "cache": cache_stats,
+            "llm": llm_calls or None,
+            "structured": structured if structured["calls"] else None,
+            "routing": routing,
+            "personas": persona_pool.stats if persona_pool else None,
+            "evaluator": evaluator.batch_stats if evaluator else None,
+            "compaction": compaction,
+            "context": context_totals,
+            "termination": {
+                **termination_totals,
+                "mode": config.termination,
+                "avg_turns": round(termination_totals["turns"] / termination_totals["conversations"], 2),
+                "classifier": getattr(termination, "stats", None)
+            } if termination_totals["conversations"] else None,
+            "search": search_history or None,
+            "pipeline": pipeline_stats or None,
+            "prescoring": {**evaluator.prescore_stats, "cycles": prescoring_cycles} if evaluator and evaluator.prescorer else None,
+            "early_stopping": {
+                "scenarios_saved": sum(e["scenarios_saved"] for e in early_stops),
+                "cycles": early_stops
+            } if early_stops else None
+        }
+        try:
+            totals = await asyncio.to_thread(history_manager.finish_run, run_id, status, cycle, metrics)
+            await session.send({"type": "log", "message": f"History Saved. {totals['scenarios']} scenarios, success rate {totals['success_rate']:.1%}."})
+        except Exception as hist_e:
+            print(f"History Save Failed: {hist_e}")
+
+class ResumeRequest(BaseModel):
+    api_key: Optional[str] = None  # Defaults to the key the run was started with
+
+@app.post("/runs/{run_id}/resume")
+async def resume_run(run_id: str, request: Optional[ResumeRequest] = None):
+    """Continues an interrupted, cancelled or failed run from its last checkpoint."""
+    if run_registry.get(run_id) and run_registry.get(run_id).status not in FINISHED:
+        raise HTTPException(status_code=409, detail="Run is still in progress")
+    checkpoint = await asyncio.to_thread(history_manager.get_checkpoint, run_id)
+    if checkpoint is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if checkpoint["status"] not in RESUMABLE:
+        raise HTTPException(status_code=409, detail=f"Run is {checkpoint['status']} and cannot be resumed")
+
+    config_dict = checkpoint["config"]
+    if request and request.api_key:
+        config_dict["api_key"] = request.api_key
+    session = RunSession(run_id, SimulationConfig(**config_dict))
+    session.resume = checkpoint
+    try:
+        run_registry.submit(session, run_simulation)
+    except RunLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"run_id": run_id, "status": session.status, "cycle": checkpoint["cycle"], "position": checkpoint["position"]}
+
+@app.post("/runs")
+async def submit_run(config: SimulationConfig):
+    """Starts a run in the background; follow it on /ws/runs/{run_id}."""
+    session = RunSession(new_run_id(), config)
+    try:
+        run_registry.submit(session, run_simulation)
+    except RunLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"run_id": session.run_id, "status": session.status}
+
+@app.get("/runs")
+async def list_runs(include_finished: bool = False):
+    return {"runs": run_registry.list(include_finished), "workers": run_registry.workers}
+
+@app.get("/runs/{run_id}")
+async def get_run_status(run_id: str):
+    session = run_registry.get(run_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return session.summary()
+
+@app.post("/runs/{run_id}/cancel")
+async def cancel_run(run_id: str):
+    if run_registry.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"cancelled": run_registry.cancel(run_id)}
+
+async def stream_run(websocket: WebSocket, session: RunSession, after: int = 0):
+    """Replays buffered events after `after`, then follows the run until it ends or the client leaves."""
+    replay, events, missed = session.attach(after)
+    try:
+        if missed:
+            await websocket.send_json({"type": "log", "message": f"[yellow]{missed} earlier events are no longer buffered; see /history/{session.run_id} once the run ends.[/yellow]"})
+        for event in replay:
+            await websocket.send_json(event)
+
+        async def watch_disconnect():
+            # Nothing is expected from the client mid-run; this only notices it leaving
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+
+        disconnect_task = asyncio.create_task(watch_disconnect())
+        try:
+            while True:
+                next_event = asyncio.create_task(events.get())
+                done, _ = await asyncio.wait({next_event, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event not in done:
+                    next_event.cancel()
+                    print(f"Client detached from run {session.run_id}")
+                    return
+                event = next_event.result()
+                if event is None:
+                    break
+                await websocket.send_json(event)
+        finally:
+            disconnect_task.cancel()
+        await websocket.close()
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        print(f"Client detached from run {session.run_id}")
+    finally:
+        session.detach(events)
+
+@app.websocket("/ws/runs/{run_id}")
+async def attach_run(websocket: WebSocket, run_id: str, after: int = 0):
+    await websocket.accept()
+    session = run_registry.get(run_id)
+    if session is None:
+        await websocket.send_json({"type": "error", "message": f"Run {run_id} not found"})
+        await websocket.close(code=4404)
+        return
+    await stream_run(websocket, session, after)
+
+@app.websocket("/ws/simulate")
+async def websocket_endpoint(websocket: WebSocket):
+    # Submit-and-follow in one socket; the run carries on if this client goes away
+    await websocket.accept()
+
+    try:
+        data = await websocket.receive_text()
+        config = SimulationConfig(**json.loads(data))
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        await websocket.send_json({"type": "error", "message": f"Invalid config: {e}"})
+        await websocket.close()
+        return
+
+    session = RunSession(new_run_id(), config)
+    try:
+        run_registry.submit(session, run_simulation)
+    except RunLimitExceeded as e:
+        await websocket.send_json({"type": "error", "message": str(e)})
+        await websocket.close()
+        return
+
+    await websocket.send_json({"type": "run", "run_id": session.run_id, "status": session.status})
+    await stream_run(websocket, session)
 
 if __name__ == "__main__":
     import uvicorn
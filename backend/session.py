@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from llm_client import LLMClient
+from llm_router import RoutingClient
+from agent import DebtCollectionAgent
+from personalities import DefaulterGenerator
+from evaluator import Evaluator
+from local_metrics import LocalScorer
+from termination import TerminationDetector, get_termination_detector
+from optimizer import ScriptOptimizer
+from persona_library import PersonaLibrary, PersonaPool
+
+# Runs executing at once (worker slots); more are queued up to MAX_QUEUED_RUNS
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "16"))
+MAX_RUNS_PER_KEY = int(os.getenv("MAX_RUNS_PER_KEY", "2"))
+# Events kept per run for clients that attach late or reconnect
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "20000"))
+# Finished runs kept in memory so a client can still replay the end of them
+KEEP_FINISHED_RUNS = 20
+
+FINISHED = ("completed", "failed", "cancelled")
+
+
+def new_run_id() -> str:
+    # Timestamp for readability, suffix so two runs started in the same second don't collide
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{secrets.token_hex(2)}"
+
+
+class SessionLogger:
+    """Console stand-in for one run: print()/rule() become log events on that run's channel."""
+
+    def __init__(self, session: "RunSession"):
+        self.session = session
+
+    def print(self, *args, **kwargs):
+        msg = " ".join(str(arg) for arg in args)
+        self.session.send_nowait({"type": "log", "message": msg})
+
+    def rule(self, *args, **kwargs):
+        self.print("---", *args, "---")
+
+    def clear(self):
+        pass
+
+
+class RunSession:
+    """
+    Everything one simulation run owns: its config, LLM clients and components,
+    and the event channel its logs and results are published on. Nothing here is
+    shared with other runs except the process-wide caches/limiters the clients use.
+
+    Events are numbered (`seq`) and the most recent ones are buffered, so any
+    number of clients can attach, drop off and re-attach without the run noticing.
+    """
+
+    def __init__(self, run_id: str, config, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.run_id = run_id
+        self.config = config
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.status = "queued"
+        self.task: Optional[asyncio.Task] = None
+        self.resume: Optional[Dict[str, Any]] = None  # Checkpoint to continue from (HistoryManager.get_checkpoint)
+        self.logger = SessionLogger(self)
+
+        self._seq = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._closed = False
+        self._loop = asyncio.get_running_loop()
+
+        self.clients: Dict[str, LLMClient] = {}
+        self.agent: Optional[DebtCollectionAgent] = None
+        self.generator: Optional[DefaulterGenerator] = None
+        self.evaluator: Optional[Evaluator] = None
+        self.optimizer: Optional[ScriptOptimizer] = None
+        self.persona_pool: Optional[PersonaPool] = None
+        self.termination: Optional[TerminationDetector] = None
+
+    @property
+    def key_digest(self) -> str:
+        return hashlib.sha256((self.config.api_key or "").encode()).hexdigest()[:16]
+
+    def build(self, persona_library: Optional[PersonaLibrary] = None, cache=None):
+        config = self.config
+        offline = config.offline or {}
+        # Clients don't get to point the server at files; replay sessions come from LLM_REPLAY_FILE
+        for options in [offline] + [backend.offline or {} for backend in config.backends]:
+            if "file" in options or isinstance(options.get("script"), str):
+                raise ValueError("offline options can't name files; set LLM_REPLAY_FILE on the server instead")
+
+        # One client per run, handed out per role so its metrics are labelled by who made the call
+        client = LLMClient(provider=config.provider, api_key=config.api_key, model_name=config.model_name,
+                           rpm=config.rpm, tpm=config.tpm, cache=cache, offline=offline)
+        if config.backends:
+            # Other providers use the server's keys (GROQ_API_KEY, ...), so none end up in the stored config
+            client = RoutingClient([client] + [
+                LLMClient(provider=backend.provider,
+                          api_key=config.api_key if backend.provider == config.provider else None,
+                          model_name=backend.model_name, cache=cache, offline=backend.offline or {})
+                for backend in config.backends
+            ], hedging=config.hedging)
+        self.clients = {
+            "agent": client.with_role("agent"),
+            "generator": client.with_role("generator"),
+            "evaluator": client.with_role("evaluator"),
+            "optimizer": client.with_role("optimizer")
+        }
+
+        # `agent` is the template holding the current prompt; scenarios clone it.
+        self.agent = DebtCollectionAgent(self.clients["agent"], system_prompt=config.base_prompt)
+        self.generator = DefaulterGenerator(self.clients["generator"], logger=self.logger)
+        prescorer = LocalScorer(config.thresholds.dict()) if config.local_prescoring else None
+        self.evaluator = Evaluator(self.clients["evaluator"], max_batch_tokens=config.eval_batch_tokens, prescorer=prescorer)
+        self.optimizer = ScriptOptimizer(self.clients["optimizer"])
+
+        # The classifier check gets its own client so a cheaper model can be used for it
+        if config.termination == "classifier":
+            if config.termination_model:
+                self.clients["termination"] = LLMClient(provider=config.provider, api_key=config.api_key,
+                                                        model_name=config.termination_model, rpm=config.rpm,
+                                                        tpm=config.tpm, cache=cache,
+                                                        offline=offline, role="termination")
+            else:
+                self.clients["termination"] = client.with_role("termination")
+        self.termination = get_termination_detector(config.termination, self.clients.get("termination"))
+
+        # Persona library: prefill in the background while the run is going
+        if config.persona_library and persona_library is not None:
+            self.persona_pool = PersonaPool(
+                persona_library,
+                self.generator,
+                target_size=min(config.batch_size * config.max_cycles, 200)
+            )
+            self.persona_pool.start()
+
+    def send_nowait(self, event: Dict[str, Any]):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if not on_loop:
+            # Logged from a worker thread: hand it to the run's loop
+            self._loop.call_soon_threadsafe(self.send_nowait, event)
+            return
+        if self._closed:
+            return
+        self._seq += 1
+        event = {**event, "seq": self._seq}
+        self._buffer.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    async def send(self, event: Dict[str, Any]):
+        self.send_nowait(event)
+
+    async def log(self, message: str):
+        await self.send({"type": "log", "message": message})
+
+    def attach(self, after: int = 0) -> Tuple[List[Dict[str, Any]], asyncio.Queue, int]:
+        """
+        Subscribes to the run. Returns the buffered events after `after`, a queue
+        of live events (None once the run is over) and how many events in between
+        are no longer buffered.
+        """
+        replay = [e for e in self._buffer if e["seq"] > after]
+        first = replay[0]["seq"] if replay else self._seq + 1
+        missed = max(0, first - after - 1)
+        queue: asyncio.Queue = asyncio.Queue()
+        if self._closed:
+            queue.put_nowait(None)
+        else:
+            self._subscribers.add(queue)
+        return replay, queue, missed
+
+    def detach(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def close(self):
+        """Marks the end of the event stream and releases background work."""
+        if self.persona_pool:
+            self.persona_pool.stop()
+        if self._closed:
+            return
+        self._closed = True
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+        self._subscribers.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.run_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "model_name": self.config.model_name,
+            "events": self._seq,
+            "clients": len(self._subscribers),
+        }
+
+
+class RunLimitExceeded(Exception):
+    pass
+
+
+class RunRegistry:
+    """
+    Runs in this process. Submitted runs execute in the background, at most
+    `workers` at a time (the rest wait in line), independent of any client
+    being connected. Finished runs stay reachable for a while for replay.
+    """
+
+    def __init__(self, workers: int = MAX_CONCURRENT_RUNS, max_queued: int = MAX_QUEUED_RUNS,
+                 max_runs_per_key: int = MAX_RUNS_PER_KEY, keep_finished: int = KEEP_FINISHED_RUNS):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.max_runs_per_key = max_runs_per_key
+        self.keep_finished = keep_finished
+        self._runs: Dict[str, RunSession] = {}
+        self._finished: "OrderedDict[str, RunSession]" = OrderedDict()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self._lock = threading.Lock()
+
+    def _register(self, session: RunSession):
+        with self._lock:
+            limit = self.workers + self.max_queued
+            if len(self._runs) >= limit:
+                raise RunLimitExceeded(f"Server is at its limit of {limit} active runs. Try again later.")
+            same_key = sum(1 for s in self._runs.values() if s.key_digest == session.key_digest)
+            if self.max_runs_per_key and same_key >= self.max_runs_per_key:
+                raise RunLimitExceeded(f"This API key already has {same_key} runs in progress (limit {self.max_runs_per_key}).")
+            self._runs[session.run_id] = session
+
+    def _worker_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers)
+            self._slots_loop = loop
+        return self._slots
+
+    def submit(self, session: RunSession, runner: Callable[[RunSession], Awaitable[None]]) -> RunSession:
+        """Queues `runner(session)` on the worker pool. Raises RunLimitExceeded when full."""
+        self._register(session)
+        session.task = asyncio.create_task(self._execute(session, runner, self._worker_slots()))
+        return session
+
+    async def _execute(self, session: RunSession, runner, slots: asyncio.Semaphore):
+        try:
+            async with slots:
+                session.status = "running"
+                session.started_at = datetime.now().isoformat()
+                await runner(session)
+                if session.status == "running":
+                    session.status = "completed"
+        except asyncio.CancelledError:
+            session.status = "cancelled"
+        except Exception as e:
+            session.status = "failed"
+            session.send_nowait({"type": "error", "message": str(e)})
+        finally:
+            session.finished_at = datetime.now().isoformat()
+            session.send_nowait({"type": "status", "status": session.status})
+            session.close()
+            with self._lock:
+                self._runs.pop(session.run_id, None)
+                self._finished[session.run_id] = session
+                while len(self._finished) > self.keep_finished:
+                    self._finished.popitem(last=False)
+
+    def cancel(self, run_id: str) -> bool:
+        session = self.get(run_id)
+        if session is None or session.task is None or session.task.done():
+            return False
+        session.task.cancel()
+        return True
+
+    def get(self, run_id: str) -> Optional[RunSession]:
+        with self._lock:
+            return self._runs.get(run_id) or self._finished.get(run_id)
+
+    def list(self, include_finished: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            sessions = list(self._runs.values())
+            if include_finished:
+                sessions += list(self._finished.values())
+        return [s.summary() for s in sessions]
@@ -1,61 +1,139 @@
 import time
 from agent import DebtCollectionAgent
 from personalities import DefaulterAgent
+from termination import TerminationDetector
 from rich.console import Console
 
 console = Console()
 
 class ConversationSimulator:
-    def __init__(self, agent: DebtCollectionAgent, defaulter: DefaulterAgent, max_turns: int = 10):
+    def __init__(self, agent: DebtCollectionAgent, defaulter: DefaulterAgent, max_turns: int = 10, on_event=None,
+                 logger=None, termination: TerminationDetector = None):
         self.agent = agent
         self.defaulter = defaulter
         self.max_turns = max_turns
         self.logs = []
+        # Checked after every exchange; by default only a goodbye ends the call (termination.py has stricter rules)
+        self.termination = termination or TerminationDetector()
+        self.end_reason = None
+        self.turns = 0
+        # Optional `async def on_event(event: dict)`. When set, run_async() streams
+        # each turn and emits start/token/end events as they happen.
+        self.on_event = on_event
+        # Anything with print(): the server passes its per-run logger, the CLI uses rich
+        self.console = logger or console
+
+    async def _speak_async(self, role: str, speaker, message, turn: int):
+        """One turn from `speaker`, streamed through on_event when there is a listener."""
+        if not self.on_event:
+            return await speaker.respond_async(message)
+
+        await self.on_event({"event": "start", "role": role, "turn": turn})
+
+        async def on_delta(delta):
+            await self.on_event({"event": "token", "role": role, "turn": turn, "delta": delta})
+
+        content = await speaker.respond_stream_async(message, on_delta=on_delta)
+        await self.on_event({"event": "end", "role": role, "turn": turn, "content": content})
+        return content
+
+    def _finish(self, reason: str, turns: int):
+        self.end_reason = reason
+        self.turns = turns
+        self.console.print(f"[dim]Conversation ended: {reason} after {turns} exchanges.[/dim]")
+        return self.logs
 
     def run(self):
-        console.print(f"[bold green]Starting Simulation[/bold green]")
-        console.print(f"Defaulter Persona: {self.defaulter.persona.name} ({self.defaulter.persona.personality_traits})")
+        self.console.print(f"[bold green]Starting Simulation[/bold green]")
+        self.console.print(f"Defaulter Persona: {self.defaulter.persona.name} ({self.defaulter.persona.personality_traits})")
         
         if not self.agent:
-             console.print("[bold red]SYSTEM ERROR: Agent is None[/bold red]")
+             self.console.print("[bold red]SYSTEM ERROR: Agent is None[/bold red]")
              return []
 
         # Initial greeting from Agent
         try:
              agent_msg = self.agent.respond() # Start conversation
         except Exception as e:
-             console.print(f"[bold red]SYSTEM ERROR in agent.respond(): {e}[/bold red]")
+             self.console.print(f"[bold red]SYSTEM ERROR in agent.respond(): {e}[/bold red]")
              agent_msg = None
 
         if not agent_msg:
-            console.print("[bold red]Agent failed to generate greeting (Empty response).[/bold red]")
-            return self.logs
+            self.console.print("[bold red]Agent failed to generate greeting (Empty response).[/bold red]")
+            return self._finish("no_response", 0)
         
         self.logs.append({"role": "agent", "content": agent_msg})
-        console.print(f"[blue]Agent:[/blue] {agent_msg}")
+        self.console.print(f"[blue]Agent:[/blue] {agent_msg}")
 
         for i in range(self.max_turns):
             # Defaulter responds
             defaulter_msg = self.defaulter.respond(agent_msg)
             if not defaulter_msg:
-                console.print("[bold red]Defaulter failed to respond.[/bold red]")
-                break
+                self.console.print("[bold red]Defaulter failed to respond.[/bold red]")
+                return self._finish("no_response", i)
             
             self.logs.append({"role": "defaulter", "content": defaulter_msg})
-            console.print(f"[red]Defaulter ({self.defaulter.persona.name}):[/red] {defaulter_msg}")
+            self.console.print(f"[red]Defaulter ({self.defaulter.persona.name}):[/red] {defaulter_msg}")
 
             # Agent responds back
             agent_msg = self.agent.respond(defaulter_msg)
             if not agent_msg:
-                console.print("[bold red]Agent failed to respond.[/bold red]")
-                break
+                self.console.print("[bold red]Agent failed to respond.[/bold red]")
+                return self._finish("no_response", i)
             
             self.logs.append({"role": "agent", "content": agent_msg})
-            console.print(f"[blue]Agent:[/blue] {agent_msg}")
+            self.console.print(f"[blue]Agent:[/blue] {agent_msg}")
 
-            if "goodbye" in agent_msg.lower() or "bye" in  defaulter_msg.lower():
-                break
-            
+            reason = self.termination.check(self.logs)
+            if reason:
+                return self._finish(reason, i + 1)
 
-        
-        return self.logs
+        return self._finish("max_turns", self.max_turns)
+
+    async def run_async(self):
+        """Async version of run(). Lets many conversations share one event loop."""
+        self.console.print(f"[bold green]Starting Simulation[/bold green]")
+        self.console.print(f"Defaulter Persona: {self.defaulter.persona.name} ({self.defaulter.persona.personality_traits})")
+
+        if not self.agent:
+             self.console.print("[bold red]SYSTEM ERROR: Agent is None[/bold red]")
+             return []
+
+        # Initial greeting from Agent
+        try:
+             agent_msg = await self._speak_async("agent", self.agent, None, 0) # Start conversation
+        except Exception as e:
+             self.console.print(f"[bold red]SYSTEM ERROR in agent.respond_async(): {e}[/bold red]")
+             agent_msg = None
+
+        if not agent_msg:
+            self.console.print("[bold red]Agent failed to generate greeting (Empty response).[/bold red]")
+            return self._finish("no_response", 0)
+
+        self.logs.append({"role": "agent", "content": agent_msg})
+        self.console.print(f"[blue]Agent:[/blue] {agent_msg}")
+
+        for i in range(self.max_turns):
+            # Defaulter responds
+            defaulter_msg = await self._speak_async("defaulter", self.defaulter, agent_msg, i + 1)
+            if not defaulter_msg:
+                self.console.print("[bold red]Defaulter failed to respond.[/bold red]")
+                return self._finish("no_response", i)
+
+            self.logs.append({"role": "defaulter", "content": defaulter_msg})
+            self.console.print(f"[red]Defaulter ({self.defaulter.persona.name}):[/red] {defaulter_msg}")
+
+            # Agent responds back
+            agent_msg = await self._speak_async("agent", self.agent, defaulter_msg, i + 1)
+            if not agent_msg:
+                self.console.print("[bold red]Agent failed to respond.[/bold red]")
+                return self._finish("no_response", i)
+
+            self.logs.append({"role": "agent", "content": agent_msg})
+            self.console.print(f"[blue]Agent:[/blue] {agent_msg}")
+
+            reason = await self.termination.check_async(self.logs)
+            if reason:
+                return self._finish(reason, i + 1)
+
+        return self._finish("max_turns", self.max_turns)
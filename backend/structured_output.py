@@ -0,0 +1,105 @@
+import copy
+import json
+import re
+from typing import Dict, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+# Longest slice of a bad reply quoted back in a repair request
+REPAIR_TEXT_CHARS = 4000
+
+
+class StructuredOutputError(ValueError):
+    """A reply that isn't JSON, or doesn't fit the requested schema."""
+
+
+def extract_json(text: str):
+    """
+    Pulls the JSON object out of a model reply: strips Markdown fences and any
+    text around the outermost braces. Raises StructuredOutputError if nothing parses.
+    """
+    try:
+        cleaned = text.strip()
+        if "```" in cleaned:
+            cleaned = re.sub(r'```json\s*', '', cleaned, flags=re.IGNORECASE)
+            cleaned = re.sub(r'```', '', cleaned)
+
+        match = re.search(r'\{.*\}', cleaned, re.DOTALL)
+        if match:
+            cleaned = match.group(0)
+
+        return json.loads(cleaned)
+    except Exception as e:
+        raise StructuredOutputError(f"Could not extract valid JSON from response ({e})")
+
+
+def parse_model(text: Optional[str], schema: Type[BaseModel]) -> BaseModel:
+    """Validates a reply against `schema`. Raises StructuredOutputError saying what's wrong."""
+    if not text:
+        raise StructuredOutputError("Empty response")
+    data = extract_json(text)
+    try:
+        return schema.parse_obj(data)
+    except ValidationError as e:
+        # One line per problem, e.g. "metrics.empathy: Field required"
+        problems = "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+        raise StructuredOutputError(f"Schema mismatch: {problems}")
+
+
+def json_schema(schema: Type[BaseModel], strip_titles: bool = False) -> Dict:
+    """
+    The model's JSON schema with $refs inlined, since neither tool parameters
+    nor Gemini's response_schema resolve them. Field aliases are used, so the
+    schema describes the JSON the model should write (e.g. "overall_score").
+    """
+    raw = schema.schema(by_alias=True)
+    definitions = raw.pop("definitions", {})
+    definitions.update(raw.pop("$defs", {}))
+
+    def inline(node):
+        if isinstance(node, list):
+            return [inline(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return inline(copy.deepcopy(definitions[node["$ref"].split("/")[-1]]))
+        if "allOf" in node and len(node["allOf"]) == 1:
+            # pydantic wraps a described sub-model as allOf: [$ref]
+            merged = {k: v for k, v in node.items() if k != "allOf"}
+            merged.update(inline(node["allOf"][0]))
+            return inline(merged)
+        return {k: inline(v) for k, v in node.items() if not (strip_titles and k == "title")}
+
+    return inline(raw)
+
+
+def repair_messages(schema: Type[BaseModel], text: Optional[str], error: Exception) -> List[Dict]:
+    """
+    A short follow-up asking the model to fix its own reply: just the broken
+    output, the validation error and the schema, not the original prompt.
+    """
+    return [
+        {"role": "system", "content": "You fix malformed JSON. Return ONLY the corrected JSON object."},
+        {"role": "user", "content": (
+            f"This reply should be a JSON object matching the schema below, but it failed validation.\n\n"
+            f"Schema:\n{json.dumps(json_schema(schema, strip_titles=True))}\n\n"
+            f"Error:\n{error}\n\n"
+            f"Reply:\n{(text or '')[:REPAIR_TEXT_CHARS]}\n\n"
+            f"Return the corrected JSON only. Keep every value that is already valid."
+        )},
+    ]
+
+
+def new_structured_stats() -> Dict:
+    # valid: parsed first time; repaired: fixed by the repair call; fallback: gave up, caller's default used
+    return {"calls": 0, "native": 0, "valid": 0, "parse_failures": 0, "repairs": 0, "repaired": 0, "fallbacks": 0}
+
+
+def structured_rates(stats: Dict) -> Dict:
+    """Adds parse failure / repair success / fallback rates to a stats dict."""
+    calls = stats.get("calls", 0)
+    summary = dict(stats)
+    summary["parse_failure_rate"] = round(stats["parse_failures"] / calls, 3) if calls else 0.0
+    summary["repair_success_rate"] = round(stats["repaired"] / stats["repairs"], 3) if stats["repairs"] else None
+    summary["fallback_rate"] = round(stats["fallbacks"] / calls, 3) if calls else 0.0
+    return summary
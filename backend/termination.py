@@ -0,0 +1,178 @@
+import re
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from local_metrics import NEAR_DUPLICATE, OFFER_PATTERN, ngrams, similarity
+
+# Why a conversation ended, as recorded in the run log and the scenario result
+END_REASONS = ("goodbye", "agreement", "hang_up", "loop", "stall", "max_turns", "no_response")
+
+# The customer walking out: the persona's "NO PLAN" trigger and the usual ways of ending a call
+HANG_UP_PATTERN = re.compile(
+    r"\bstop wasting my time\b|\b(?:i'm|i am|i'll be)\s+hanging up\b|\bhangs? up\b|\bdon'?t (?:ever )?call (?:me )?again\b"
+    r"|\bwe'?re done here\b|\bthis (?:call|conversation) is over\b|\bi'?m done (?:talking|with this)\b|\*click\*",
+    re.IGNORECASE
+)
+# "Please don't hang up", "I won't hang up on you": right before a hang-up phrase, it isn't one
+NEGATION_BEFORE = re.compile(r"\b(?:don'?t|do not|not|never|won'?t|wouldn'?t)(?:\s+\w+)?\s*$", re.IGNORECASE)
+# The customer accepting what was offered, in words that only mean that
+AGREEMENT_PATTERN = re.compile(
+    r"\b(?:i can (?:manage|do|afford) (?:that|it)|set it up|sign me up|(?:it's|that's) a deal|that works"
+    r"|i accept (?:that|it|the (?:plan|offer))|(?:i'll|i will) (?:take|do|go with) (?:that|it)|let'?s do (?:that|it))\b",
+    re.IGNORECASE
+)
+# Anything that turns an "agreement" into a refusal or a maybe
+REFUSAL_PATTERN = re.compile(
+    r"\b(?:can'?t|cannot|won'?t|not|no way|never|but|later|maybe|first|forget it|think about it)\b", re.IGNORECASE
+)
+
+# Exchanges the agent must repeat itself over before the conversation counts as a loop
+LOOP_TURNS = 2
+# Customer turns in a row that rehash earlier ones, with no new offer, before it counts as stalled
+STALL_TURNS = 3
+
+
+def _turns(logs: List[Dict], role: str) -> List[str]:
+    return [entry["content"] for entry in logs if entry["role"] == role and entry.get("content")]
+
+
+def _hangs_up(text: str) -> bool:
+    return any(not NEGATION_BEFORE.search(text[:match.start()]) for match in HANG_UP_PATTERN.finditer(text))
+
+
+def _answered_agent_turn(logs: List[Dict]) -> str:
+    """The agent message the customer's latest reply responds to."""
+    replied = False
+    for entry in reversed(logs):
+        if entry["role"] == "defaulter" and entry.get("content"):
+            replied = True
+        elif replied and entry["role"] == "agent":
+            return entry.get("content") or ""
+    return ""
+
+
+def _repeats(turns: List[str], count: int) -> bool:
+    """Whether each of the last `count` turns is a near-duplicate of an earlier one."""
+    if len(turns) <= count:
+        return False
+    grams = [ngrams(turn) for turn in turns]
+    return all(
+        max((similarity(grams[i], earlier) for earlier in grams[:i]), default=0.0) >= NEAR_DUPLICATE
+        for i in range(len(grams) - count, len(grams))
+    )
+
+
+class TerminationDetector:
+    """
+    Decides after each exchange (customer reply + agent answer) whether the
+    conversation is over, and why. Subclass and override `check` (or
+    `check_async` for detectors that call a model) to plug in other rules.
+    """
+
+    def check(self, logs: List[Dict]) -> Optional[str]:
+        """An END_REASONS entry, or None to keep talking."""
+        agent = _turns(logs, "agent")
+        defaulter = _turns(logs, "defaulter")
+        if not agent or not defaulter:
+            return None
+        # The original rule, kept so plain goodbyes end the call as before
+        if "goodbye" in agent[-1].lower() or "bye" in defaulter[-1].lower():
+            return "goodbye"
+        return None
+
+    async def check_async(self, logs: List[Dict]) -> Optional[str]:
+        return self.check(logs)
+
+
+class RuleBasedTermination(TerminationDetector):
+    """
+    Text rules on top of the goodbye check: the customer hung up, accepted the
+    concrete $/month offer made in the turn they are answering, the agent is
+    stuck repeating itself, or the customer keeps rehashing the same lines
+    without a new offer on the table.
+    """
+
+    def check(self, logs: List[Dict]) -> Optional[str]:
+        reason = super().check(logs)
+        if reason:
+            return reason
+        agent = _turns(logs, "agent")
+        defaulter = _turns(logs, "defaulter")
+        if not agent or not defaulter:
+            return None
+        last = defaulter[-1]
+        if _hangs_up(last):
+            return "hang_up"
+        if (AGREEMENT_PATTERN.search(last) and not REFUSAL_PATTERN.search(last)
+                and OFFER_PATTERN.search(_answered_agent_turn(logs))):
+            return "agreement"
+        if _repeats(agent, LOOP_TURNS):
+            return "loop"
+        recent_offers = any(OFFER_PATTERN.search(turn) for turn in agent[-STALL_TURNS:])
+        if not recent_offers and _repeats(defaulter, STALL_TURNS):
+            return "stall"
+        return None
+
+
+class CallState(BaseModel):
+    state: str  # "continue" or one of END_REASONS
+
+
+class ClassifierTermination(RuleBasedTermination):
+    """
+    The rules, then a cheap model for what they don't catch. The model sees
+    only the last few messages and answers with one state; it is asked from
+    `min_turns` exchanges on, so short calls don't pay for it.
+    """
+
+    PROMPT = """Below are the last messages of a debt collection phone call between an AGENT and a CUSTOMER.
+Has the call effectively ended? Answer with one state:
+- "agreement": the customer accepted a specific payment plan
+- "hang_up": the customer refused to continue or ended the call
+- "loop": the agent keeps repeating the same thing
+- "stall": the conversation is going in circles with no progress
+- "continue": none of the above
+
+{messages}
+
+Return JSON: {{"state": "..."}}"""
+
+    def __init__(self, llm_client, window: int = 6, min_turns: int = 3):
+        self.llm = llm_client
+        self.window = window
+        self.min_turns = min_turns
+        self.stats = {"calls": 0, "ended": 0}
+
+    async def check_async(self, logs: List[Dict]) -> Optional[str]:
+        reason = self.check(logs)
+        if reason or len(_turns(logs, "defaulter")) < self.min_turns:
+            return reason
+        messages = "\n".join(f"{entry['role'].upper()}: {entry['content']}" for entry in logs[-self.window:])
+        self.stats["calls"] += 1
+        verdict = await self.llm.complete_chat_async(
+            [
+                {"role": "system", "content": "You are a call-state classifier. Return ONLY JSON."},
+                {"role": "user", "content": self.PROMPT.format(messages=messages)}
+            ],
+            temperature=0.0,
+            schema=CallState
+        )
+        state = verdict.state.strip().lower() if verdict else "continue"
+        if state in ("agreement", "hang_up", "loop", "stall"):
+            self.stats["ended"] += 1
+            return state
+        return None
+
+
+def get_termination_detector(mode: str = "bye", llm_client=None) -> TerminationDetector:
+    """mode: "bye" (the original substring check), "rules", or "classifier" (rules + `llm_client`)."""
+    if mode == "bye":
+        return TerminationDetector()
+    if mode == "rules":
+        return RuleBasedTermination()
+    if mode == "classifier":
+        if llm_client is None:
+            raise ValueError("The classifier termination mode needs an LLM client")
+        return ClassifierTermination(llm_client)
+    raise ValueError(f"Unknown termination mode: {mode}")
@@ -0,0 +1,11 @@
+"""
+The backend modules import each other as top-level modules (they run from
+backend/), so the tests put that directory on the path the same way the
+benchmark scripts do.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND_DIR)
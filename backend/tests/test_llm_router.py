@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+import llm_router
+from llm_client import LLMClient
+from llm_router import RoutingClient
+
+
+def fake(model: str, latency: float, error_rate: float = 0.0) -> LLMClient:
+    return LLMClient(provider="fake", model_name=model, offline={"latency": f"fixed:{latency}", "error_rate": error_rate})
+
+
+def ask(router: RoutingClient, n: int = 0):
+    return asyncio.run(router.complete_chat_async([{"role": "user", "content": f"Hello {n}"}]))
+
+
+def backend(router: RoutingClient, model: str):
+    return next(b for b in router.backends if b.name == f"fake:{model}")
+
+
+@pytest.fixture(autouse=True)
+def quick_hedges(monkeypatch):
+    # Unmeasured backends hedge after DEFAULT_HEDGE_DELAY; keep the tests fast
+    monkeypatch.setattr(llm_router, "DEFAULT_HEDGE_DELAY", 0.05)
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    router = RoutingClient([fake("slow", 1.0), fake("fast", 0.01)])
+    started = time.monotonic()
+    assert ask(router)
+    assert time.monotonic() - started < 0.5  # The slow call was not waited for
+
+    decision = router.decisions[-1]
+    assert decision["hedged"] and decision["winner"] == "fake:fast"
+    assert [(a["attempt"], a["outcome"]) for a in decision["attempts"]] == [("primary", "cancelled"), ("hedge", "won")]
+    assert backend(router, "slow").stats["cancelled"] == 1
+    assert router.routing_stats["hedge_wins"] == 1
+
+
+def test_no_hedge_when_hedging_is_off():
+    router = RoutingClient([fake("slow", 0.2), fake("fast", 0.01)], hedging=False)
+    assert ask(router)
+    decision = router.decisions[-1]
+    assert not decision["hedged"] and decision["winner"] == "fake:slow"
+
+
+def test_failing_backend_fails_over():
+    router = RoutingClient([fake("broken", 0.0, error_rate=1.0), fake("ok", 0.0)])
+    assert ask(router)
+    decision = router.decisions[-1]
+    assert [(a["attempt"], a["outcome"]) for a in decision["attempts"]] == [("primary", "failed"), ("failover", "won")]
+    assert router.routing_stats["failovers"] == 1
+
+
+def test_repeated_failures_put_a_backend_in_cooldown():
+    router = RoutingClient([fake("flaky", 0.0), fake("steady", 0.02)], hedging=False)
+    assert ask(router) and router.decisions[-1]["winner"] == "fake:flaky"
+    router.clients[0].offline.error_rate = 1.0  # The fastest backend starts failing every call
+
+    for n in range(1, llm_router.FAILURE_THRESHOLD + 1):
+        assert ask(router, n)
+        assert router.decisions[-1]["winner"] == "fake:steady"
+    flaky = backend(router, "flaky")
+    assert flaky.stats["trips"] == 1 and not flaky.healthy(time.monotonic())
+
+    # Cooling down: ranked last, so the next call goes straight to the healthy backend
+    assert ask(router, 99)
+    decision = router.decisions[-1]
+    assert decision["ranking"] == ["fake:steady", "fake:flaky"]
+    assert [a["backend"] for a in decision["attempts"]] == ["fake:steady"]
+
+
+def test_everything_failing_returns_none():
+    router = RoutingClient([fake("a", 0.0, error_rate=1.0), fake("b", 0.0, error_rate=1.0)])
+    assert ask(router) is None
+    assert router.routing_stats["failed"] == 1
+
+
+def test_unmeasured_backend_is_probed():
+    router = RoutingClient([fake("measured", 0.0), fake("idle", 0.0)], hedging=False)
+    for n in range(llm_router.PROBE_EVERY - 1):
+        assert ask(router, n)
+    assert backend(router, "idle").stats["routed"] == 0
+
+    assert ask(router, llm_router.PROBE_EVERY)
+    assert router.decisions[-1]["winner"] == "fake:idle"
+    assert router.routing_stats["probes"] == 1
+    assert backend(router, "idle").score() is not None
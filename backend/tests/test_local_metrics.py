@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from local_metrics import LocalScorer, _overlap_python, ngrams, score_transcripts
+
+TARGETS = {"repetition": 7, "negotiation": 7, "empathy": 6, "overall": 7}
+
+WORDS = ["i", "understand", "we", "can", "set", "up", "a", "plan", "of", "$50/month", "please", "call", "back",
+         "today", "your", "balance", "is", "overdue", "thank", "you"]
+
+
+def random_transcripts(rng: random.Random, count: int):
+    transcripts = []
+    for _ in range(count):
+        logs, agent_turns = [], []
+        for turn in range(rng.randint(0, 8)):
+            if agent_turns and rng.random() < 0.3:
+                text = rng.choice(agent_turns)  # Verbatim repeats exercise the full-overlap case
+            else:
+                text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12)))
+            agent_turns.append(text)
+            logs.append({"role": "agent", "content": text})
+            logs.append({"role": "defaulter", "content": "ok"})
+        transcripts.append(logs)
+    return transcripts
+
+
+def agent_turns(transcripts):
+    grams, owners = [], []
+    for index, logs in enumerate(transcripts):
+        for entry in logs:
+            if entry["role"] == "agent" and entry["content"]:
+                grams.append(ngrams(entry["content"]))
+                owners.append(index)
+    return grams, owners
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_numpy_overlap_matches_python(seed):
+    pytest.importorskip("numpy")
+    from local_metrics import _overlap_numpy
+
+    grams, owners = agent_turns(random_transcripts(random.Random(seed), 12))
+    if not grams:
+        pytest.skip("no agent turns drawn")
+    fast_overlap, fast_repeated, fast_sizes = _overlap_numpy(grams, owners)
+    slow_overlap, slow_repeated, slow_sizes = _overlap_python(grams, owners)
+
+    assert fast_overlap == pytest.approx(slow_overlap)
+    assert fast_repeated == slow_repeated
+    assert fast_sizes == slow_sizes
+
+
+def signals_for(*agent_lines):
+    logs = []
+    for line in agent_lines:
+        logs.append({"role": "agent", "content": line})
+        logs.append({"role": "defaulter", "content": "Go on."})
+    return score_transcripts([logs])[0]
+
+
+def test_decide_fails_an_agent_that_gives_up():
+    signals = signals_for("I understand. I don't have a plan for that, sorry.")
+    assert LocalScorer(TARGETS).decide(signals) == "fail"
+
+
+def test_decide_fails_a_looping_agent():
+    line = "Your balance of $500 is overdue and must be paid in full today."
+    signals = signals_for(line, line, line, line)
+    assert LocalScorer(TARGETS).decide(signals) == "fail"
+
+
+def test_decide_passes_a_clear_offer_with_empathy():
+    signals = signals_for(
+        "I understand this is a hard month for you.",
+        "I hear you. We could set up a plan of $50/month starting next week.",
+        "Thank you for being open with me, I'll send the details today.",
+    )
+    assert LocalScorer(TARGETS).decide(signals) == "pass"
+
+
+def test_decide_leaves_unclear_conversations_to_the_llm():
+    scorer = LocalScorer(TARGETS)
+    # No offer and no refusal: negotiation can't be read from the text
+    assert scorer.decide(signals_for("I understand.", "Let's talk about your balance.")) is None
+    # An offer, but the agent never acknowledges the customer
+    assert scorer.decide(signals_for("Pay $50/month.", "Starting Friday works.")) is None
+    # Nothing the agent said
+    assert scorer.decide(score_transcripts([[]])[0]) is None
+
+
+def test_giving_up_is_not_a_fail_when_negotiation_is_not_targeted():
+    signals = signals_for("I understand. I cannot help with that.")
+    assert LocalScorer({**TARGETS, "negotiation": 1}).decide(signals) != "fail"
@@ -0,0 +1,65 @@
+import pytest
+
+from termination import RuleBasedTermination, TerminationDetector, get_termination_detector
+
+OFFER = "I understand. We can set up a plan of $50/month starting Friday."
+
+
+def exchange(*turns):
+    """Alternating agent/defaulter turns, starting with the agent."""
+    roles = ["agent", "defaulter"]
+    return [{"role": roles[i % 2], "content": text} for i, text in enumerate(turns)]
+
+
+def check(*turns):
+    # The detector runs after the agent has answered the customer's latest reply
+    return RuleBasedTermination().check(exchange(*turns, "Okay, let me note that."))
+
+
+@pytest.mark.parametrize("reply", [
+    "I'll deal with it later, I have bills.",
+    "I'll pay the rent first, then maybe you.",
+    "Sounds good in theory but forget it.",
+    "I agree you have been patient, but my answer stands.",
+])
+def test_non_agreements_after_an_offer_keep_the_call_going(reply):
+    assert check(OFFER, reply) is None
+
+
+@pytest.mark.parametrize("reply", [
+    "Okay, I can do that.",
+    "Fine, sign me up.",
+    "Alright, that's a deal.",
+    "Let's do it.",
+])
+def test_acceptance_of_the_offer_just_made_is_an_agreement(reply):
+    assert check(OFFER, reply) == "agreement"
+
+
+def test_agreement_must_answer_the_offer_itself():
+    # The offer was two agent turns ago; the customer is answering something else
+    assert check(OFFER, "Why should I?", "Can you confirm your address?", "Okay, I can do that.") is None
+
+
+@pytest.mark.parametrize("reply", [
+    "Please don't hang up, I need to think.",
+    "I won't hang up on you, just give me a minute.",
+])
+def test_negated_hang_up_is_not_a_hang_up(reply):
+    assert check("Hello, this is about your overdue balance.", reply) is None
+
+
+@pytest.mark.parametrize("reply", [
+    "Then stop wasting my time!",
+    "I'm hanging up now.",
+    "Don't hang up? Watch me. I hang up on people like you.",
+])
+def test_hang_up(reply):
+    assert check("Hello, this is about your overdue balance.", reply) == "hang_up"
+
+
+def test_default_detector_only_ends_on_goodbye():
+    detector = get_termination_detector()
+    assert type(detector) is TerminationDetector
+    assert detector.check(exchange(OFFER, "Then stop wasting my time!", "Please hold on.")) is None
+    assert detector.check(exchange(OFFER, "Fine. Bye.", "Have a good day.")) == "goodbye"
@@ -0,0 +1,86 @@
+from typing import Dict, List, Optional
+
+# Cheap ~4 chars/token estimate, good enough for budgeting. Shared by the rate
+# limiter, the evaluator's batch packing and the prompt compaction below.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_text_tokens(text: Optional[str]) -> int:
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+def estimate_tokens(messages) -> int:
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Keeps the start and end of `text`, replacing the middle with a marker."""
+    if estimate_text_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens * CHARS_PER_TOKEN
+    head = text[:keep * 2 // 3]
+    tail = text[-(keep // 3):] if keep // 3 else ""
+    dropped = estimate_text_tokens(text) - estimate_text_tokens(head) - estimate_text_tokens(tail)
+    return f"{head} …[truncated ~{dropped} tokens]… {tail}"
+
+
+def compact_transcript(logs: List[Dict], max_tokens: int = 1500, max_turn_tokens: int = 300,
+                       head_turns: int = 4, tail_turns: int = 6) -> List[Dict]:
+    """
+    Shrinks a conversation log to roughly `max_tokens` in three steps, stopping as soon as it fits:
+    1. Turns a speaker already said verbatim become a short "[REPEATED ...]" marker, so
+       loops stay visible to the grader without being paid for again.
+    2. Overlong turns are truncated around a marker.
+    3. The middle of the conversation is dropped, keeping `head_turns` and `tail_turns`.
+    """
+    if estimate_tokens(logs) <= max_tokens:
+        return logs
+
+    compacted = []
+    first_seen = {}
+    for index, entry in enumerate(logs):
+        key = (entry["role"], _normalize(entry["content"]))
+        if key in first_seen and estimate_text_tokens(entry["content"]) > 8:
+            content = f"[REPEATED verbatim: same as turn {first_seen[key] + 1}]"
+        else:
+            first_seen.setdefault(key, index)
+            content = truncate_text(entry["content"], max_turn_tokens)
+        compacted.append({**entry, "content": content})
+
+    if estimate_tokens(compacted) <= max_tokens or len(compacted) <= head_turns + tail_turns:
+        return compacted
+
+    omitted = len(compacted) - head_turns - tail_turns
+    marker = {"role": "system", "content": f"[... {omitted} turns omitted ...]"}
+    return compacted[:head_turns] + [marker] + compacted[-tail_turns:]
+
+
+def record_compaction(stats: Dict[str, int], before: int, after: int):
+    """Adds one call's before/after token counts to a component's running totals."""
+    stats["calls"] += 1
+    stats["tokens_before"] += before
+    stats["tokens_after"] += after
+    if after < before:
+        stats["compacted_calls"] += 1
+
+
+def new_compaction_stats() -> Dict[str, int]:
+    return {"calls": 0, "compacted_calls": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def summarize_compaction(*components) -> Dict[str, int]:
+    """Totals the compaction stats of several components (e.g. evaluator + optimizer)."""
+    total = new_compaction_stats()
+    for component in components:
+        stats = getattr(component, "compaction_stats", None)
+        if stats:
+            for key in total:
+                total[key] += stats.get(key, 0)
+    total["tokens_saved"] = total["tokens_before"] - total["tokens_after"]
+    return total
@@ -5,8 +5,22 @@ import { type ScenarioResult } from './ScenarioCard';
 import CycleGroup from './CycleGroup';
 import DiffViewer from './DiffViewer';
 import HistoryView from './HistoryView';
+import Leaderboard, { type LeaderboardData } from './Leaderboard';
+import PipelineStats, { type PipelineData } from './PipelineStats';
 import { IconLayers, IconClock, IconActivity, IconGraph, IconCheck } from './Icons';
 
+interface LiveTurn {
+    role: string;
+    content: string;
+}
+
+interface LiveConversation {
+    cycle: number;
+    scenario: number;
+    persona: string;
+    turns: LiveTurn[];
+}
+
 interface OptimizationEntry {
     cycle: number;
     old_prompt: string;
@@ -51,6 +65,9 @@ export default function Dashboard() {
 </user_instructions>`,
         max_cycles: 5,
         batch_size: 5,
+        concurrency: 1,
+        evaluate_concurrency: 1,
+        search_candidates: 0,
         thresholds: {
             repetition: 8,
             negotiation: 8,
@@ -62,6 +79,9 @@ export default function Dashboard() {
     const [logs, setLogs] = useState<string[]>([]);
     const [results, setResults] = useState<ScenarioResult[]>([]);
     const [optimizationHistory, setOptimizationHistory] = useState<OptimizationEntry[]>([]);
+    const [leaderboard, setLeaderboard] = useState<LeaderboardData | null>(null);
+    const [pipeline, setPipeline] = useState<PipelineData | null>(null);
+    const [liveConversations, setLiveConversations] = useState<Record<string, LiveConversation>>({});
     const [isRunning, setIsRunning] = useState(false);
     const wsRef = useRef<WebSocket | null>(null);
 
@@ -71,18 +91,22 @@ export default function Dashboard() {
         : 0;
     const cycleAvg = results.length > 0 ? results[results.length - 1].cycle : 0;
 
+    // The run lives on the server; the socket only follows it and can be re-opened
+    const runIdRef = useRef<string | null>(null);
+    const lastSeqRef = useRef(0);
+    const finishedRef = useRef(true);
+
     const stopSimulation = () => {
-        if (wsRef.current) {
-            wsRef.current.close();
+        if (runIdRef.current) {
+            fetch(`http://localhost:8000/runs/${runIdRef.current}/cancel`, { method: 'POST' });
             setLogs(prev => [...prev, "Simulation Stopped by User."]);
-            setIsRunning(false);
-            wsRef.current = null;
         }
     };
 
     const startSimulation = () => {
         // Close existing if any
         if (wsRef.current) {
+            finishedRef.current = true;
             wsRef.current.close();
         }
 
@@ -90,24 +114,88 @@ export default function Dashboard() {
         setLogs([]);
         setResults([]);
         setOptimizationHistory([]);
+        setLeaderboard(null);
+        setPipeline(null);
+        setLiveConversations({});
 
-        const ws = new WebSocket('ws://localhost:8000/ws/simulate');
-        wsRef.current = ws;
+        fetch('http://localhost:8000/runs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(config)
+        })
+            .then(async res => {
+                const data = await res.json();
+                if (!res.ok) throw new Error(data.detail ?? res.statusText);
+                runIdRef.current = data.run_id;
+                lastSeqRef.current = 0;
+                finishedRef.current = false;
+                attachToRun(data.run_id);
+            })
+            .catch(err => {
+                setLogs(prev => [...prev, `ERROR: ${err.message}`]);
+                setIsRunning(false);
+            });
+    };
 
-        ws.onopen = () => {
-            ws.send(JSON.stringify(config));
-        };
+    const resumeRun = (runId: string) => {
+        fetch(`http://localhost:8000/runs/${runId}/resume`, { method: 'POST' })
+            .then(async res => {
+                const data = await res.json();
+                if (!res.ok) throw new Error(data.detail ?? res.statusText);
+                setViewMode('dashboard');
+                setIsRunning(true);
+                setLogs([]);
+                setResults([]);
+                setOptimizationHistory([]);
+                setLeaderboard(null);
+                setPipeline(null);
+                setLiveConversations({});
+                runIdRef.current = runId;
+                lastSeqRef.current = 0;
+                finishedRef.current = false;
+                attachToRun(runId);
+            })
+            .catch(err => alert(`Could not resume run: ${err.message}`));
+    };
+
+    const attachToRun = (runId: string) => {
+        const ws = new WebSocket(`ws://localhost:8000/ws/runs/${runId}?after=${lastSeqRef.current}`);
+        wsRef.current = ws;
 
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
+            if (typeof data.seq === 'number') {
+                lastSeqRef.current = data.seq;
+            }
 
             if (data.type === 'log') {
                 setLogs(prev => [...prev, data.message]);
-                if (data.message.includes("Optimization Complete")) {
-                    setIsRunning(false);
-                    wsRef.current = null;
-                }
+            } else if (data.type === 'status') {
+                finishedRef.current = true;
+                setIsRunning(false);
+            } else if (data.type === 'turn_delta') {
+                const key = `${data.cycle}-${data.scenario}`;
+                setLiveConversations(prev => {
+                    const convo = prev[key] ?? { cycle: data.cycle, scenario: data.scenario, persona: data.persona, turns: [] };
+                    const turns = [...convo.turns];
+                    if (data.event === 'start') {
+                        turns.push({ role: data.role, content: '' });
+                    } else if (turns.length > 0) {
+                        const last = turns[turns.length - 1];
+                        turns[turns.length - 1] = {
+                            ...last,
+                            content: data.event === 'end' ? (data.content ?? last.content) : last.content + data.delta
+                        };
+                    }
+                    return { ...prev, [key]: { ...convo, turns } };
+                });
             } else if (data.type === 'result') {
+                const key = `${data.cycle}-${data.scenario}`;
+                setLiveConversations(prev => {
+                    const rest = { ...prev };
+                    delete rest[key];
+                    return rest;
+                });
                 setResults(prev => [...prev, {
                     cycle: data.cycle,
                     persona: data.persona,
@@ -125,22 +213,43 @@ export default function Dashboard() {
                     new_prompt: data.new_prompt,
                     reasoning: data.reasoning
                 }]);
+            } else if (data.type === 'leaderboard') {
+                setLeaderboard({
+                    cycle: data.cycle,
+                    adopted: data.adopted,
+                    winner: data.winner,
+                    scenarios_run: data.scenarios_run,
+                    entries: data.entries
+                });
+            } else if (data.type === 'pipeline') {
+                setPipeline({ cycle: data.cycle, stages: data.stages });
             } else if (data.type === 'error') {
                 setLogs(prev => [...prev, `ERROR: ${data.message}`]);
-                setIsRunning(false);
-                ws.close();
-                wsRef.current = null;
+                if (data.seq === undefined) {
+                    // Not from the run itself (e.g. it no longer exists): nothing to follow
+                    finishedRef.current = true;
+                    setIsRunning(false);
+                }
             }
         };
 
         ws.onclose = () => {
-            setIsRunning(false);
-            wsRef.current = null;
+            if (wsRef.current === ws) {
+                wsRef.current = null;
+            }
+            if (!finishedRef.current && runIdRef.current === runId) {
+                setLogs(prev => [...prev, "Connection lost. Reconnecting..."]);
+                setTimeout(() => {
+                    if (!finishedRef.current && runIdRef.current === runId) {
+                        attachToRun(runId);
+                    }
+                }, 2000);
+            }
         };
     };
 
     if (viewMode === 'history') {
-        return <HistoryView onBack={() => setViewMode('dashboard')} />;
+        return <HistoryView onBack={() => setViewMode('dashboard')} onResume={resumeRun} />;
     }
 
     return (
@@ -267,6 +376,25 @@ export default function Dashboard() {
                                 </div>
                             )}
 
+                            {Object.entries(liveConversations).map(([key, convo]) => (
+                                <div key={key} className="neu-card p-5 mb-4">
+                                    <div className="flex items-center gap-2 mb-3">
+                                        <div className="w-1.5 h-1.5 rounded-full bg-[#333333] animate-pulse"></div>
+                                        <span className="text-[10px] font-bold uppercase tracking-widest text-[#AAAAAA]">
+                                            Cycle {convo.cycle} · Scenario {convo.scenario} · {convo.persona}
+                                        </span>
+                                    </div>
+                                    <div className="space-y-1 font-mono text-xs">
+                                        {convo.turns.map((turn, i) => (
+                                            <div key={i} className="whitespace-pre-wrap leading-relaxed">
+                                                <span className="font-bold text-[#111111] uppercase tracking-wide text-[10px] mr-2">{turn.role}</span>
+                                                <span className="text-[#444444]">{turn.content}</span>
+                                            </div>
+                                        ))}
+                                    </div>
+                                </div>
+                            ))}
+
                             {Array.from(new Set(results.map(r => r.cycle))).map((cycle) => {
                                 const cycleResults = results.filter(r => r.cycle === cycle);
                                 const isLast = cycle === results[results.length - 1]?.cycle;
@@ -290,6 +418,18 @@ export default function Dashboard() {
                             {optimizationHistory.length > 0 && <DiffViewer history={optimizationHistory} />}
                         </div>
 
+                        {leaderboard && (
+                            <div className="min-h-0 h-[220px] shrink-0">
+                                <Leaderboard data={leaderboard} />
+                            </div>
+                        )}
+
+                        {pipeline && (
+                            <div className="min-h-0 h-[170px] shrink-0">
+                                <PipelineStats data={pipeline} />
+                            </div>
+                        )}
+
                         {/* 2. Logs */}
                         <div className={`min-h-0 flex flex-col transition-all duration-500 flex-1`}>
                             <LogTerminal logs={logs} />
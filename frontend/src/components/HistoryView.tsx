@@ -2,6 +2,18 @@ import { useEffect, useState } from 'react';
 import { IconArrowLeft, IconTrash, IconCalendar, IconCopy, IconCheck } from './Icons';
 import CycleGroup from './CycleGroup';
 
+interface HistorySummary {
+    id: string;
+    timestamp: string;
+    config_digest: any;
+    success_rate: number;
+    total_cycles: number;
+    scenario_count: number;
+    passed_count: number;
+    avg_score: number | null;
+    status: string;
+}
+
 interface HistoryItem {
     id: string;
     timestamp: string;
@@ -12,17 +24,39 @@ interface HistoryItem {
     optimization_history?: any[];
 }
 
-export default function HistoryView({ onBack }: { onBack: () => void }) {
-    const [history, setHistory] = useState<HistoryItem[]>([]);
+const PASS_RATE = 0.8;
+// Runs that stopped before finishing and can pick up from their last checkpoint
+const RESUMABLE = ['interrupted', 'cancelled', 'failed'];
+
+export default function HistoryView({ onBack, onResume }: { onBack: () => void; onResume?: (id: string) => void }) {
+    const [history, setHistory] = useState<HistorySummary[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
     const [selectedRun, setSelectedRun] = useState<HistoryItem | null>(null);
 
-    useEffect(() => {
-        fetch('http://localhost:8000/history')
+    const loadPage = (cursor: string | null) => {
+        const url = cursor
+            ? `http://localhost:8000/history?cursor=${encodeURIComponent(cursor)}`
+            : 'http://localhost:8000/history';
+        fetch(url)
             .then(res => res.json())
-            .then(data => setHistory(data))
+            .then(data => {
+                setHistory(prev => cursor ? [...prev, ...data.runs] : data.runs);
+                setNextCursor(data.next_cursor);
+            })
             .catch(err => console.error(err));
+    };
+
+    useEffect(() => {
+        loadPage(null);
     }, []);
 
+    const openRun = (id: string) => {
+        fetch(`http://localhost:8000/history/${id}`)
+            .then(res => res.json())
+            .then(data => setSelectedRun(data))
+            .catch(err => console.error(err));
+    };
+
     const deleteRun = (e: React.MouseEvent, id: string) => {
         e.stopPropagation();
         fetch(`http://localhost:8000/history/${id}`, { method: 'DELETE' })
@@ -142,44 +176,55 @@ export default function HistoryView({ onBack }: { onBack: () => void }) {
                 {history.map(run => (
                     <div
                         key={run.id}
-                        onClick={() => setSelectedRun(run)}
+                        onClick={() => openRun(run.id)}
                         className="neu-card p-6 cursor-pointer group relative overflow-hidden transition-all hover:scale-[1.01] h-[320px] w-full min-w-[300px] flex flex-col"
                     >
                         <div className="flex justify-between items-start mb-6 shrink-0">
                             <div className="flex items-center gap-2 text-[#AAAAAA] text-xs font-bold uppercase tracking-wider">
                                 {/* Status Dot moved to Header */}
-                                <div className={`w-2.5 h-2.5 rounded-full ${run.success_rate >= (run.config.threshold || 0.8) ? 'bg-green-500 shadow-[0_0_8px_rgba(34,197,94,0.4)]' : 'bg-red-500 shadow-[0_0_8px_rgba(239,68,68,0.4)]'}`} />
+                                <div className={`w-2.5 h-2.5 rounded-full ${run.success_rate >= PASS_RATE ? 'bg-green-500 shadow-[0_0_8px_rgba(34,197,94,0.4)]' : 'bg-red-500 shadow-[0_0_8px_rgba(239,68,68,0.4)]'}`} />
                                 <IconCalendar size={14} />
                                 {new Date(run.timestamp).toLocaleDateString()}
                             </div>
-                            <button
-                                onClick={(e) => deleteRun(e, run.id)}
-                                className="text-[#AAAAAA] hover:text-[#333333] transition-colors p-1"
-                            >
-                                <IconTrash size={16} />
-                            </button>
+                            <div className="flex items-center gap-2">
+                                {onResume && RESUMABLE.includes(run.status) && (
+                                    <button
+                                        onClick={(e) => { e.stopPropagation(); onResume(run.id); }}
+                                        title={`Run ${run.status}: continue from its last checkpoint`}
+                                        className="px-2 py-1 rounded-lg text-[10px] font-bold uppercase tracking-wide bg-[#F7F7F7] hover:bg-[#E0E0E0] text-[#555555] transition-colors"
+                                    >
+                                        Resume
+                                    </button>
+                                )}
+                                <button
+                                    onClick={(e) => deleteRun(e, run.id)}
+                                    className="text-[#AAAAAA] hover:text-[#333333] transition-colors p-1"
+                                >
+                                    <IconTrash size={16} />
+                                </button>
+                            </div>
                         </div>
 
                         <div className="mb-6 flex-1 overflow-hidden relative">
                             <div className="text-sm font-bold text-[#333333] mb-2 truncate">
-                                {run.config.model_name}
+                                {run.config_digest.model_name}
                             </div>
                             <div className="text-xs text-[#555555] leading-relaxed line-clamp-[8] font-mono">
-                                {run.config.base_prompt}
+                                {run.config_digest.prompt_preview}
                             </div>
                         </div>
 
                         <div className="flex items-center justify-between pt-4 border-t border-[#E0E0E0] shrink-0">
                             <div>
                                 <div className="text-[9px] uppercase font-bold text-[#AAAAAA] mb-0.5">Success</div>
-                                <div className={`text-xl font-bold ${run.success_rate >= (run.config.threshold || 0.8) ? 'text-[#333333]' : 'text-[#777777]'}`}>
+                                <div className={`text-xl font-bold ${run.success_rate >= PASS_RATE ? 'text-[#333333]' : 'text-[#777777]'}`}>
                                     {Math.round(run.success_rate * 100)}%
                                 </div>
                             </div>
                             <div className="text-right">
                                 <div className="text-[9px] uppercase font-bold text-[#AAAAAA]">Avg Score</div>
                                 <div className="text-xl font-bold text-[#333333]">
-                                    {Math.round((run.results?.reduce((acc: number, r: any) => acc + (r.score || 0), 0) || 0) / (run.results?.length || 1))}
+                                    {Math.round(run.avg_score || 0)}
                                 </div>
                             </div>
                             <div className="text-right">
@@ -191,6 +236,13 @@ export default function HistoryView({ onBack }: { onBack: () => void }) {
                         </div>
                     </div>
                 ))}
+                {nextCursor && (
+                    <div className="col-span-full flex justify-center">
+                        <button onClick={() => loadPage(nextCursor)} className="px-6 py-3 neu-btn text-xs font-bold uppercase tracking-wider text-[#555555]">
+                            Load More
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     );
@@ -0,0 +1,41 @@
+export interface LeaderboardEntry {
+    label: string;
+    mean_score: number;
+    pass_rate: number;
+    scenarios: number;
+    eliminated_in: number | null;
+    prompt_preview: string;
+}
+
+export interface LeaderboardData {
+    cycle: number;
+    adopted: boolean;
+    winner: string;
+    scenarios_run: number;
+    entries: LeaderboardEntry[];
+}
+
+export default function Leaderboard({ data }: { data: LeaderboardData }) {
+    return (
+        <div className="neu-card p-5 flex flex-col min-h-0 h-full overflow-hidden">
+            <div className="flex justify-between items-center mb-3 pb-3 border-b border-[#E0E0E0]">
+                <span className="font-bold uppercase tracking-widest text-[#AAAAAA] text-[11px]">Prompt Search · Cycle {data.cycle}</span>
+                <span className={`text-[10px] font-bold uppercase px-2 py-0.5 rounded-full ${data.adopted ? 'bg-[#333333] text-white' : 'bg-[#E5E5E5] text-[#777777]'}`}>
+                    {data.adopted ? `${data.winner} adopted` : 'incumbent kept'}
+                </span>
+            </div>
+            <div className="flex-1 overflow-y-auto space-y-2 scrollbar-thin">
+                {data.entries.map((entry) => (
+                    <div key={entry.label} className={`flex items-center gap-3 text-xs ${entry.eliminated_in !== null ? 'opacity-50' : ''}`}>
+                        <span className="font-bold text-[#333333] w-24 shrink-0 capitalize">{entry.label}</span>
+                        <span className="font-mono text-[#555555] truncate flex-1" title={entry.prompt_preview}>{entry.prompt_preview}</span>
+                        <span className="font-mono text-[#333333] w-10 text-right">{entry.mean_score.toFixed(1)}</span>
+                        <span className="font-mono text-[#AAAAAA] w-10 text-right">{Math.round(entry.pass_rate * 100)}%</span>
+                        <span className="font-mono text-[#AAAAAA] w-6 text-right">{entry.scenarios}</span>
+                    </div>
+                ))}
+            </div>
+            <div className="pt-2 text-[10px] text-[#AAAAAA]">{data.scenarios_run} scenarios spent on search</div>
+        </div>
+    );
+}
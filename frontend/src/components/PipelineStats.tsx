@@ -0,0 +1,41 @@
+export interface StageStats {
+    name: string;
+    concurrency: number;
+    queue: number;
+    queue_size: number;
+    max_queue: number;
+    in_flight: number;
+    processed: number;
+    dropped: number;
+    utilization: number;
+    blocked_seconds: number;
+}
+
+export interface PipelineData {
+    cycle: number;
+    stages: StageStats[];
+}
+
+export default function PipelineStats({ data }: { data: PipelineData }) {
+    return (
+        <div className="neu-card p-5 flex flex-col min-h-0 h-full overflow-hidden">
+            <div className="flex justify-between items-center mb-3 pb-3 border-b border-[#E0E0E0]">
+                <span className="font-bold uppercase tracking-widest text-[#AAAAAA] text-[11px]">Pipeline · Cycle {data.cycle}</span>
+                <span className="text-[10px] font-bold uppercase text-[#AAAAAA]">queue · busy · util</span>
+            </div>
+            <div className="flex-1 overflow-y-auto space-y-2 scrollbar-thin">
+                {data.stages.map((stage) => (
+                    <div key={stage.name} className="flex items-center gap-3 text-xs" title={`${stage.processed} done, ${stage.dropped} skipped, ${stage.blocked_seconds}s waiting on the next stage`}>
+                        <span className="font-bold text-[#333333] w-20 shrink-0 capitalize">{stage.name}</span>
+                        <div className="flex-1 h-1.5 rounded-full bg-[#E5E5E5] overflow-hidden">
+                            <div className="h-full bg-[#333333] transition-all duration-500" style={{ width: `${Math.round(stage.utilization * 100)}%` }} />
+                        </div>
+                        <span className="font-mono text-[#555555] w-10 text-right">{stage.queue}/{stage.queue_size}</span>
+                        <span className="font-mono text-[#555555] w-10 text-right">{stage.in_flight}/{stage.concurrency}</span>
+                        <span className="font-mono text-[#AAAAAA] w-10 text-right">{Math.round(stage.utilization * 100)}%</span>
+                    </div>
+                ))}
+            </div>
+        </div>
+    );
+}
@@ -7,6 +7,9 @@ export interface Config {
     base_prompt: string;
     max_cycles: number;
     batch_size: number;
+    concurrency: number;
+    evaluate_concurrency: number;
+    search_candidates: number;
     thresholds: {
         repetition: number;
         negotiation: number;
@@ -109,6 +112,36 @@ export default function Sidebar({ config, setConfig, onStart, onStop, isRunning
                                 className="neu-input w-full p-3 text-sm text-[#333333] text-center"
                             />
                         </div>
+                        <div className="space-y-2">
+                            <label className="text-xs font-semibold text-[#555555] ml-1">Parallel Scenarios</label>
+                            <input
+                                type="number"
+                                min={1}
+                                value={config.concurrency}
+                                onChange={(e) => handleChange('concurrency', parseInt(e.target.value))}
+                                className="neu-input w-full p-3 text-sm text-[#333333] text-center"
+                            />
+                        </div>
+                        <div className="space-y-2">
+                            <label className="text-xs font-semibold text-[#555555] ml-1">Parallel Evaluations</label>
+                            <input
+                                type="number"
+                                min={1}
+                                value={config.evaluate_concurrency}
+                                onChange={(e) => handleChange('evaluate_concurrency', parseInt(e.target.value))}
+                                className="neu-input w-full p-3 text-sm text-[#333333] text-center"
+                            />
+                        </div>
+                        <div className="space-y-2">
+                            <label className="text-xs font-semibold text-[#555555] ml-1">Prompt Candidates</label>
+                            <input
+                                type="number"
+                                min={0}
+                                value={config.search_candidates}
+                                onChange={(e) => handleChange('search_candidates', parseInt(e.target.value))}
+                                className="neu-input w-full p-3 text-sm text-[#333333] text-center"
+                            />
+                        </div>
                     </div>
 
                     <div className="space-y-6 pt-2">